@@ -5,9 +5,10 @@ from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 
-from config import Config
+from app.routing import RoutingSession, init_routing
+from config import Config, engine_options
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
@@ -15,6 +16,23 @@ csrf = CSRFProtect()
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    replica_url = app.config.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {
+            **(app.config.get("SQLALCHEMY_BINDS") or {}),
+            "replica": {"url": replica_url, **engine_options(app.config, replica_url)},
+        }
+    if app.config.get("METRICS_ENABLED"):
+        from app.metrics import metered_options
+
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = metered_options(
+            app.config["SQLALCHEMY_ENGINE_OPTIONS"], app.config["SQLALCHEMY_DATABASE_URI"]
+        )
+        if replica_url:
+            app.config["SQLALCHEMY_BINDS"]["replica"] = metered_options(
+                app.config["SQLALCHEMY_BINDS"]["replica"], replica_url
+            )
 
     db.init_app(app)
     login_manager.init_app(app)
@@ -42,6 +60,20 @@ def create_app(config_class=Config):
     app.register_blueprint(mealplans_bp, url_prefix="/mealplans")
     app.register_blueprint(api_bp)
     csrf.exempt(api_bp)
+    init_routing(app)
+
+    if app.config.get("METRICS_ENABLED"):
+        from app.metrics import init_pool_metrics
+
+        init_pool_metrics(app)
+    if app.config.get("PROFILING_ENABLED"):
+        from app.profiling import init_profiling
+
+        init_profiling(app)
+    if app.config.get("METRICS_ENABLED") or app.config.get("PROFILING_ENABLED"):
+        from app.metrics import bp as metrics_bp
+
+        app.register_blueprint(metrics_bp)
 
     @app.route("/health")
     def health():
@@ -1,21 +1,36 @@
-"""API endpoints for units, ingredients, and recipe search."""
-from sqlalchemy import or_
+"""API endpoints for units, ingredients, recipe search, batch recipe writes, bulk recipe import and export/import."""
+import json
+import zipfile
+from datetime import date
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context, url_for
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 
 from app import db
-from app.models import Unit, IngredientMaster, Recipe, RecipeIngredient, Tag, recipe_tags
+from app.autocomplete import search_ingredients as search_ingredient_names
+from app.backup import export_lines, export_zip, import_records, import_zip, read_ndjson
+from app.batch import BatchError, save_recipes
+from app.bulk_import import batch_results, submit_batch
+from app.cache import unit_cache
+from app.models import Unit, IngredientMaster, Recipe
+from app.pagination import keyset_page, offset_page
+from app.routing import read_only
+from app.search import search_query
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
 
 @bp.route("/units")
+@read_only
 @login_required
 def list_units():
-    """Return all units for dropdown."""
-    units = Unit.query.order_by(Unit.name).all()
-    return jsonify([{"id": u.id, "name": u.name, "symbol": u.symbol} for u in units])
+    """Return all units for dropdown. Served from the process cache; supports If-None-Match."""
+    units, etag = unit_cache.get()
+    resp = jsonify([{"id": u.id, "name": u.name, "symbol": u.symbol} for u in units])
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
 
 
 @bp.route("/units", methods=["POST"])
@@ -31,27 +46,23 @@ def create_unit():
         return jsonify({"id": existing.id, "name": existing.name, "symbol": existing.symbol})
     unit = Unit(name=name, symbol=data.get("symbol", name[:10]))
     db.session.add(unit)
+    unit_cache.invalidate()
     db.session.commit()
     return jsonify({"id": unit.id, "name": unit.name, "symbol": unit.symbol}), 201
 
 
 @bp.route("/ingredients")
+@read_only
 @login_required
 def search_ingredients():
-    """Search ingredients by name. For autocomplete."""
-    q = (request.args.get("q") or "").strip().lower()
+    """Search ingredients by name, accent-insensitive, most used first. For autocomplete."""
+    q = (request.args.get("q") or "").strip()
     limit = min(int(request.args.get("limit", 20)), 50)
     if not q:
         # Return recent/popular when no query
         items = IngredientMaster.query.order_by(IngredientMaster.name).limit(limit).all()
-    else:
-        items = (
-            IngredientMaster.query.filter(IngredientMaster.name.ilike(f"%{q}%"))
-            .order_by(IngredientMaster.name)
-            .limit(limit)
-            .all()
-        )
-    return jsonify([{"id": i.id, "name": i.name} for i in items])
+        return jsonify([{"id": i.id, "name": i.name} for i in items])
+    return jsonify([{"id": id, "name": name} for id, name in search_ingredient_names(q, limit)])
 
 
 @bp.route("/ingredients", methods=["POST"])
@@ -72,31 +83,142 @@ def create_ingredient():
 
 
 @bp.route("/recipes")
+@read_only
 @login_required
 def search_recipes():
-    """Search current user's recipes by title, ingredients, or tags. For meal plan add."""
+    """
+    Search current user's recipes by title, ingredients, tags, or text; best match first. For meal plan add.
+    Paginated by cursor: pass the X-Next-Cursor header value back as ?cursor= for the next page.
+    """
     q = (request.args.get("q") or "").strip()
     limit = min(int(request.args.get("limit", 15)), 30)
-    base = Recipe.query.filter_by(user_id=current_user.id)
-    if q:
-        term = f"%{q}%"
-        recipes = (
-            base.outerjoin(RecipeIngredient)
-            .outerjoin(IngredientMaster)
-            .outerjoin(recipe_tags)
-            .outerjoin(Tag)
-            .filter(
-                or_(
-                    Recipe.title.ilike(term),
-                    IngredientMaster.name.ilike(term),
-                    Tag.name.ilike(term),
-                )
-            )
-            .distinct()
-            .order_by(Recipe.updated_at.desc())
-            .limit(limit)
-            .all()
-        )
+    cursor = request.args.get("cursor") or None
+    found = search_query(current_user.id, q) if q else None
+    if found is not None:
+        recipes, next_cursor = offset_page(found, cursor, limit)
+    elif q:
+        recipes, next_cursor = [], None
+    else:
+        base = Recipe.query.filter_by(user_id=current_user.id)
+        recipes, next_cursor = keyset_page(base, Recipe.updated_at, Recipe.id, cursor, limit)
+    resp = jsonify([{"id": r.id, "title": r.title} for r in recipes])
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+        next_url = url_for("api.search_recipes", q=q or None, limit=limit, cursor=next_cursor)
+        resp.headers["Link"] = f'<{next_url}>; rel="next"'
+    return resp
+
+
+@bp.route("/recipes/batch", methods=["POST"])
+@login_required
+def recipes_batch():
+    """
+    Create or update many recipes in one transaction: {"recipes": [{"key", "id", "title",
+    "description", "instructions", "ingredients", "tags"}, ...]}. Ingredients are lines of
+    text or {"name", "quantity", "unit"/"unit_id", "optional"}; tags a list or a comma string.
+    A recipe with "id", or with a "key" sent before, is updated (omitted fields are kept),
+    so retrying a batch with keys doesn't duplicate recipes. Returns {"recipes": [{"index",
+    "id", "key", "created"}]}; a 400 lists every invalid recipe and nothing is written.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("recipes")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "recipes required"}), 400
+    limit = current_app.config.get("API_BATCH_MAX_RECIPES", 1000)
+    if len(items) > limit:
+        return jsonify({"error": f"at most {limit} recipes per batch"}), 400
+    try:
+        results = save_recipes(current_user.id, items)
+    except BatchError as e:
+        db.session.rollback()
+        return jsonify({"error": "invalid recipes", "errors": e.errors}), 400
+    except IntegrityError:
+        # Another request saved one of these keys first; retrying resolves them as updates
+        db.session.rollback()
+        return jsonify({"error": "conflict, retry the batch"}), 409
+    created = any(r["created"] for r in results)
+    return jsonify({"recipes": results}), 201 if created else 200
+
+
+@bp.route("/recipes/import", methods=["POST"])
+@login_required
+def bulk_import():
+    """
+    Import recipes from a list of URLs ({"urls": [...]}) in the background. Returns the
+    batch id and results_url; see bulk_import_results.
+    """
+    data = request.get_json(silent=True) or {}
+    urls = [u.strip() for u in data.get("urls") or [] if isinstance(u, str) and u.strip()]
+    if not urls:
+        return jsonify({"error": "urls required"}), 400
+    bad = [u for u in urls if not u.startswith(("http://", "https://"))]
+    if bad:
+        return jsonify({"error": "invalid url", "urls": bad[:10]}), 400
+    limit = current_app.config.get("BULK_IMPORT_MAX_URLS", 500)
+    if len(urls) > limit:
+        return jsonify({"error": f"at most {limit} urls per import"}), 400
+    batch_id, total = submit_batch(current_user.id, urls)
+    return jsonify({
+        "batch": batch_id,
+        "total": total,
+        "results_url": url_for("api.bulk_import_results", batch_id=batch_id),
+    }), 202
+
+
+@bp.route("/recipes/import/<batch_id>")
+@login_required
+def bulk_import_results(batch_id):
+    """
+    Results of a bulk import as NDJSON, one line per URL in finishing order, starting after
+    the first ?offset= ones, then a {"finished", "total", "done"} line. Answers right away
+    with what has finished; poll again (every second or two) with the finished count as offset.
+    """
+    found = batch_results(batch_id, current_user.id, request.args.get("offset", 0, type=int))
+    if found is None:
+        return jsonify({"error": "not found"}), 404
+    results, finished, total = found
+    lines = [json.dumps(r) for r in results]
+    lines.append(json.dumps({"finished": finished, "total": total, "done": finished == total}))
+    return Response("\n".join(lines) + "\n", mimetype="application/x-ndjson")
+
+
+@bp.route("/export")
+@login_required
+def export():
+    """
+    Download all of the current user's data as NDJSON (see app/backup.py), or with ?images=1
+    as a zip that also holds the recipe images. Streamed as it is read from the database.
+    """
+    name = f"recetas-{current_user.username}-{date.today():%Y%m%d}"
+    if request.args.get("images") in ("1", "true", "yes"):
+        body, mimetype, name = export_zip(current_user.id), "application/zip", name + ".zip"
     else:
-        recipes = base.order_by(Recipe.updated_at.desc()).limit(limit).all()
-    return jsonify([{"id": r.id, "title": r.title} for r in recipes])
+        body, mimetype, name = export_lines(current_user.id), "application/x-ndjson", name + ".ndjson"
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{name}"'
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@bp.route("/import", methods=["POST"])
+@login_required
+def import_data():
+    """
+    Import an export into the current user's account: an NDJSON request body, or a "file"
+    upload holding NDJSON or the zip. Recipes imported before are updated, not duplicated.
+    Returns the counts of what was written.
+    """
+    upload = request.files.get("file")
+    try:
+        if upload is None:
+            summary = import_records(current_user.id, read_ndjson(request.stream))
+        elif zipfile.is_zipfile(upload.stream):
+            upload.stream.seek(0)
+            summary = import_zip(current_user.id, upload.stream)
+        else:
+            upload.stream.seek(0)
+            summary = import_records(current_user.id, read_ndjson(upload.stream))
+    except (ValueError, zipfile.BadZipFile) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    return jsonify(summary)
@@ -0,0 +1,207 @@
+"""
+Ingredient autocomplete for /api/ingredients.
+
+Matching is accent-insensitive on IngredientMaster.search_name; names that
+start with the query come first, then the most used ones (recipe_ingredients
+count), then alphabetical.
+- PostgreSQL with pg_trgm: trigram GIN index for substring matches (3+
+  characters) and a text_pattern_ops btree for short prefixes; usage counts
+  are only computed for the candidates.
+- Otherwise (SQLite in development, or pg_trgm not installable): an
+  in-process sorted array of word-boundary suffixes searched with bisect,
+  refreshed incrementally.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import DDL, case, event, func, select, text
+
+from app import db
+from app.models import IngredientMaster, RecipeIngredient
+from app.normalize import fold
+
+MAX_CANDIDATES = 200  # rows considered for popularity ranking per query
+REFRESH_SECONDS = 10  # pick up ingredients created by other workers
+RELOAD_SECONDS = 600  # full reload refreshes usage counts
+
+# (needs pg_trgm, sql) run when create_all makes the table; existing databases get them from migration 0001
+_DDL = [
+    (
+        False,
+        "CREATE INDEX IF NOT EXISTS ix_ingredient_masters_search_name_prefix "
+        "ON ingredient_masters (search_name text_pattern_ops)",
+    ),
+    (True, "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    (
+        True,
+        "CREATE INDEX IF NOT EXISTS ix_ingredient_masters_search_name_trgm "
+        "ON ingredient_masters USING GIN (search_name gin_trgm_ops)",
+    ),
+]
+
+
+def _trgm_available(conn):
+    return conn.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
+
+
+for _needs_trgm, _sql in _DDL:
+    event.listen(
+        IngredientMaster.__table__,
+        "after_create",
+        DDL(_sql).execute_if(
+            dialect="postgresql",
+            callable_=(lambda ddl, target, bind, **kw: _trgm_available(bind)) if _needs_trgm else None,
+        ),
+    )
+
+
+def _use_trgm():
+    """True when the database is PostgreSQL with pg_trgm installed (checked once per app)."""
+    flag = current_app.extensions.get("ingredient_trgm")
+    if flag is None:
+        flag = db.session.get_bind().dialect.name == "postgresql" and db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+        current_app.extensions["ingredient_trgm"] = flag
+    return flag
+
+
+def _like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_postgres(qf, limit):
+    col = IngredientMaster.search_name
+    prefix = _like_escape(qf) + "%"
+    if len(qf) < 3:
+        # Trigrams need 3 characters; short queries use the prefix btree instead.
+        where, order = col.like(prefix, escape="\\"), col
+    else:
+        where = col.like("%" + _like_escape(qf) + "%", escape="\\")
+        order = func.similarity(col, qf).desc()
+    candidates = (
+        select(IngredientMaster.id, IngredientMaster.name, col.like(prefix, escape="\\").label("is_prefix"))
+        .where(where)
+        .order_by(order)
+        .limit(MAX_CANDIDATES)
+        .cte("candidates")
+    )
+    uses = (
+        select(func.count())
+        .where(RecipeIngredient.ingredient_master_id == candidates.c.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(candidates.c.id, candidates.c.name)
+        .order_by(
+            case((candidates.c.is_prefix, 0), else_=1),
+            uses.desc(),
+            candidates.c.name,
+        )
+        .limit(limit)
+    )
+    return [(row.id, row.name) for row in db.session.execute(stmt)]
+
+
+class IngredientIndex:
+    """Sorted (suffix, id) array over folded ingredient names; 'harina de trigo' is found by 'trig'."""
+
+    def __init__(self):
+        # (keys, ids): sorted suffixes of folded names starting at each word boundary, and the
+        # ingredient id of each. Swapped as one tuple so readers never see them out of step.
+        self.arrays = ([], [])
+        self.names = {}
+        self.folded = {}
+        self.uses = {}
+        self.max_id = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    @staticmethod
+    def _suffixes(folded):
+        parts = folded.split()
+        return {" ".join(parts[i:]) for i in range(len(parts))}
+
+    def load(self):
+        rows = db.session.execute(
+            select(IngredientMaster.id, IngredientMaster.name, func.count(RecipeIngredient.id))
+            .outerjoin(RecipeIngredient, RecipeIngredient.ingredient_master_id == IngredientMaster.id)
+            .group_by(IngredientMaster.id, IngredientMaster.name)
+        ).all()
+        entries = []
+        names, folded, uses = {}, {}, {}
+        for id, name, count in rows:
+            names[id], folded[id], uses[id] = name, fold(name), count
+            entries.extend((key, id) for key in self._suffixes(folded[id]))
+        entries.sort()
+        self.arrays = ([k for k, _ in entries], [i for _, i in entries])
+        self.names, self.folded, self.uses = names, folded, uses
+        self.max_id = max(names, default=0)
+        self.loaded_at = self.refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """Add ingredients created since the last load (by any worker)."""
+        rows = db.session.execute(
+            select(IngredientMaster.id, IngredientMaster.name)
+            .where(IngredientMaster.id > self.max_id)
+            .order_by(IngredientMaster.id)
+        ).all()
+        if rows:
+            keys, ids = (list(a) for a in self.arrays)
+            for id, name in rows:
+                self.names[id], self.folded[id] = name, fold(name)
+                self.uses.setdefault(id, 0)
+                for key in self._suffixes(self.folded[id]):
+                    pos = bisect_left(keys, key)
+                    keys.insert(pos, key)
+                    ids.insert(pos, id)
+            self.arrays = (keys, ids)
+            self.max_id = rows[-1].id
+        self.refreshed_at = time.monotonic()
+
+    def search(self, qf, limit):
+        keys, ids = self.arrays
+        seen = set()
+        pos = bisect_left(keys, qf)
+        while pos < len(keys) and keys[pos].startswith(qf) and len(seen) < MAX_CANDIDATES:
+            seen.add(ids[pos])
+            pos += 1
+        ranked = sorted(
+            seen,
+            key=lambda i: (not self.folded[i].startswith(qf), -self.uses[i], self.folded[i]),
+        )
+        return [(i, self.names[i]) for i in ranked[:limit]]
+
+
+_lock = threading.Lock()
+
+
+def _local_index():
+    """Per-app, per-process IngredientIndex, reloaded or refreshed when stale."""
+    index = current_app.extensions.get("ingredient_index")
+    now = time.monotonic()
+    if index is not None and now - index.refreshed_at < REFRESH_SECONDS:
+        return index
+    with _lock:
+        index = current_app.extensions.get("ingredient_index")
+        if index is None or now - index.loaded_at >= RELOAD_SECONDS:
+            fresh = IngredientIndex()
+            fresh.load()
+            current_app.extensions["ingredient_index"] = index = fresh
+        elif now - index.refreshed_at >= REFRESH_SECONDS:
+            index.refresh()
+    return index
+
+
+def search_ingredients(q, limit=20):
+    """Return [(id, name)] of ingredients matching q, best first."""
+    qf = " ".join(fold(q).split())
+    if not qf:
+        return []
+    if _use_trgm():
+        return _search_postgres(qf, limit)
+    return _local_index().search(qf, limit)
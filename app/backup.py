@@ -0,0 +1,495 @@
+"""
+Export and import of a user's whole recipe book (backups, moving between instances).
+
+The export is NDJSON: a header line, then one line per recipe (with its ingredients
+and tags), shopping list (with its items) and meal plan (with its recipes). Rows are
+read with server-side cursors (yield_per) a chunk at a time, and lines are produced by
+generators, so memory stays flat however large the book is. export_zip() wraps the
+same lines as recipes.ndjson in a zip, followed by the original image files streamed
+from the upload folder or S3.
+
+import_records() reads the same lines back a chunk at a time. Recipes go through
+save_recipes() keyed by their exported key, so importing a file twice (or into the
+account it came from) updates the recipes instead of duplicating them. A recipe without
+a client_key is exported as "export:<instance>:<id>" (nothing is written to export it),
+which an import into this instance maps back to that recipe; files from before keys
+were exported use "export:<exported_at>:<id>". Shopping lists and meal plans are
+always created.
+"""
+import hashlib
+import json
+import uuid
+import zipfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select
+
+from app import db
+from app.batch import BatchError, save_recipes
+from app.entities import resolve_ingredients, resolve_units
+from app.models import (
+    IngredientMaster,
+    MealPlan,
+    MealPlanRecipe,
+    Recipe,
+    RecipeImage,
+    RecipeIngredient,
+    ShoppingList,
+    ShoppingListItem,
+    Tag,
+    Unit,
+    recipe_tags,
+)
+from app.recipes import allowed_file
+from app.uploads import storage_for, store_images
+
+FORMAT = "recetas-chiquitas"
+VERSION = 1
+CHUNK_SIZE = 500  # rows per server-side cursor fetch, and records per import write
+COPY_BUFFER = 64 * 1024
+RECIPES_MEMBER = "recipes.ndjson"
+
+
+def _chunks(stmt):
+    """Lists of up to CHUNK_SIZE result rows, fetched through a server-side cursor."""
+    return db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE)).partitions()
+
+
+def _time(value):
+    return value.isoformat() if value else None
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _grouped(rows):
+    """{first column: [rows]} for rows sorted by it."""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row)
+    return grouped
+
+
+def image_path(recipe_id, stored):
+    """Name of an image inside the export zip."""
+    return f"images/{recipe_id}/{stored.rsplit('/', 1)[-1]}"
+
+
+def _key_prefix():
+    """Prefix of the keys exported for recipes without a client_key: "export:<instance>:"."""
+    instance = current_app.config.get("EXPORT_INSTANCE_ID")
+    if not instance:
+        instance = hashlib.sha256(current_app.config["SECRET_KEY"].encode()).hexdigest()[:12]
+    return f"export:{instance}:"
+
+
+def _own_recipes(user_id, keys):
+    """{key: recipe id} of the keys this instance exported for user_id's recipes that still have no client_key."""
+    prefix = _key_prefix()
+    ids = {int(key[len(prefix):]): key for key in keys if key.startswith(prefix) and key[len(prefix):].isdigit()}
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        select(Recipe.id, Recipe.client_key).where(
+            Recipe.user_id == user_id, Recipe.id.in_(ids) | Recipe.client_key.in_(ids.values())
+        )
+    ).all()
+    held = {row.client_key for row in rows}
+    return {
+        ids[row.id]: row.id
+        for row in rows
+        if row.id in ids and row.client_key is None and ids[row.id] not in held
+    }
+
+
+def export_records(user_id, images=False):
+    """Generator of the export records (dicts) of user_id; with images, recipes list their zip paths."""
+    prefix = _key_prefix()
+    yield {"type": "header", "format": FORMAT, "version": VERSION, "exported_at": _time(datetime.utcnow())}
+
+    recipes = select(
+        Recipe.id,
+        Recipe.client_key,
+        Recipe.title,
+        Recipe.description,
+        Recipe.instructions,
+        Recipe.created_at,
+        Recipe.updated_at,
+    ).where(Recipe.user_id == user_id).order_by(Recipe.id)
+    for chunk in _chunks(recipes):
+        ids = [r.id for r in chunk]
+        ingredients = _grouped(db.session.execute(
+            select(
+                RecipeIngredient.recipe_id,
+                IngredientMaster.name,
+                RecipeIngredient.quantity,
+                Unit.name,
+                RecipeIngredient.optional,
+            )
+            .join(IngredientMaster, IngredientMaster.id == RecipeIngredient.ingredient_master_id)
+            .outerjoin(Unit, Unit.id == RecipeIngredient.unit_id)
+            .where(RecipeIngredient.recipe_id.in_(ids))
+            .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position, RecipeIngredient.id)
+        ))
+        tags = _grouped(db.session.execute(
+            select(recipe_tags.c.recipe_id, Tag.name)
+            .join(Tag, Tag.id == recipe_tags.c.tag_id)
+            .where(recipe_tags.c.recipe_id.in_(ids))
+            .order_by(recipe_tags.c.recipe_id, Tag.name)
+        ))
+        files = {}
+        if images:
+            files = _grouped(db.session.execute(
+                select(RecipeImage.recipe_id, RecipeImage.filename)
+                .where(RecipeImage.recipe_id.in_(ids))
+                .order_by(RecipeImage.recipe_id, RecipeImage.id)
+            ))
+        for r in chunk:
+            record = {
+                "type": "recipe",
+                "id": r.id,
+                "key": r.client_key or f"{prefix}{r.id}",
+                "title": r.title,
+                "description": r.description or "",
+                "instructions": r.instructions or "",
+                "created_at": _time(r.created_at),
+                "updated_at": _time(r.updated_at),
+                "ingredients": [
+                    {"name": name, "quantity": quantity or "", "unit": unit, "optional": bool(optional)}
+                    for _, name, quantity, unit, optional in ingredients.get(r.id, [])
+                ],
+                "tags": [name for _, name in tags.get(r.id, [])],
+            }
+            if images:
+                record["images"] = [image_path(r.id, filename) for _, filename in files.get(r.id, [])]
+            yield record
+
+    lists = select(ShoppingList.id, ShoppingList.name, ShoppingList.created_at).where(
+        ShoppingList.user_id == user_id
+    ).order_by(ShoppingList.id)
+    for chunk in _chunks(lists):
+        items = _grouped(db.session.execute(
+            select(
+                ShoppingListItem.shopping_list_id,
+                db.func.coalesce(IngredientMaster.name, ShoppingListItem.ingredient_name),
+                ShoppingListItem.quantity,
+                db.func.coalesce(Unit.name, ShoppingListItem.unit),
+                ShoppingListItem.checked,
+            )
+            .outerjoin(IngredientMaster, IngredientMaster.id == ShoppingListItem.ingredient_master_id)
+            .outerjoin(Unit, Unit.id == ShoppingListItem.unit_id)
+            .where(ShoppingListItem.shopping_list_id.in_([sl.id for sl in chunk]))
+            .order_by(ShoppingListItem.shopping_list_id, ShoppingListItem.id)
+        ))
+        for sl in chunk:
+            yield {
+                "type": "shopping_list",
+                "id": sl.id,
+                "name": sl.name,
+                "created_at": _time(sl.created_at),
+                "items": [
+                    {"name": name or "", "quantity": quantity or "", "unit": unit, "checked": bool(checked)}
+                    for _, name, quantity, unit, checked in items.get(sl.id, [])
+                ],
+            }
+
+    plans = select(MealPlan.id, MealPlan.name, MealPlan.duration_days, MealPlan.created_at).where(
+        MealPlan.user_id == user_id
+    ).order_by(MealPlan.id)
+    for chunk in _chunks(plans):
+        entries = _grouped(db.session.execute(
+            select(MealPlanRecipe.meal_plan_id, MealPlanRecipe.recipe_id, MealPlanRecipe.count)
+            .where(MealPlanRecipe.meal_plan_id.in_([mp.id for mp in chunk]))
+            .order_by(MealPlanRecipe.meal_plan_id, MealPlanRecipe.id)
+        ))
+        for mp in chunk:
+            yield {
+                "type": "meal_plan",
+                "id": mp.id,
+                "name": mp.name,
+                "duration_days": mp.duration_days,
+                "created_at": _time(mp.created_at),
+                "recipes": [{"recipe": recipe_id, "count": count} for _, recipe_id, count in entries.get(mp.id, [])],
+            }
+
+
+def export_lines(user_id, images=False):
+    """The export of user_id as NDJSON lines (str, newline included)."""
+    for record in export_records(user_id, images):
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class _Sink:
+    """Write-only, unseekable file for ZipFile whose written bytes are taken out with drain()."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def export_zip(user_id):
+    """
+    The export of user_id as a zip, generated in chunks of bytes: recipes.ndjson, then every
+    image as images/<recipe id>/<name>, copied COPY_BUFFER bytes at a time from its storage.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        info = zipfile.ZipInfo(RECIPES_MEMBER, datetime.utcnow().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zf.open(info, "w", force_zip64=True) as member:
+            for line in export_lines(user_id, images=True):
+                member.write(line.encode("utf-8"))
+                if sink.size >= COPY_BUFFER:
+                    yield sink.drain()
+        yield sink.drain()
+
+        stmt = (
+            select(RecipeImage.recipe_id, RecipeImage.filename)
+            .join(Recipe, Recipe.id == RecipeImage.recipe_id)
+            .where(Recipe.user_id == user_id)
+            .order_by(RecipeImage.recipe_id, RecipeImage.id)
+        )
+        for chunk in _chunks(stmt):
+            for recipe_id, filename in chunk:
+                try:
+                    src = storage_for(filename).stream(recipe_id, filename)
+                except Exception:
+                    current_app.logger.warning("Export: image %s of recipe %s not found", filename, recipe_id)
+                    continue
+                info = zipfile.ZipInfo(image_path(recipe_id, filename), datetime.utcnow().timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED  # already compressed
+                with src, zf.open(info, "w", force_zip64=True) as member:
+                    while True:
+                        data = src.read(COPY_BUFFER)
+                        if not data:
+                            break
+                        member.write(data)
+                        if sink.size >= COPY_BUFFER:
+                            yield sink.drain()
+                yield sink.drain()
+    yield sink.drain()
+
+
+def read_ndjson(lines):
+    """Records (dicts) from NDJSON lines (str or bytes); blank lines are skipped."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number}: invalid JSON") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"line {number}: expected an object")
+        yield record
+
+
+def _count(entry):
+    """The count of a meal plan entry (1 if missing); ValueError unless a positive int."""
+    count = entry.get("count", 1)
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        raise ValueError(f"meal plan recipe {entry.get('recipe')}: count must be a positive integer")
+    return count
+
+
+def _import(user_id, records):
+    """import_records(), also returning {exported recipe id: recipe id}."""
+    summary = {"recipes_created": 0, "recipes_updated": 0, "shopping_lists": 0, "meal_plans": 0}
+    recipe_ids = {}
+    recipes, lists, plans = [], [], []
+    exported_at = None
+
+    def flush_recipes():
+        if not recipes:
+            return
+        items = [
+            {
+                "key": r.get("key") or f"export:{exported_at}:{r.get('id')}",
+                "title": r.get("title"),
+                "description": r.get("description") or "",
+                "instructions": r.get("instructions") or "",
+                "ingredients": r.get("ingredients") or [],
+                "tags": r.get("tags") or [],
+            }
+            for r in recipes
+        ]
+        # Recipes exported from this account without a client_key are updated (and get the key)
+        own = _own_recipes(user_id, [item["key"] for item in items])
+        for item in items:
+            if item["key"] in own:
+                item["id"] = own[item["key"]]
+        try:
+            results = save_recipes(user_id, items)
+        except BatchError as e:
+            db.session.rollback()
+            first = e.errors[0]
+            raise ValueError(f"recipe {recipes[first['index']].get('id')}: {first['error']}") from None
+        for r, result in zip(recipes, results):
+            recipe_ids[r.get("id")] = result["id"]
+            if result["created"]:
+                summary["recipes_created"] += 1
+            else:
+                summary["recipes_updated"] += 1
+        recipes.clear()
+
+    def flush_lists():
+        if not lists:
+            return
+        list_ids = db.session.scalars(
+            insert(ShoppingList).returning(ShoppingList.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "name": (sl.get("name") or "Lista")[:200],
+                    "created_at": _parse_time(sl.get("created_at")) or datetime.utcnow(),
+                }
+                for sl in lists
+            ],
+        ).all()
+        rows = [
+            (list_id, item)
+            for list_id, sl in zip(list_ids, lists)
+            for item in sl.get("items") or []
+            if isinstance(item, dict) and (item.get("name") or "").strip()
+        ]
+        masters = resolve_ingredients([item["name"] for _, item in rows])
+        unit_ids = resolve_units([(None, item.get("unit")) for _, item in rows])
+        if rows:
+            db.session.execute(
+                insert(ShoppingListItem),
+                [
+                    {
+                        "shopping_list_id": list_id,
+                        "ingredient_master_id": masters[item["name"].strip().lower()].id,
+                        "unit_id": unit_id,
+                        "quantity": str(item.get("quantity") or "")[:50],
+                        "checked": bool(item.get("checked")),
+                    }
+                    for (list_id, item), unit_id in zip(rows, unit_ids)
+                ],
+            )
+        db.session.commit()
+        summary["shopping_lists"] += len(lists)
+        lists.clear()
+
+    def flush_plans():
+        if not plans:
+            return
+        flush_recipes()
+        plan_ids = db.session.scalars(
+            insert(MealPlan).returning(MealPlan.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "name": (mp.get("name") or "Plan")[:200],
+                    "duration_days": mp.get("duration_days") if isinstance(mp.get("duration_days"), int) else 7,
+                    "created_at": _parse_time(mp.get("created_at")) or datetime.utcnow(),
+                }
+                for mp in plans
+            ],
+        ).all()
+        entries = [
+            {"meal_plan_id": plan_id, "recipe_id": recipe_ids[entry.get("recipe")], "count": _count(entry)}
+            for plan_id, mp in zip(plan_ids, plans)
+            for entry in mp.get("recipes") or []
+            if isinstance(entry, dict) and entry.get("recipe") in recipe_ids
+        ]
+        if entries:
+            db.session.execute(insert(MealPlanRecipe), entries)
+        db.session.commit()
+        summary["meal_plans"] += len(plans)
+        plans.clear()
+
+    for record in records:
+        kind = record.get("type")
+        if kind == "header":
+            if record.get("format") != FORMAT or record.get("version") != VERSION:
+                raise ValueError(f"unsupported export: {record.get('format')} version {record.get('version')}")
+            exported_at = record.get("exported_at")
+        elif kind == "recipe":
+            recipes.append(record)
+            if len(recipes) >= CHUNK_SIZE:
+                flush_recipes()
+        elif kind == "shopping_list":
+            lists.append(record)
+            if len(lists) >= CHUNK_SIZE:
+                flush_lists()
+        elif kind == "meal_plan":
+            plans.append(record)
+            if len(plans) >= CHUNK_SIZE:
+                flush_plans()
+    flush_recipes()
+    flush_lists()
+    flush_plans()
+    return summary, recipe_ids
+
+
+def import_records(user_id, records):
+    """
+    Import export records (see read_ndjson) into user_id's account, committing every
+    CHUNK_SIZE records. Returns counts by kind. Raises ValueError on an invalid record;
+    what was committed before it stays, and importing again finishes the job.
+    """
+    return _import(user_id, records)[0]
+
+
+def import_zip(user_id, fileobj):
+    """
+    Import an export_zip() archive (a seekable file): recipes.ndjson, then the images of
+    the imported recipes that have none yet, streamed from the archive into image storage.
+    """
+    with zipfile.ZipFile(fileobj) as zf:
+        try:
+            member = zf.open(RECIPES_MEMBER)
+        except KeyError:
+            raise ValueError(f"{RECIPES_MEMBER} missing from the archive") from None
+        with member:
+            summary, recipe_ids = _import(user_id, read_ndjson(member))
+
+        by_recipe = {}
+        for info in zf.infolist():
+            parts = info.filename.split("/")
+            if len(parts) == 3 and parts[0] == "images" and parts[1].isdigit() and allowed_file(parts[2]):
+                if int(parts[1]) in recipe_ids:
+                    by_recipe.setdefault(recipe_ids[int(parts[1])], []).append(info)
+        # Recipes that already have images (from an earlier run of this import) keep them
+        targets = [*by_recipe]
+        for start in range(0, len(targets), CHUNK_SIZE):
+            chunk = targets[start : start + CHUNK_SIZE]
+            for (recipe_id,) in db.session.execute(
+                select(RecipeImage.recipe_id).where(RecipeImage.recipe_id.in_(chunk)).distinct()
+            ):
+                del by_recipe[recipe_id]
+        summary["images"] = 0
+        for recipe_id, infos in by_recipe.items():
+            files = [(zf.open(info), f"{uuid.uuid4().hex}.{info.filename.rsplit('.', 1)[1].lower()}") for info in infos]
+            try:
+                stored = store_images(recipe_id, files)
+            finally:
+                for member, _ in files:
+                    member.close()
+            db.session.execute(
+                insert(RecipeImage),
+                [{"recipe_id": recipe_id, "filename": name, "variants": variants} for name, variants in stored],
+            )
+            db.session.commit()
+            summary["images"] += len(stored)
+    return summary
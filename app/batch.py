@@ -0,0 +1,240 @@
+"""
+JSON batch create/update of recipes (POST /api/recipes/batch).
+
+Every recipe in a batch is validated first; then all ingredients, units and tags
+are resolved with one bulk get-or-create each, and recipes, ingredient rows, tag
+links and search documents are written with multi-row statements, all in one
+transaction. A recipe may carry a "key" (the caller's id for it): a key seen
+before for the same user updates that recipe instead of creating another, so a
+retried batch doesn't duplicate anything.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.entities import resolve_ingredients, resolve_tags, resolve_units
+from app.ingredient_parser import get_parser
+from app.models import IngredientMaster, Recipe, RecipeIngredient, Tag, recipe_tags
+from app.recipes import insert_recipe_ingredients, sync_ingredients, tag_names_from_string
+from app.search import replace_search_documents
+
+TEXT_FIELDS = ("title", "description", "instructions")
+
+
+class BatchError(Exception):
+    """The batch was rejected; errors is a list of {"index", "error"}. Nothing was written."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid recipes")
+        self.errors = errors
+
+
+def _ingredient_row(item, parser):
+    """Form-style row for one ingredient: a line of text, or {"name", "quantity", "unit"/"unit_id", "optional"}."""
+    if isinstance(item, str):
+        row = parser.parse_line(item)
+        return row if row["name"].strip() else None
+    if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+        raise ValueError("each ingredient needs a name")
+    return {
+        "name": item["name"].strip()[:200],
+        "quantity": str(item.get("quantity") or "")[:50],
+        "unit_id": item.get("unit_id"),
+        "unit_name": item.get("unit"),
+        "optional": bool(item.get("optional")),
+    }
+
+
+def _parse(index, item, parser):
+    """Normalized copy of one batch item; raises ValueError with the reason it is invalid."""
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    out = {"index": index, "id": item.get("id"), "key": item.get("key")}
+    if out["id"] is not None and (not isinstance(out["id"], int) or isinstance(out["id"], bool)):
+        raise ValueError("id must be an integer")
+    if out["key"] is not None:
+        if not isinstance(out["key"], str) or not out["key"].strip() or len(out["key"]) > 100:
+            raise ValueError("key must be a non-empty string of at most 100 characters")
+        out["key"] = out["key"].strip()
+    for field in TEXT_FIELDS:
+        if field in item:
+            value = item[field]
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} must be a string")
+            out[field] = (value or "").strip() if field == "title" else value or ""
+    if "title" in out and not out["title"]:
+        raise ValueError("title must not be empty")
+    if "title" in out and len(out["title"]) > 200:
+        raise ValueError("title is longer than 200 characters")
+    if "tags" in item:
+        tags = item["tags"]
+        if isinstance(tags, str):
+            out["tags"] = tag_names_from_string(tags)
+        elif isinstance(tags, list) and all(isinstance(t, str) for t in tags):
+            out["tags"] = tag_names_from_string(",".join(tags))
+        else:
+            raise ValueError("tags must be a list of strings or a comma-separated string")
+    if "ingredients" in item:
+        if not isinstance(item["ingredients"], list):
+            raise ValueError("ingredients must be a list")
+        rows = [_ingredient_row(i, parser) for i in item["ingredients"]]
+        out["ingredients"] = [r for r in rows if r is not None]
+    return out
+
+
+def save_recipes(user_id, items):
+    """
+    Create or update recipes of user_id from batch items in one transaction (committed here).
+    Returns [{"index", "id", "key", "created"}] in order. Raises BatchError if any item is
+    invalid; an IntegrityError means a concurrent batch used the same key (safe to retry).
+    """
+    parser = get_parser()
+    parsed, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(_parse(index, item, parser))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    keys = [p["key"] for p in parsed if p["key"]]
+    seen = set()
+    for p in parsed:
+        if p["key"] and p["key"] in seen:
+            errors.append({"index": p["index"], "error": "key repeated in this batch"})
+        seen.add(p["key"])
+    if errors:
+        raise BatchError(errors)
+
+    # Which items update an existing recipe: by id, else by key
+    ids = [p["id"] for p in parsed if p["id"] is not None]
+    current = {}
+    if ids or keys:
+        cond = Recipe.id.in_(ids) if ids else None
+        if keys:
+            by_key = Recipe.client_key.in_(keys)
+            cond = by_key if cond is None else cond | by_key
+        for row in db.session.execute(
+            select(Recipe.id, Recipe.client_key, *(getattr(Recipe, f) for f in TEXT_FIELDS)).where(
+                Recipe.user_id == user_id, cond
+            )
+        ):
+            current[row.id] = row
+    id_by_key = {row.client_key: row.id for row in current.values() if row.client_key}
+    for p in parsed:
+        if p["id"] is not None:
+            if p["id"] not in current:
+                errors.append({"index": p["index"], "error": "recipe not found"})
+            elif p["key"] and id_by_key.get(p["key"], p["id"]) != p["id"]:
+                errors.append({"index": p["index"], "error": "key belongs to another recipe"})
+        else:
+            p["id"] = id_by_key.get(p["key"]) if p["key"] else None
+        if p["id"] is None and "title" not in p:
+            errors.append({"index": p["index"], "error": "title is required"})
+    resolved = set()
+    for p in parsed:
+        if p["id"] is not None and p["id"] in resolved:
+            errors.append({"index": p["index"], "error": "recipe repeated in this batch"})
+        resolved.add(p["id"])
+    if errors:
+        raise BatchError(errors)
+    creates = [p for p in parsed if p["id"] is None]
+    updates = [p for p in parsed if p["id"] is not None]
+    for p in creates:
+        p.setdefault("description", "")
+        p.setdefault("instructions", "")
+
+    # Every ingredient, unit and tag in the batch, each kind in one call
+    rows = [r for p in parsed for r in p.get("ingredients", [])]
+    masters = resolve_ingredients([r["name"] for r in rows])
+    unit_ids = iter(resolve_units([(r["unit_id"], r["unit_name"]) for r in rows]))
+    tags = resolve_tags([t for p in parsed for t in p.get("tags", [])])
+    for p in parsed:
+        if "ingredients" in p:
+            p["values"] = [
+                {
+                    "ingredient_master_id": masters[r["name"].strip().lower()].id,
+                    "unit_id": next(unit_ids),
+                    "quantity": r["quantity"],
+                    "optional": r["optional"],
+                }
+                for r in p["ingredients"]
+            ]
+
+    now = datetime.utcnow()
+    if creates:
+        new_ids = db.session.scalars(
+            insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True),
+            [
+                {
+                    "user_id": user_id,
+                    "client_key": p["key"],
+                    "title": p["title"],
+                    "description": p["description"],
+                    "instructions": p["instructions"],
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for p in creates
+            ],
+        ).all()
+        for p, recipe_id in zip(creates, new_ids):
+            p["id"], p["created"] = recipe_id, True
+    if updates:
+        db.session.execute(
+            update(Recipe),
+            [
+                {
+                    "id": p["id"],
+                    "client_key": p["key"] or current[p["id"]].client_key,
+                    **{f: p.get(f, getattr(current[p["id"]], f)) for f in TEXT_FIELDS},
+                    "updated_at": now,
+                }
+                for p in updates
+            ],
+        )
+
+    insert_recipe_ingredients(
+        [{"recipe_id": p["id"], **v} for p in creates for v in p.get("values", [])]
+    )
+    sync_ingredients(
+        {p["id"]: [{"recipe_id": p["id"], **v} for v in p["values"]] for p in updates if "values" in p}
+    )
+    retagged = [p["id"] for p in updates if "tags" in p]
+    if retagged:
+        db.session.execute(recipe_tags.delete().where(recipe_tags.c.recipe_id.in_(retagged)))
+    links = [{"recipe_id": p["id"], "tag_id": tags[t.lower()].id} for p in parsed for t in p.get("tags", [])]
+    if links:
+        db.session.execute(recipe_tags.insert(), links)
+
+    # Search documents, with names from the batch or, where it left them out, the database
+    ingredient_names = {p["id"]: [r["name"] for r in p["ingredients"]] for p in parsed if "ingredients" in p}
+    tag_names = {p["id"]: [tags[t.lower()].name for t in p["tags"]] for p in parsed if "tags" in p}
+    missing = [p["id"] for p in updates if "ingredients" not in p]
+    for recipe_id, name in db.session.execute(
+        select(RecipeIngredient.recipe_id, IngredientMaster.name)
+        .join(IngredientMaster, IngredientMaster.id == RecipeIngredient.ingredient_master_id)
+        .where(RecipeIngredient.recipe_id.in_(missing))
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position, RecipeIngredient.id)
+    ) if missing else ():
+        ingredient_names.setdefault(recipe_id, []).append(name)
+    missing = [p["id"] for p in updates if "tags" not in p]
+    for recipe_id, name in db.session.execute(
+        select(recipe_tags.c.recipe_id, Tag.name)
+        .join(Tag, Tag.id == recipe_tags.c.tag_id)
+        .where(recipe_tags.c.recipe_id.in_(missing))
+    ) if missing else ():
+        tag_names.setdefault(recipe_id, []).append(name)
+    docs = []
+    for p in parsed:
+        text = {f: p[f] if f in p else getattr(current[p["id"]], f) or "" for f in TEXT_FIELDS}
+        docs.append({
+            "recipe_id": p["id"],
+            "user_id": user_id,
+            "title": text["title"],
+            "keywords": " ".join(ingredient_names.get(p["id"], []) + tag_names.get(p["id"], [])),
+            "body": " ".join(x for x in (text["description"], text["instructions"]) if x),
+        })
+    replace_search_documents(docs)
+
+    db.session.commit()
+    return [{"index": p["index"], "id": p["id"], "key": p["key"], "created": p.get("created", False)} for p in parsed]
@@ -0,0 +1,331 @@
+"""
+Bulk recipe import from many URLs (bookmark migrations).
+
+fetch_many() fetches pages concurrently over one shared HTTP session, scheduling
+per host (at most BULK_IMPORT_PER_HOST requests at a time and one start every
+BULK_IMPORT_HOST_INTERVAL seconds) so one slow or strict site doesn't hold up the
+rest. import_urls() turns the pages into recipes through create_recipes(), a bulk
+write path (one INSERT per table per batch), and yields results as batches commit.
+
+scripts/import_urls.py runs it directly. POST /api/recipes/import queues it as a
+batch of import_jobs rows run in the background, and GET /api/recipes/import/<batch>
+streams the results finished so far as NDJSON.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.entities import resolve_ingredients, resolve_units
+from app.ingredient_parser import parse_ingredient_lines
+from app.importer import RecipeImportError, cached_results, fetch_recipe, prune_jobs, url_key
+from app.models import ImportJob, Recipe, RecipeSearchDocument
+from app.normalize import fold
+from app.recipes import insert_recipe_ingredients
+
+_init_lock = threading.Lock()
+
+DEFAULT_TITLE = "Receta importada"
+
+
+def _host(url):
+    return (urlsplit(url).hostname or "").lower()
+
+
+def fetch_many(urls, session, workers=8, per_host=2, interval=0.5, timeout=15, tick=None):
+    """
+    Fetch and scrape urls on a pool of workers, yielding (url, payload, error) as each
+    finishes; error is {"error", "detail"} when the import failed. Hosts are served round
+    robin, each with at most per_host requests in flight and starts interval seconds
+    apart. With tick, also yields None after tick seconds without a result.
+    """
+    pending = {}
+    for url in urls:
+        pending.setdefault(_host(url), []).append(url)
+    for queue in pending.values():
+        queue.reverse()  # pop() from the end takes them in order
+    in_flight = {}
+    active = dict.fromkeys(pending, 0)
+    next_start = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-import") as pool:
+        while pending or in_flight:
+            now = time.monotonic()
+            soonest = None
+            for host in [h for h in pending]:
+                if len(in_flight) >= workers:
+                    break
+                if active[host] >= per_host:
+                    continue
+                ready = next_start.get(host, 0)
+                if ready > now:
+                    soonest = ready if soonest is None else min(soonest, ready)
+                    continue
+                url = pending[host].pop()
+                if pending[host]:
+                    pending[host] = pending.pop(host)  # to the back of the line
+                else:
+                    del pending[host]
+                active[host] += 1
+                next_start[host] = now + interval
+                in_flight[pool.submit(fetch_recipe, url, timeout, session)] = (url, host)
+
+            wait_for = None if soonest is None else max(0.0, soonest - now)
+            if tick is not None:
+                wait_for = tick if wait_for is None else min(wait_for, tick)
+            if in_flight:
+                done, _ = wait(in_flight, timeout=wait_for, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(wait_for or 0)
+                done = ()
+            if not done and tick is not None:
+                yield None
+            for future in done:
+                url, host = in_flight.pop(future)
+                active[host] -= 1
+                try:
+                    yield url, future.result(), None
+                except RecipeImportError as e:
+                    yield url, None, e.as_dict()
+                except Exception as e:
+                    yield url, None, {"error": "No se pudo importar la receta.", "detail": str(e)[:200]}
+
+
+def new_session(pool_size):
+    """A requests session whose connection pool fits pool_size concurrent requests per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def create_recipes(user_id, items):
+    """
+    Create one recipe per (url, payload) scraped by fetch_recipe, with its source_url,
+    ingredients (lines split into quantity, unit and name by app/ingredient_parser.py)
+    and search document, in one INSERT per table. Returns the new recipe ids in order.
+    Doesn't commit.
+    """
+    if not items:
+        return []
+    now = datetime.utcnow()
+    recipes = [
+        {
+            "user_id": user_id,
+            "title": ((payload.get("title") or "").strip() or DEFAULT_TITLE)[:200],
+            "description": "",
+            "source_url": url,
+            "instructions": payload.get("instructions") or "",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for url, payload in items
+    ]
+    ids = db.session.scalars(insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True), recipes).all()
+
+    parsed = [parse_ingredient_lines(payload.get("ingredients") or []) for _, payload in items]
+    all_rows = [row for rows in parsed for row in rows]
+    masters = resolve_ingredients([row["name"] for row in all_rows])
+    unit_ids = iter(resolve_units([(row["unit_id"], row["unit_name"]) for row in all_rows]))
+    values = []
+    for recipe_id, rows in zip(ids, parsed):
+        for row in rows:
+            values.append({
+                "recipe_id": recipe_id,
+                "ingredient_master_id": masters[row["name"].strip().lower()].id,
+                "unit_id": next(unit_ids),
+                "quantity": row["quantity"],
+                "optional": row["optional"],
+            })
+    insert_recipe_ingredients(values)
+
+    db.session.execute(
+        insert(RecipeSearchDocument),
+        [
+            {
+                "recipe_id": recipe_id,
+                "user_id": user_id,
+                "title": fold(recipe["title"]),
+                "keywords": fold(" ".join(r["name"] for r in recipe_rows)),
+                "body": fold(recipe["instructions"]),
+            }
+            for recipe_id, recipe, recipe_rows in zip(ids, recipes, parsed)
+        ],
+    )
+    return ids
+
+
+def import_urls(user_id, urls, batch_size=25, flush_seconds=1.0, workers=8, per_host=2, interval=0.5, timeout=15):
+    """
+    Import urls as recipes of user_id, yielding lists of results as they are ready:
+    {"url", "ok": True, "recipe_id", "title", "cached"} once the recipe is committed, or
+    {"url", "ok": False, "error", "detail"}. Successes are written batch_size at a time,
+    or after flush_seconds. Pages imported recently (the import_jobs result cache) are not
+    fetched again. Each yielded list also carries the payloads, under "payload".
+    """
+    keys = {url: url_key(url) for url in urls}
+    cached = cached_results(set(keys.values()))
+    buffer = []
+    first_at = None
+
+    def flush():
+        nonlocal buffer, first_at
+        if not buffer:
+            return []
+        ids = create_recipes(user_id, [(r["url"], r["payload"]) for r in buffer])
+        db.session.commit()
+        done = [dict(r, recipe_id=recipe_id) for r, recipe_id in zip(buffer, ids)]
+        buffer, first_at = [], None
+        return done
+
+    def add(url, payload, from_cache):
+        nonlocal first_at
+        title = ((payload.get("title") or "").strip() or DEFAULT_TITLE)[:200]
+        buffer.append({"url": url, "ok": True, "title": title, "cached": from_cache, "payload": payload})
+        first_at = first_at or time.monotonic()
+
+    for url in urls:
+        if keys[url] in cached:
+            add(url, json.loads(cached[keys[url]]), True)
+            if len(buffer) >= batch_size:
+                yield flush()
+
+    session = new_session(max(workers, per_host))
+    try:
+        to_fetch = [url for url in urls if keys[url] not in cached]
+        for item in fetch_many(to_fetch, session, workers, per_host, interval, timeout, tick=flush_seconds):
+            if item is not None:
+                url, payload, error = item
+                if error is not None:
+                    yield [{"url": url, "ok": False, **error}]
+                    continue
+                add(url, payload, False)
+            if buffer and (len(buffer) >= batch_size or time.monotonic() - first_at >= flush_seconds):
+                yield flush()
+        if buffer:
+            yield flush()
+    finally:
+        session.close()
+
+
+def _executor():
+    """Per-process pool running queued bulk batches (BULK_IMPORT_BATCHES at a time)."""
+    cached = current_app.extensions.get("bulk_import_executor")
+    if cached is None or cached[0] != os.getpid():
+        with _init_lock:
+            cached = current_app.extensions.get("bulk_import_executor")
+            if cached is None or cached[0] != os.getpid():
+                executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get("BULK_IMPORT_BATCHES", 2), thread_name_prefix="bulk-batch"
+                )
+                cached = (os.getpid(), executor)
+                current_app.extensions["bulk_import_executor"] = cached
+    return cached[1]
+
+
+def import_options(config):
+    """import_urls keyword arguments from the BULK_IMPORT_* / IMPORT_* settings."""
+    return {
+        "workers": config.get("BULK_IMPORT_WORKERS", 8),
+        "per_host": config.get("BULK_IMPORT_PER_HOST", 2),
+        "interval": config.get("BULK_IMPORT_HOST_INTERVAL", 0.5),
+        "timeout": config.get("IMPORT_FETCH_TIMEOUT", 15),
+    }
+
+
+def _run_batch(app, batch_id, user_id, job_ids):
+    with app.app_context():
+        try:
+            for results in import_urls(user_id, list(job_ids), **import_options(app.config)):
+                now = datetime.utcnow()
+                db.session.execute(
+                    update(ImportJob.__table__)
+                    .where(ImportJob.id == db.bindparam("b_id"))
+                    .values(
+                        status=db.bindparam("b_status"),
+                        result=db.bindparam("b_result"),
+                        recipe_id=db.bindparam("b_recipe_id"),
+                        finished_at=now,
+                    ),
+                    [
+                        {
+                            "b_id": job_ids[r["url"]],
+                            "b_status": "done" if r["ok"] else "error",
+                            "b_result": json.dumps(
+                                r["payload"] if r["ok"] else {"error": r["error"], "detail": r.get("detail")}
+                            ),
+                            "b_recipe_id": r.get("recipe_id"),
+                        }
+                        for r in results
+                    ],
+                )
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception("Bulk import %s failed", batch_id)
+            db.session.execute(
+                update(ImportJob)
+                .where(ImportJob.batch_id == batch_id, ImportJob.status == "pending")
+                .values(
+                    status="error",
+                    result=json.dumps({"error": "No se pudo importar la receta.", "detail": str(e)[:200]}),
+                    finished_at=datetime.utcnow(),
+                )
+            )
+            db.session.commit()
+
+
+def submit_batch(user_id, urls):
+    """Record a job per distinct URL under a new batch id and queue the batch; returns (batch id, count)."""
+    batch_id = uuid.uuid4().hex
+    job_ids = {}
+    seen = set()
+    for url in urls:
+        key = url_key(url)
+        if key not in seen:
+            seen.add(key)
+            job_ids[url] = uuid.uuid4().hex
+    prune_jobs()
+    db.session.execute(
+        insert(ImportJob),
+        [
+            {"id": job_id, "user_id": user_id, "url": url, "url_key": url_key(url), "batch_id": batch_id}
+            for url, job_id in job_ids.items()
+        ],
+    )
+    db.session.commit()
+    _executor().submit(_run_batch, current_app._get_current_object(), batch_id, user_id, job_ids)
+    return batch_id, len(job_ids)
+
+
+def batch_results(batch_id, user_id, offset=0):
+    """
+    ([result, ...], finished, total) for a batch of user_id: the results finished after the
+    first offset ones, in finishing order, shaped like import_urls results. None if unknown.
+    """
+    rows = db.session.execute(
+        select(ImportJob.url, ImportJob.status, ImportJob.result, ImportJob.recipe_id)
+        .where(ImportJob.batch_id == batch_id, ImportJob.user_id == user_id)
+        .order_by(ImportJob.finished_at.is_(None), ImportJob.finished_at, ImportJob.id)
+    ).all()
+    if not rows:
+        return None
+    finished = [r for r in rows if r.status != "pending"]
+    results = []
+    for url, status, result, recipe_id in finished[offset:]:
+        data = json.loads(result) if result else {}
+        if status == "done":
+            results.append({"url": url, "ok": True, "recipe_id": recipe_id, "title": data.get("title") or DEFAULT_TITLE})
+        else:
+            results.append({"url": url, "ok": False, "error": data.get("error"), "detail": data.get("detail")})
+    return results, len(finished), len(rows)
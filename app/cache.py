@@ -0,0 +1,90 @@
+"""
+Process-local caches for near-static data (e.g. the Unit catalogue).
+
+Each cache has a version row in cache_versions. Writers call invalidate(),
+which bumps the row inside their transaction; every worker re-reads the
+version at most every VERSION_CHECK_SECONDS and reloads when it changed.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import CacheVersion, Unit
+
+VERSION_CHECK_SECONDS = 5
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+UnitRow = namedtuple("UnitRow", "id name symbol base_unit_id conversion_factor")
+
+
+class VersionedCache:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+
+    def _state(self):
+        return current_app.extensions.setdefault("versioned_caches", {}).get(self.name)
+
+    def _db_version(self):
+        return db.session.execute(
+            select(CacheVersion.version).where(CacheVersion.name == self.name)
+        ).scalar() or 0
+
+    def get(self):
+        """Return (value, etag), reloading if another worker (or this one) invalidated it."""
+        state = self._state()
+        now = time.monotonic()
+        if state is not None and now - state["checked_at"] < VERSION_CHECK_SECONDS:
+            return state["value"], state["etag"]
+        with self._lock:
+            version = self._db_version()
+            state = self._state()
+            if state is None or state["version"] != version:
+                value = self.loader()
+                etag = hashlib.sha1(repr((version, value)).encode()).hexdigest()[:16]
+                state = {"version": version, "value": value, "etag": etag}
+                current_app.extensions["versioned_caches"][self.name] = state
+            state["checked_at"] = now
+        return state["value"], state["etag"]
+
+    def invalidate(self):
+        """Bump the version in the current transaction and drop this worker's copy."""
+        insert = _INSERTS.get(db.session.get_bind(CacheVersion).dialect.name)
+        if insert is not None:
+            # One upsert, so two workers creating the row at once don't hit its primary key
+            stmt = insert(CacheVersion).values(name=self.name, version=1)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[CacheVersion.name], set_={"version": CacheVersion.version + 1}
+            ))
+        else:
+            result = db.session.execute(
+                update(CacheVersion)
+                .where(CacheVersion.name == self.name)
+                .values(version=CacheVersion.version + 1)
+            )
+            if result.rowcount == 0:
+                db.session.add(CacheVersion(name=self.name, version=1))
+        current_app.extensions.setdefault("versioned_caches", {}).pop(self.name, None)
+
+
+def _load_units():
+    rows = db.session.execute(
+        select(Unit.id, Unit.name, Unit.symbol, Unit.base_unit_id, Unit.conversion_factor).order_by(Unit.name)
+    ).all()
+    return tuple(UnitRow(*r) for r in rows)
+
+
+unit_cache = VersionedCache("units", _load_units)
+
+
+def get_units():
+    """All units ordered by name, as UnitRow tuples."""
+    return unit_cache.get()[0]
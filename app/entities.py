@@ -0,0 +1,108 @@
+"""
+Bulk get-or-create for the shared catalogue entities (ingredients, units, tags).
+
+Names match case-insensitively, backed by unique lower(name) indexes. Each
+call costs one SELECT for the known names plus, if anything is new, one
+multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING. Rows that lose a race
+with a concurrent request are picked up with one more SELECT instead of
+creating duplicates.
+"""
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.cache import get_units, unit_cache
+from app.models import IngredientMaster, Tag, Unit
+from app.normalize import fold
+
+DEFAULT_UNIT = "unidad"
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _key(name):
+    return name.strip().lower()
+
+
+def _get_or_create(model, names, values=lambda name: {}):
+    """Return {lower(name): instance} for names, inserting the missing ones in one statement."""
+    wanted = {}
+    for name in names:
+        if name and name.strip():
+            wanted.setdefault(_key(name), name.strip())
+    if not wanted:
+        return {}
+    found = {_key(obj.name): obj for obj in model.query.filter(func.lower(model.name).in_(wanted))}
+    missing = [{"name": name, **values(name)} for key, name in wanted.items() if key not in found]
+    if not missing:
+        return found
+
+    insert = _INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is None:
+        for row in missing:
+            obj = model(**row)
+            db.session.add(obj)
+            found[_key(obj.name)] = obj
+        db.session.flush()
+        return found
+
+    stmt = insert(model).on_conflict_do_nothing().returning(model)
+    for obj in db.session.scalars(stmt, missing):
+        found[_key(obj.name)] = obj
+    lost = [key for key in wanted if key not in found]
+    if lost:
+        found.update(
+            (_key(obj.name), obj) for obj in model.query.filter(func.lower(model.name).in_(lost))
+        )
+    return found
+
+
+def resolve_ingredients(names):
+    """{lower(name): IngredientMaster} for every non-blank name."""
+    return _get_or_create(IngredientMaster, names, lambda name: {"search_name": fold(name)})
+
+
+def resolve_tags(names):
+    """{lower(name): Tag} for every non-blank name."""
+    return _get_or_create(Tag, names)
+
+
+def resolve_units(pairs):
+    """
+    Unit id for each (unit_id, unit_name) pair, in order. A valid unit_id wins, then the
+    name (created if new), then the default unit. Known units come from the unit cache.
+    """
+    units = get_units()
+    known_ids = {u.id for u in units}
+    by_name = {u.name.lower(): u.id for u in units}
+
+    def parse_id(value):
+        try:
+            return int(value) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    unknown_ids = {parse_id(i) for i, _ in pairs} - known_ids - {None}
+    if unknown_ids:
+        # Created by another worker since our cache was loaded
+        known_ids.update(i for (i,) in db.session.query(Unit.id).filter(Unit.id.in_(unknown_ids)))
+
+    new_names = []
+    for unit_id, name in pairs:
+        if parse_id(unit_id) not in known_ids and name and name.strip() and _key(name) not in by_name:
+            new_names.append(name)
+    if new_names:
+        created = _get_or_create(Unit, new_names, lambda name: {"symbol": name[:10]})
+        unit_cache.invalidate()
+        by_name.update((key, u.id) for key, u in created.items())
+
+    result = []
+    for unit_id, name in pairs:
+        uid = parse_id(unit_id)
+        if uid in known_ids:
+            result.append(uid)
+        elif name and name.strip():
+            result.append(by_name.get(_key(name)))
+        else:
+            result.append(by_name.get(DEFAULT_UNIT))
+    return result
@@ -0,0 +1,302 @@
+"""
+Image derivatives: resized WebP and JPEG copies of each uploaded photo.
+
+Variants are stored next to the original (same folder or S3 prefix) as
+<name>_w<width>.webp / .jpg, are EXIF-free (orientation is applied first),
+and are only made for widths smaller than the original. Uploaded originals
+are stored without metadata (store_image()): their bytes are streamed with the
+EXIF, XMP, IPTC, comment and text segments left out, not re-encoded. A JPEG keeps
+only its orientation; a PNG or WebP that needs turning is re-encoded upright. RecipeImage.variants
+records the widths made ("320,640"); NULL means not processed yet (see
+scripts/build_image_variants.py), "" means the original is already small.
+"""
+import io
+import struct
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+VARIANT_WIDTHS = (320, 640, 1280)
+FORMATS = (("webp", "WEBP", {"quality": 80, "method": 4}), ("jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}))
+# How a PNG or WebP original is re-encoded when its EXIF orientation must be applied
+ORIGINAL_FORMATS = {"PNG": ("PNG", {"optimize": True}), "WEBP": ("WEBP", {"lossless": True})}
+ORIENTATION = 0x0112  # EXIF tag
+COPY_CHUNK = 64 * 1024
+# Metadata left out of stored originals: JPEG APPn markers kept (JFIF, ICC profile, Adobe colour
+# transform), PNG chunk types dropped, WebP chunk ids dropped with their VP8X flag bits
+JPEG_KEEP = {0xE0: b"JFIF", 0xE2: b"ICC_PROFILE\0", 0xEE: b"Adobe"}
+PNG_DROP = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+WEBP_DROP = {b"EXIF": 0x08, b"XMP ": 0x04}
+
+
+def variant_name(stored, width, ext):
+    """'s3/recipes/1/abc.jpg', 320, 'webp' -> 's3/recipes/1/abc_w320.webp'."""
+    return f"{stored.rsplit('.', 1)[0]}_w{width}.{ext}"
+
+
+def variant_names(stored, variants):
+    """Stored names of every derivative listed in a RecipeImage.variants value."""
+    return [variant_name(stored, int(w), ext) for w in (variants or "").split(",") if w for ext, _, _ in FORMATS]
+
+
+def _open(fileobj):
+    """(image upright, format Pillow read, EXIF orientation); ValueError if not an image Pillow can read."""
+    try:
+        image = Image.open(fileobj)
+        fmt = image.format
+        orientation = image.getexif().get(ORIENTATION, 1)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"not a readable image: {e}") from e
+    return image, fmt, orientation
+
+
+def load_image(fileobj):
+    """(image upright, format Pillow read). Raises ValueError if fileobj is not an image Pillow can read."""
+    image, fmt, _ = _open(fileobj)
+    return image, fmt
+
+
+def flatten(image):
+    """image as RGB, with transparent areas over white (JPEG has no alpha channel)."""
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode == "P" or "A" in image.getbands():
+        image = image.convert("RGBA")
+        return Image.alpha_composite(Image.new("RGBA", image.size, (255, 255, 255, 255)), image).convert("RGB")
+    return image.convert("RGB")
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file over an iterator of bytes."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b""
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def _read(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("truncated image")
+    return data
+
+
+def _copy(f, n):
+    while n > 0:
+        data = _read(f, min(n, COPY_CHUNK))
+        n -= len(data)
+        yield data
+
+
+def _rest(f):
+    while data := f.read(COPY_CHUNK):
+        yield data
+
+
+def _jpeg_segments(f, orientation):
+    """
+    The JPEG without its metadata segments, up to its first EOI (which also drops the
+    extra pictures of an MPO). Entropy-coded data is copied as it is; anything unexpected
+    ends the parsing and the rest is copied unchanged.
+    """
+    yield _read(f, 2)  # SOI
+    exif = None
+    if orientation != 1:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        exif = exif.tobytes()
+    pending = b""  # read ahead of the entropy-coded data
+    while True:
+        marker = pending[:2] if pending else f.read(2)
+        pending = pending[2:]
+        if len(marker) < 2 or marker[0] != 0xFF:
+            yield marker + pending
+            yield from _rest(f)
+            return
+        code = marker[1]
+        if code == 0xFF:  # fill byte
+            pending = marker[1:] + pending
+            continue
+        if exif is not None and code != 0xE0:  # after JFIF's APP0, which must come first
+            yield b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+            exif = None
+        if code == 0xD9:  # EOI
+            yield marker
+            return
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            yield marker
+            continue
+        if len(pending) < 2:
+            pending += _read(f, 2 - len(pending))
+        length = struct.unpack(">H", pending[:2])[0]
+        if length < 2:
+            yield marker + pending
+            yield from _rest(f)
+            return
+        payload = pending[2:length]
+        pending = pending[length:]
+        payload += _read(f, length - 2 - len(payload))
+        if 0xE0 <= code <= 0xEF or code == 0xFE:
+            if code not in JPEG_KEEP or not payload.startswith(JPEG_KEEP[code]):
+                continue
+        yield marker + struct.pack(">H", length) + payload
+        if code == 0xDA:  # start of scan: copy the entropy-coded data up to the next marker
+            data, start = pending, 0
+            pending = b""
+            while True:
+                i = data.find(b"\xff", start)
+                if i < 0 or i + 1 == len(data):
+                    keep = data[i:] if i >= 0 else b""
+                    if data[: len(data) - len(keep)]:
+                        yield data[: len(data) - len(keep)]
+                    more = f.read(COPY_CHUNK)
+                    if not more:
+                        yield keep
+                        return
+                    data, start = keep + more, 0
+                    continue
+                if data[i + 1] == 0 or 0xD0 <= data[i + 1] <= 0xD7:  # stuffed 0xFF or restart marker
+                    start = i + 2
+                    continue
+                yield data[:i]
+                pending = data[i:]
+                break
+
+
+def _png_chunks(f):
+    """The PNG without its text, EXIF and time chunks."""
+    yield _read(f, 8)  # signature
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            yield header
+            return
+        length = struct.unpack(">I", header[:4])[0]
+        if header[4:] in PNG_DROP:
+            f.seek(length + 4, io.SEEK_CUR)
+            continue
+        yield header
+        yield from _copy(f, length + 4)  # data and CRC
+        if header[4:] == b"IEND":
+            return
+
+
+def _webp_chunks(f):
+    """The WebP without its EXIF and XMP chunks (and their VP8X flags); f must be seekable."""
+    start = f.tell()
+    riff = _read(f, 12)
+    dropped = 0
+    while len(header := f.read(8)) == 8:
+        size = struct.unpack("<I", header[4:])[0]
+        if header[:4] in WEBP_DROP:
+            dropped += 8 + size + size % 2
+        f.seek(size + size % 2, io.SEEK_CUR)
+    f.seek(start + 12)
+    yield riff[:4] + struct.pack("<I", struct.unpack("<I", riff[4:8])[0] - dropped) + riff[8:]
+    while len(header := f.read(8)) == 8:
+        size = struct.unpack("<I", header[4:])[0]
+        padded = size + size % 2
+        if header[:4] in WEBP_DROP:
+            f.seek(padded, io.SEEK_CUR)
+        elif header[:4] == b"VP8X":
+            data = _read(f, padded)
+            flags = data[0] & ~sum(WEBP_DROP.values())
+            yield header + bytes([flags]) + data[1:]
+        else:
+            yield header
+            yield from _copy(f, padded)
+
+
+def clean_original(fileobj, image, fmt, orientation):
+    """
+    A file with fileobj's image without metadata (EXIF with GPS, XMP, comments): its bytes
+    streamed with those segments left out, re-encoded only for a PNG or WebP that has to
+    be turned upright. None for other formats (GIF, which may be animated), kept as uploaded.
+    """
+    fileobj.seek(0)
+    if fmt in ("JPEG", "MPO"):  # MPO: phone cameras' multi-picture JPEG
+        return io.BufferedReader(_ChunkStream(_jpeg_segments(fileobj, orientation)))
+    if fmt not in ORIGINAL_FORMATS:
+        return None
+    if orientation == 1:
+        chunks = _png_chunks(fileobj) if fmt == "PNG" else _webp_chunks(fileobj)
+        return io.BufferedReader(_ChunkStream(chunks))
+    save_as, options = ORIGINAL_FORMATS[fmt]
+    out = io.BytesIO()
+    image.save(out, save_as, icc_profile=image.info.get("icc_profile"), **options)  # colour profile only
+    out.seek(0)
+    return out
+
+
+def _render(image, widths):
+    image = flatten(image)
+    for width in sorted(w for w in widths if w < image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, fmt, options in FORMATS:
+            out = io.BytesIO()
+            resized.save(out, fmt, **options)  # no exif= argument: metadata is dropped
+            yield width, ext, out.getvalue()
+
+
+def render_variants(fileobj, widths=VARIANT_WIDTHS):
+    """
+    Yield (width, ext, bytes) for each width smaller than the image and each format.
+    Raises ValueError if fileobj is not an image Pillow can read.
+    """
+    image, _ = load_image(fileobj)
+    yield from _render(image, widths)
+
+
+def _store_rendered(storage, recipe_id, image, filename, widths):
+    made = []
+    for width, ext, data in _render(image, widths):
+        storage.save(recipe_id, io.BytesIO(data), variant_name(filename, width, ext))
+        if width not in made:
+            made.append(width)
+    return ",".join(str(w) for w in made)
+
+
+def store_variants(storage, recipe_id, fileobj, filename, widths=VARIANT_WIDTHS):
+    """Render and store the derivatives of one image; returns the RecipeImage.variants value."""
+    image, _ = load_image(fileobj)
+    return _store_rendered(storage, recipe_id, image, filename, widths)
+
+
+def store_image(storage, recipe_id, fileobj, filename, widths=VARIANT_WIDTHS):
+    """
+    Store an uploaded image without its metadata, and its derivatives. Returns (stored name,
+    RecipeImage.variants value). Files Pillow can't read are stored as uploaded, with no variants.
+    """
+    try:
+        image, fmt, orientation = _open(fileobj)
+    except ValueError:
+        fileobj.seek(0)
+        return storage.save(recipe_id, fileobj, filename), ""
+    original = clean_original(fileobj, image, fmt, orientation)
+    if original is None:
+        fileobj.seek(0)
+    stored = storage.save(recipe_id, original or fileobj, filename)
+    return stored, _store_rendered(storage, recipe_id, image, filename, widths)
+
+
+def srcset(url_for_name, stored, variants, ext):
+    """'url 320w, url 640w' for the variants of one format, or '' if there are none."""
+    return ", ".join(
+        f"{url_for_name(variant_name(stored, int(w), ext))} {w}w" for w in (variants or "").split(",") if w
+    )
@@ -0,0 +1,270 @@
+"""
+Recipe import from URL as background jobs.
+
+POST /recipes/import-from-url records a job and hands it to a bounded per-process
+thread pool (IMPORT_WORKERS threads, at most IMPORT_QUEUE_MAX jobs queued or running),
+so a slow site no longer holds a request worker. Clients poll, or long-poll with
+?wait=, GET /recipes/import-jobs/<id>. Jobs are rows in import_jobs, so any worker can
+answer the poll. A finished job is also the result cache: importing the same
+normalized URL again within IMPORT_CACHE_SECONDS reuses its payload instead of
+fetching and scraping the page again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from flask import current_app
+from recipe_scrapers import scrape_html
+from sqlalchemy import delete, select, update
+
+from app import db
+from app.models import ImportJob
+
+POLL_INTERVAL = 0.25  # seconds between DB checks when long-polling a job run by another worker
+STALE_SECONDS = 300  # a job still pending after this long died with its worker
+
+_init_lock = threading.Lock()
+_jobs_lock = threading.Lock()
+
+_IMPORT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9,es;q=0.8",
+}
+
+_TRACKING_PARAMS = ("fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+class RecipeImportError(Exception):
+    """The page could not be fetched or no recipe was found; message is shown to the user."""
+
+    def __init__(self, message, detail=None):
+        super().__init__(message)
+        self.detail = detail
+
+    def as_dict(self):
+        return {"error": str(self), "detail": self.detail}
+
+
+def normalize_url(url):
+    """
+    Cache key form of a URL: lowercase scheme and host, no default port, fragment or
+    tracking parameters. 'HTTPS://Example.com:443/r?utm_source=x#top' -> 'https://example.com/r'.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(
+        [
+            (k, v)
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+        ]
+    )
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def url_key(url):
+    return hashlib.sha1(normalize_url(url).encode()).hexdigest()
+
+
+def fetch_recipe(url, timeout=15, session=None):
+    """
+    Fetch a page (with session, to share its connection pool, if given) and scrape it:
+    {"title", "instructions", "ingredients", "image_url"}. Raises RecipeImportError.
+    Needs no app context.
+    """
+    try:
+        resp = (session or requests).get(url, timeout=timeout, headers=_IMPORT_HEADERS, allow_redirects=True)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        raise RecipeImportError("No se pudo cargar la página: " + str(e)) from e
+
+    scraper = None
+    last_error = None
+    try:
+        scraper = scrape_html(resp.text, org_url=resp.url)
+    except Exception as e:
+        last_error = e
+        try:
+            scraper = scrape_html(resp.text, org_url=resp.url, wild_mode=True)
+        except TypeError:
+            pass  # library doesn't support wild_mode
+        except Exception as e2:
+            last_error = e2
+
+    if scraper is None:
+        err_msg = str(last_error) if last_error else "No se pudo extraer la receta."
+        raise RecipeImportError(
+            "No se pudo extraer la receta de esta página. Prueba con otra URL o con un sitio de la lista soportada.",
+            err_msg[:200] if err_msg else None,
+        )
+
+    def _safe(method, default=None):
+        try:
+            out = method()
+            return default if out is None else out
+        except Exception:
+            return default
+
+    title = _safe(scraper.title, "") or ""
+    instructions = _safe(scraper.instructions, "") or ""
+    ingredients = [x for x in (_safe(scraper.ingredients, []) or [])]
+    image_url = _safe(scraper.image, "") or ""
+
+    if not title and not ingredients and not instructions:
+        raise RecipeImportError("No se encontró ninguna receta en esta URL.")
+    return {"title": title, "instructions": instructions, "ingredients": ingredients, "image_url": image_url}
+
+
+def _state():
+    """
+    (executor, free-slot semaphore, job id -> Event, URL key -> job ids) of this process,
+    created on first use. The last maps a URL being fetched to every job waiting for it.
+    """
+    cached = current_app.extensions.get("import_jobs")
+    if cached is None or cached[0] != os.getpid():
+        with _init_lock:
+            cached = current_app.extensions.get("import_jobs")
+            if cached is None or cached[0] != os.getpid():
+                config = current_app.config
+                executor = ThreadPoolExecutor(
+                    max_workers=config.get("IMPORT_WORKERS", 4), thread_name_prefix="recipe-import"
+                )
+                slots = threading.BoundedSemaphore(config.get("IMPORT_QUEUE_MAX", 32))
+                cached = (os.getpid(), executor, slots, {}, {})
+                current_app.extensions["import_jobs"] = cached
+    return cached[1:]
+
+
+def cached_results(keys):
+    """{url key: result JSON} of the recent successful imports among keys (the result cache)."""
+    ttl = current_app.config.get("IMPORT_CACHE_SECONDS", 6 * 3600)
+    rows = db.session.execute(
+        select(ImportJob.url_key, ImportJob.result)
+        .where(
+            ImportJob.url_key.in_(keys),
+            ImportJob.status == "done",
+            ImportJob.finished_at >= datetime.utcnow() - timedelta(seconds=ttl),
+        )
+        .order_by(ImportJob.finished_at)
+    )
+    return {key: result for key, result in rows}
+
+
+def _run(app, key, url, slots, events, inflight):
+    job_ids, popped = [], False
+    try:
+        try:
+            status, result = "done", fetch_recipe(url, app.config.get("IMPORT_FETCH_TIMEOUT", 15))
+        except RecipeImportError as e:
+            status, result = "error", e.as_dict()
+        except Exception as e:  # never leave a job pending
+            status, result = "error", {"error": "No se pudo importar la receta.", "detail": str(e)[:200]}
+        with _jobs_lock:
+            job_ids, popped = inflight.pop(key, []), True
+        with app.app_context():
+            db.session.execute(
+                update(ImportJob)
+                .where(ImportJob.id.in_(job_ids))
+                .values(status=status, result=json.dumps(result), finished_at=datetime.utcnow())
+            )
+            db.session.commit()
+    finally:
+        with _jobs_lock:
+            if not popped:  # once popped, a new fetch of the same page may own inflight[key]
+                job_ids += inflight.pop(key, [])
+            waiting = [events.pop(job_id, None) for job_id in job_ids]
+        slots.release()
+        for event in waiting:
+            if event is not None:
+                event.set()
+
+
+def prune_jobs():
+    """Delete jobs older than both the cache TTL and STALE_SECONDS (in the caller's transaction)."""
+    keep = max(current_app.config.get("IMPORT_CACHE_SECONDS", 6 * 3600), STALE_SECONDS)
+    db.session.execute(delete(ImportJob).where(ImportJob.created_at < datetime.utcnow() - timedelta(seconds=keep)))
+
+
+def submit_import(user_id, url):
+    """
+    Create an import job for url and return it. Served from the result cache when the URL
+    was imported recently, joined to the fetch already running when this process is
+    importing the same page, otherwise queued on the pool. Returns None when the pool is full.
+    """
+    key = url_key(url)
+    job = ImportJob(id=uuid.uuid4().hex, user_id=user_id, url=url, url_key=key)
+    cached = cached_results([key]).get(key)
+    if cached is not None:
+        job.status, job.result, job.finished_at = "done", cached, datetime.utcnow()
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    executor, slots, events, inflight = _state()
+    if not slots.acquire(blocking=False):
+        return None
+    try:
+        prune_jobs()
+        db.session.add(job)
+        db.session.commit()
+        with _jobs_lock:
+            events[job.id] = threading.Event()
+            waiting = inflight.get(key)
+            if waiting is not None:
+                waiting.append(job.id)  # same page already being fetched here: share its result
+            else:
+                inflight[key] = [job.id]
+        if waiting is not None:
+            slots.release()
+        else:
+            executor.submit(_run, current_app._get_current_object(), key, url, slots, events, inflight)
+    except Exception:
+        with _jobs_lock:
+            events.pop(job.id, None)
+            if inflight.get(key) == [job.id]:
+                del inflight[key]
+        slots.release()
+        raise
+    return job
+
+
+def job_status(job_id, user_id, wait=0):
+    """
+    {"id", "status", ...result} for one of the user's jobs, or None. With wait, blocks up to
+    that many seconds (capped at IMPORT_LONG_POLL_SECONDS) for a pending job to finish.
+    """
+    deadline = time.monotonic() + min(wait, current_app.config.get("IMPORT_LONG_POLL_SECONDS", 1))
+    while True:
+        row = db.session.execute(
+            select(ImportJob.status, ImportJob.result, ImportJob.created_at).where(
+                ImportJob.id == job_id, ImportJob.user_id == user_id
+            )
+        ).first()
+        if row is None:
+            return None
+        status, result, created_at = row
+        if status == "pending" and created_at < datetime.utcnow() - timedelta(seconds=STALE_SECONDS):
+            status, result = "error", json.dumps({"error": "La importación no terminó. Inténtalo de nuevo."})
+        remaining = deadline - time.monotonic()
+        if status != "pending" or remaining <= 0:
+            return {"id": job_id, "status": status, **(json.loads(result) if result else {})}
+        db.session.rollback()  # end the read transaction so the next check sees the worker's commit
+        event = _state()[2].get(job_id)
+        if event is not None:
+            event.wait(remaining)  # run by this process: woken as soon as it finishes
+        else:
+            time.sleep(min(POLL_INTERVAL, remaining))
@@ -0,0 +1,173 @@
+"""
+Split ingredient lines ("2 1/2 tazas de harina", "1 cup sugar, sifted") into
+quantity, unit and ingredient name, in Spanish and English.
+
+Units are recognized from UNIT_ALIASES (spellings of the default units, see
+scripts/seed_units.py) plus the name and symbol of every unit in the catalogue.
+The whole grammar is one regex, compiled once per version of the unit cache, so
+parsing a line is a single match and thousands of lines take milliseconds.
+Rows come out in the shape of ingredient_rows_from_form(), ready for
+recipe_ingredient_values().
+"""
+import re
+from fractions import Fraction
+
+from flask import current_app
+
+from app.cache import unit_cache
+from app.quantity import VULGAR_FRACTIONS, format_quantity, parse_quantity
+
+# Spelling -> name of the default unit it means
+UNIT_ALIASES = {
+    "unidad": ("unidad", "unidades", "ud", "uds", "unit", "units", "piece", "pieces", "pieza", "piezas"),
+    "cucharada": ("cucharada", "cucharadas", "cda", "cdas", "tbsp", "tbs", "tablespoon", "tablespoons"),
+    "cucharadita": (
+        "cucharadita", "cucharaditas", "cdta", "cdtas", "cdita", "cditas", "tsp", "teaspoon", "teaspoons",
+    ),
+    "taza": ("taza", "cup"),
+    "tazas": ("tazas", "cups"),
+    "gramos": ("gramos", "gramo", "gr", "grs", "g", "gram", "grams", "gramme", "grammes"),
+    "kilogramos": ("kilogramos", "kilogramo", "kilo", "kilos", "kg", "kgs", "kilogram", "kilograms"),
+    "mililitros": ("mililitros", "mililitro", "ml", "milliliter", "milliliters", "millilitre", "millilitres"),
+    "litros": ("litros", "litro", "l", "lt", "liter", "liters", "litre", "litres"),
+    "libra": ("libra", "libras", "lb", "lbs", "pound", "pounds"),
+    "onza": ("onza", "onzas", "oz", "ounce", "ounces"),
+    "pizca": ("pizca", "pizcas", "pinch", "pinches"),
+    "hojas": ("hojas", "hoja", "leaf", "leaves"),
+    "diente": ("diente", "dientes", "clove", "cloves"),
+    "rodaja": ("rodaja", "rodajas", "slice", "slices"),
+    "rebanada": ("rebanada", "rebanadas"),
+    "tallo": ("tallo", "tallos", "stalk", "stalks"),
+    "manojo": ("manojo", "manojos", "bunch", "bunches"),
+    "sobre": ("sobre", "sobres", "packet", "packets", "envelope", "envelopes"),
+    "lata": ("lata", "latas", "can", "cans", "tin", "tins"),
+}
+# Units that are an amount on their own: "una pizca de sal" has no quantity
+VAGUE_UNITS = ("pizca",)
+
+NUMBER_WORDS = {
+    "un": 1, "una": 1, "uno": 1, "medio": Fraction(1, 2), "media": Fraction(1, 2), "dos": 2, "tres": 3,
+    "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "doce": 12,
+    "a": 1, "an": 1, "one": 1, "half": Fraction(1, 2), "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+}
+
+_ARTICLES = ("a", "an", "un", "una")  # numbers only before a unit: "una taza de leche", not "un huevo" or "a gusto"
+_NUM = r"\d+\s+\d+\s*/\s*\d+|\d+\s*/\s*\d+|\d+(?:[.,]\d+)?|[.,]\d+"
+_VULGAR = re.compile("[" + "".join(VULGAR_FRACTIONS) + "]")
+_BULLET = re.compile(r"^[\s\-–•*·]+")
+_A_LITTLE = re.compile(r"^(un poco|a little|a bit)\s+(?:(?:de|of)\s+)?(?=\S)", re.IGNORECASE)
+_PAREN = re.compile(r"\s*\(([^()]*)\)")
+_OPTIONAL = re.compile(r"\s*\(?\b(?:opcional|optional)\b\)?", re.IGNORECASE)
+
+
+def _words(options):
+    """Regex alternation of options, longest first so 'tazas' wins over 'taza'."""
+    return "|".join(re.escape(o) for o in sorted(options, key=len, reverse=True))
+
+
+class IngredientLineParser:
+    """Parser for one unit catalogue (UnitRow tuples); see parse_line()."""
+
+    def __init__(self, units=()):
+        by_name = {}
+        for u in units:
+            for spelling in (u.name, u.symbol):
+                if spelling and spelling.strip():
+                    by_name.setdefault(spelling.strip().lower(), (u.id, u.name))
+        for u in units:  # plurals after every exact spelling, so the "tazas" unit keeps "tazas"
+            name = u.name.strip().lower()
+            by_name.setdefault(name + ("s" if name[-1:] in "aeiou" else "es"), (u.id, u.name))
+        self.units = {}  # lowercase spelling -> (unit id or None, unit name)
+        for name, spellings in UNIT_ALIASES.items():
+            target = by_name.get(name, (None, name))
+            for spelling in spellings:
+                self.units[spelling] = target
+        self.units.update(by_name)
+        self.pattern = re.compile(
+            r"^(?P<qty>(?:" + _NUM + r")(?:\s*(?:-|–|a|to|o|or)\s*(?:" + _NUM + r"))?"
+            r"|(?:" + _words(NUMBER_WORDS) + r")(?=\s))?\s*"
+            r"(?:\((?P<size>[^()]*)\)\s*)?"  # "1 (14 oz) can tomatoes"
+            r"(?:(?P<unit>" + _words(self.units) + r")\.?(?=[\s,(]|$))?\s*"
+            r"(?:\((?P<unit_size>[^()]*)\)\s*)?"  # "1 taza (240 ml) de leche"
+            r"(?:(?:de|del|of)\s+)?"
+            r"(?P<name>.*?)\s*(?:,\s*(?P<note>.*))?$",
+            re.IGNORECASE,
+        )
+
+    def parse_line(self, line):
+        """
+        {"name", "quantity", "unit_id", "unit_name", "optional", "note"} for one line.
+        Lines without a quantity are kept whole as the name, except for a vague amount ("un poco
+        de sal", "una pizca de sal"), which leaves the quantity empty. Parentheses ("1 taza
+        (240 ml) de leche", "queso (rallado)") go to the note, and a line with nothing after its
+        quantity and unit ("2 ml") gets an empty name. unit_id is None for a known unit that is
+        not in the catalogue yet (unit_name is its default name) or no unit.
+        """
+        text = _BULLET.sub("", _VULGAR.sub(lambda m: " " + VULGAR_FRACTIONS[m.group()], line or ""))
+        text = " ".join(text.split())
+        notes = []
+        little = _A_LITTLE.match(text)
+        if little:
+            notes.append(little[1])
+            text = text[little.end():]
+        m = self.pattern.match(text)
+        qty, unit = m["qty"], m["unit"]
+        vague = bool(unit) and self.units[unit.lower()][1].lower() in VAGUE_UNITS
+        if vague and (not qty or qty.lower() in _ARTICLES):
+            qty = None  # "una pizca de sal", "pizca de sal"
+        elif little or not qty or (qty.lower() in _ARTICLES and not unit):
+            # No quantity ("sal y pimienta, al gusto", "un huevo"): the line is the name
+            m, qty, unit = None, None, None
+        name = (m["name"] or "") if m else text
+        if m:
+            notes += [m["size"], m["unit_size"]]
+        # Parentheticals ("(240 ml)", "(rallado)") are notes, not part of the ingredient's name
+        notes += _PAREN.findall(name)
+        name = " ".join(_PAREN.sub(" ", name).split())
+        if m:
+            notes.append(m["note"])
+        note = ", ".join(part.strip() for part in notes if part and part.strip())
+        optional = bool(_OPTIONAL.search(note) or _OPTIONAL.search(name))
+        if optional:
+            name = _OPTIONAL.sub("", name).strip() or name
+        unit_id, unit_name = self.units.get(unit.lower(), (None, None)) if unit else (None, None)
+        return {
+            "name": name[:200],
+            "quantity": _format_qty(qty),
+            "unit_id": unit_id,
+            "unit_name": unit_name,
+            "optional": optional,
+            "note": note,
+        }
+
+    def parse_lines(self, lines):
+        """parse_line() for each line that has an ingredient name, in order."""
+        rows = (self.parse_line(line) for line in lines if line and line.strip())
+        return [row for row in rows if row["name"].strip()]
+
+
+def _format_qty(qty):
+    """'2 1/2' -> '2 1/2', '0,5' -> '1/2', 'una' -> '1', '2-3' -> '2-3'."""
+    if not qty:
+        return ""
+    word = NUMBER_WORDS.get(qty.lower())
+    if word is not None:
+        return format_quantity(Fraction(word))
+    value = parse_quantity(qty)
+    return format_quantity(value) if value is not None else " ".join(qty.split())
+
+
+def get_parser():
+    """The parser for the current unit catalogue; rebuilt when the unit cache changes."""
+    units, etag = unit_cache.get()
+    cached = current_app.extensions.get("ingredient_parser")
+    if cached is None or cached[0] != etag:
+        cached = (etag, IngredientLineParser(units))
+        current_app.extensions["ingredient_parser"] = cached
+    return cached[1]
+
+
+def parse_ingredient_lines(lines):
+    """Structured rows for raw ingredient lines (see IngredientLineParser.parse_line)."""
+    return get_parser().parse_lines(lines)
@@ -2,13 +2,15 @@ from flask import Blueprint, jsonify, render_template, redirect, url_for, flash,
 from flask_login import login_required, current_user
 
 from app import db
-from app.models import MealPlan, MealPlanRecipe, Recipe, ShoppingList, ShoppingListItem
-from app.shopping import merge_ingredient
+from app.models import MealPlan, MealPlanRecipe, Recipe, ShoppingList
+from app.merge import meal_plan_to_list
+from app.routing import read_only
 
 bp = Blueprint("mealplans", __name__)
 
 
 @bp.route("/")
+@read_only
 @login_required
 def list():
     plans = MealPlan.query.filter_by(user_id=current_user.id).order_by(MealPlan.created_at.desc()).all()
@@ -37,6 +39,7 @@ def add():
 
 
 @bp.route("/<int:id>")
+@read_only
 @login_required
 def detail(id):
     mp = MealPlan.query.filter_by(id=id, user_id=current_user.id).first_or_404()
@@ -183,45 +186,7 @@ def create_shopping_list(id):
     db.session.add(sl)
     db.session.flush()
 
-    def scale_quantity(qty, mult):
-        """Scale quantity by multiplier; return string."""
-        if mult <= 1:
-            return qty or ""
-        try:
-            f = float(qty or 0) * mult
-            from app.shopping import _format_quantity
-
-            return _format_quantity(f)
-        except (ValueError, TypeError):
-            return f"{qty} × {mult}" if qty else str(mult)
-
-    mult = 1
-    existing = []
-    for mpr in mp.recipes:
-        recipe = mpr.recipe
-        if not recipe:
-            continue
-        mult = max(1, mpr.count or 1)
-        for ri in recipe.ingredients:
-            qty = scale_quantity(ri.quantity, mult)
-            if ri.ingredient_master_id and ri.ingredient:
-                new_item = merge_ingredient(
-                    existing,
-                    ri.ingredient_master_id,
-                    ri.unit_id,
-                    qty,
-                )
-            else:
-                name = ri.ingredient.name if ri.ingredient else ""
-                unit_str = (ri.unit.symbol or ri.unit.name) if ri.unit else ""
-                from app.shopping import merge_ingredient_legacy
-
-                new_item = merge_ingredient_legacy(existing, name, qty, unit_str)
-            if new_item:
-                new_item.shopping_list_id = sl.id
-                db.session.add(new_item)
-                existing.append(new_item)
-
+    meal_plan_to_list(mp.id, sl.id)
     db.session.commit()
     flash("Lista de compras creada desde el plan.", "success")
     return redirect(url_for("shopping.detail", id=sl.id))
@@ -0,0 +1,228 @@
+"""
+Shopping-list merge engine.
+
+A list's items are indexed in a dict keyed by (ingredient_master_id, base unit),
+or by normalized (name, unit) for legacy items without an ingredient, so a
+batch of incoming ingredients is merged in one pass. Quantities are summed
+with app/quantity.py, converting between units of the same base unit. The
+result is written with one multi-row INSERT for new items and one bulk UPDATE
+for the items that changed.
+"""
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.models import IngredientMaster, MealPlanRecipe, RecipeIngredient, ShoppingListItem, Unit
+from app.quantity import conversion_table, format_quantity, join_quantity, parse_quantity, split_quantity
+
+
+def scale_quantity(qty, mult):
+    """Scale quantity by multiplier; return string."""
+    if mult <= 1:
+        return qty or ""
+    value = parse_quantity(qty)
+    if value is None:
+        return f"{qty} × {mult}" if qty else str(mult)
+    return format_quantity(value * mult)
+
+
+def add_quantities(q1, q2):
+    """Sum the numeric parts of two quantities; other text ('al gusto') is kept once, after ' + '."""
+    v1, t1 = split_quantity(q1)
+    v2, t2 = split_quantity(q2)
+    total = v2 if v1 is None else (v1 if v2 is None else v1 + v2)
+    return join_quantity(total, t1 + tuple(t for t in t2 if t not in t1))
+
+
+class ItemMerger:
+    """
+    In-memory merge of ingredients into the items of one shopping list.
+
+    Quantities are accumulated as (Fraction, texts) and only formatted back into
+    item["quantity"] by save() (or finish()).
+    """
+
+    def __init__(self, shopping_list_id, items=(), conversions=None):
+        self.shopping_list_id = shopping_list_id
+        self.conversions = conversions or {}
+        self.items = {}
+        self.sums = {}  # id(item) -> [Fraction or None, [texts]]
+        self.new = []
+        self.changed = {}
+        for item in items:
+            self.items.setdefault(self._key(item), item)
+            # A second line for the same ingredient in another unit of the same dimension
+            self.items.setdefault(self._key(item, exact=True), item)
+
+    def _key(self, item, exact=False):
+        if item["ingredient_master_id"]:
+            unit_id = item["unit_id"]
+            if exact:
+                return (item["ingredient_master_id"], unit_id, unit_id)
+            return (item["ingredient_master_id"], self.conversions.get(unit_id, (unit_id, 1))[0])
+        return ((item["ingredient_name"] or "").strip().lower(), (item["unit"] or "").strip().lower())
+
+    def _sum(self, item):
+        acc = self.sums.get(id(item))
+        if acc is None:
+            value, texts = split_quantity(item["quantity"])
+            acc = self.sums[id(item)] = [value, list(texts)]
+        return acc
+
+    def _convert(self, acc, item, unit_id, value):
+        """Add value (in unit_id) to item's sum in the larger unit if that is >= 1; False if not numeric."""
+        if acc[0] is None or acc[1] or value is None:
+            return False
+        f1 = self.conversions.get(item["unit_id"], (None, 1))[1]
+        f2 = self.conversions.get(unit_id, (None, 1))[1]
+        total = acc[0] * f1 + value * f2
+        factor, unit = (f2, unit_id) if f2 > f1 else (f1, item["unit_id"])
+        if total < factor:
+            factor, unit = (f1, item["unit_id"]) if f2 > f1 else (f2, unit_id)
+        acc[0], item["unit_id"] = total / factor, unit
+        return True
+
+    def add(self, ingredient_master_id, unit_id, quantity, name=None, unit=None):
+        """Merge one ingredient: add to the matching item's quantity, or start a new item."""
+        value, texts = split_quantity(quantity)
+        if ingredient_master_id:
+            key = (ingredient_master_id, self.conversions.get(unit_id, (unit_id, 1))[0])
+        else:
+            key = ((name or "").strip().lower(), (unit or "").strip().lower())
+        item = self.items.get(key)
+        if item is not None and ingredient_master_id and item["unit_id"] != unit_id:
+            acc = self._sum(item)
+            if not texts and self._convert(acc, item, unit_id, value):
+                self._touch(item)
+                return
+            # Not numeric: keep a line of its own for this unit
+            key = (ingredient_master_id, unit_id, unit_id)
+            item = self.items.get(key)
+            if item is not None and item["unit_id"] != unit_id:
+                item = None  # that line has since been converted to another unit
+        if item is None:
+            item = {
+                "shopping_list_id": self.shopping_list_id,
+                "ingredient_master_id": ingredient_master_id or None,
+                "unit_id": unit_id if ingredient_master_id else None,
+                "ingredient_name": None if ingredient_master_id else (name or "").strip(),
+                "quantity": quantity or "",
+                "unit": None if ingredient_master_id else (unit or ""),
+                "checked": False,
+            }
+            self.items[key] = item
+            self.sums[id(item)] = [value, list(texts)]
+            self.new.append(item)
+            return
+        acc = self._sum(item)
+        if value is not None:
+            acc[0] = value if acc[0] is None else acc[0] + value
+        acc[1].extend(t for t in texts if t not in acc[1])
+        self._touch(item)
+
+    def _touch(self, item):
+        if "id" in item:
+            self.changed[item["id"]] = item
+
+    def finish(self):
+        """Format the accumulated quantities of new and changed items; returns (new, changed)."""
+        for item in self.new + list(self.changed.values()):
+            value, texts = self.sums[id(item)]
+            item["quantity"] = join_quantity(value, texts)
+        return self.new, self.changed
+
+    def save(self):
+        """Write new items with one INSERT and changed ones with one bulk UPDATE."""
+        new, changed = self.finish()
+        if new:
+            db.session.execute(insert(ShoppingListItem), new)
+        if changed:
+            db.session.execute(
+                update(ShoppingListItem),
+                [
+                    {"id": item["id"], "quantity": item["quantity"], "unit_id": item["unit_id"]}
+                    for item in changed.values()
+                ],
+            )
+        self.new, self.changed = [], {}
+
+
+def load_merger(shopping_list_id):
+    """ItemMerger over the current items of a shopping list (one query)."""
+    rows = db.session.execute(
+        select(
+            ShoppingListItem.id,
+            ShoppingListItem.ingredient_master_id,
+            ShoppingListItem.unit_id,
+            ShoppingListItem.ingredient_name,
+            ShoppingListItem.unit,
+            ShoppingListItem.quantity,
+        ).where(ShoppingListItem.shopping_list_id == shopping_list_id)
+    ).mappings()
+    return ItemMerger(shopping_list_id, [dict(row) for row in rows], conversion_table())
+
+
+_INGREDIENT_COLUMNS = (
+    RecipeIngredient.ingredient_master_id,
+    RecipeIngredient.unit_id,
+    RecipeIngredient.quantity,
+    IngredientMaster.name,
+    Unit.symbol,
+    Unit.name.label("unit_name"),
+)
+
+
+def _with_names(stmt):
+    return stmt.outerjoin(
+        IngredientMaster, IngredientMaster.id == RecipeIngredient.ingredient_master_id
+    ).outerjoin(Unit, Unit.id == RecipeIngredient.unit_id)
+
+
+def _merge_row(merger, row, mult):
+    master_id = row.ingredient_master_id if row.name is not None else None
+    merger.add(
+        master_id,
+        row.unit_id,
+        scale_quantity(row.quantity, mult),
+        name=row.name or "",
+        unit=row.symbol or row.unit_name or "",
+    )
+
+
+def add_recipes(merger, multipliers):
+    """Merge the ingredients of several recipes, {recipe_id: multiplier}, in one query."""
+    if not multipliers:
+        return
+    rows = db.session.execute(
+        _with_names(select(RecipeIngredient.recipe_id, *_INGREDIENT_COLUMNS))
+        .where(RecipeIngredient.recipe_id.in_(multipliers))
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position, RecipeIngredient.id)
+    )
+    for row in rows:
+        _merge_row(merger, row, multipliers[row.recipe_id])
+
+
+def add_recipes_to_list(shopping_list_id, multipliers):
+    """Merge recipes ({recipe_id: multiplier}) into a shopping list and write the result."""
+    merger = load_merger(shopping_list_id)
+    add_recipes(merger, multipliers)
+    merger.save()
+
+
+def meal_plan_to_list(meal_plan_id, shopping_list_id):
+    """
+    Fill a new shopping list with a meal plan's ingredients, each scaled by its recipe's
+    count: one joined SELECT, an in-memory merge and one multi-row INSERT, whatever the plan size.
+    """
+    rows = db.session.execute(
+        _with_names(
+            select(MealPlanRecipe.count, *_INGREDIENT_COLUMNS).join(
+                RecipeIngredient, RecipeIngredient.recipe_id == MealPlanRecipe.recipe_id
+            )
+        )
+        .where(MealPlanRecipe.meal_plan_id == meal_plan_id)
+        .order_by(MealPlanRecipe.id, RecipeIngredient.position, RecipeIngredient.id)
+    )
+    merger = ItemMerger(shopping_list_id, conversions=conversion_table())
+    for row in rows:
+        _merge_row(merger, row, max(1, row.count or 1))
+    merger.save()
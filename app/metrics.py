@@ -0,0 +1,182 @@
+"""
+Prometheus-format metrics of this worker process at /metrics (when METRICS_ENABLED).
+
+Database pools are created as MeteredQueuePool, which times every checkout (waiting for
+a free connection, the pre-ping, and opening a connection when none is idle), split by
+whether a new connection had to be opened. Connection churn is counted from pool events:
+connections opened, closed (recycled, overflow or disposed) and invalidated (failed
+pre-ping or dropped). Gauges show the pool's size and use at scrape time. Each gunicorn
+worker has its own pools, so samples carry a pid label. With PROFILING_ENABLED, the
+per-endpoint request totals of app/profiling.py are served here too.
+"""
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+bp = Blueprint("metrics", __name__)
+
+_opened = threading.local()  # set by the connect event while a checkout opens a connection
+
+
+class Histogram:
+    """Prometheus histogram over BUCKETS (not locked; callers hold their own lock)."""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        out, cumulative = [], 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class PoolMetrics:
+    """Checkout latency and connection churn of one pool in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkout = {"reused": Histogram(), "new": Histogram()}
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+        self.invalidated = 0
+
+    def count(self, attr):
+        with self.lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records each checkout's duration in self.metrics."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()  # engine.dispose(): keep counting into the same metrics
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        _opened.flag = False
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.metrics.count("timeouts")
+            raise
+        elapsed = time.perf_counter() - start
+        with self.metrics.lock:
+            self.metrics.checkout["new" if _opened.flag else "reused"].observe(elapsed)
+        return conn
+
+
+def metered_options(options, uri):
+    """Engine options with MeteredQueuePool as the pool, unless uri is SQLite or a pool class was chosen."""
+    if make_url(uri).get_backend_name() == "sqlite" or "poolclass" in options:
+        return options
+    return {**options, "poolclass": MeteredQueuePool}
+
+
+def _listen(engine):
+    def opened(dbapi_connection, record):
+        _opened.flag = True
+        engine.pool.metrics.count("opened")
+
+    event.listen(engine, "connect", opened)
+    event.listen(engine, "close", lambda *args: engine.pool.metrics.count("closed"))
+    event.listen(engine, "invalidate", lambda *args: engine.pool.metrics.count("invalidated"))
+
+
+def init_pool_metrics(app):
+    """Count connection churn on every metered engine of app (call once, after db.init_app)."""
+    with app.app_context():
+        for engine in db.engines.values():
+            if isinstance(engine.pool, MeteredQueuePool):
+                _listen(engine)
+
+
+def pool_lines():
+    """Prometheus text lines for every metered engine of the current app."""
+    pid = os.getpid()
+    families = {
+        "db_pool_checkout_seconds": ("histogram", "Time to check out a connection, by whether one was opened", []),
+        "db_pool_checkout_timeouts_total": ("counter", "Checkouts that gave up after pool_timeout", []),
+        "db_pool_connections_opened_total": ("counter", "Database connections opened", []),
+        "db_pool_connections_closed_total": ("counter", "Database connections closed", []),
+        "db_pool_connections_invalidated_total": ("counter", "Connections invalidated (failed pre-ping)", []),
+        "db_pool_size": ("gauge", "Configured pool size", []),
+        "db_pool_checked_out": ("gauge", "Connections in use", []),
+        "db_pool_checked_in": ("gauge", "Idle connections in the pool", []),
+        "db_pool_overflow": ("gauge", "Connections beyond pool_size (negative: not yet opened)", []),
+    }
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        if not isinstance(pool, MeteredQueuePool):
+            continue
+        labels = f'engine="{key or "default"}",pid="{pid}"'
+        m = pool.metrics
+        with m.lock:
+            for kind, histogram in m.checkout.items():
+                families["db_pool_checkout_seconds"][2].extend(
+                    histogram.lines("db_pool_checkout_seconds", f'{labels},connection="{kind}"')
+                )
+            counters = {
+                "db_pool_checkout_timeouts_total": m.timeouts,
+                "db_pool_connections_opened_total": m.opened,
+                "db_pool_connections_closed_total": m.closed,
+                "db_pool_connections_invalidated_total": m.invalidated,
+            }
+        gauges = {
+            "db_pool_size": pool.size(),
+            "db_pool_checked_out": pool.checkedout(),
+            "db_pool_checked_in": pool.checkedin(),
+            "db_pool_overflow": pool.overflow(),
+        }
+        for name, value in {**counters, **gauges}.items():
+            families[name][2].append(f"{name}{{{labels}}} {value}")
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        if samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + samples
+    return lines
+
+
+@bp.route("/metrics")
+def metrics():
+    """This worker's metrics in the Prometheus text format. Needs "Authorization: Bearer METRICS_TOKEN" if set."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(404)
+    lines = pool_lines()
+    if current_app.config.get("PROFILING_ENABLED"):
+        from app.profiling import request_lines
+
+        lines += request_lines()
+    body = "\n".join(lines) + "\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
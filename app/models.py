@@ -4,6 +4,7 @@ from flask_login import UserMixin
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import db
+from app.normalize import fold
 
 
 class User(UserMixin, db.Model):
@@ -28,24 +29,40 @@ class User(UserMixin, db.Model):
 
 
 class Unit(db.Model):
-    """Global units of measurement. Extensible for future conversion support."""
+    """Global units of measurement. 1 unit = conversion_factor × base unit (see app/quantity.py)."""
     __tablename__ = "units"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
     symbol = db.Column(db.String(20))
-    # For future unit conversion: base_unit_id, conversion_factor to convert to base
     base_unit_id = db.Column(db.Integer, db.ForeignKey("units.id"))
     conversion_factor = db.Column(db.Float, default=1.0)
 
+    __table_args__ = (db.Index("uq_units_name_lower", db.func.lower(name), unique=True),)
+
     def __repr__(self):
         return self.symbol or self.name
 
 
+class CacheVersion(db.Model):
+    """Version counter per process-local cache; bumping it invalidates the cache in every worker."""
+    __tablename__ = "cache_versions"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
 class IngredientMaster(db.Model):
     """Global searchable ingredients. Shared across recipes for shopping list merge."""
     __tablename__ = "ingredient_masters"
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), unique=True, nullable=False)
+    search_name = db.Column(db.String(200))  # fold(name), for accent-insensitive autocomplete
+
+    __table_args__ = (db.Index("uq_ingredient_masters_name_lower", db.func.lower(name), unique=True),)
+
+    @db.validates("name")
+    def _set_search_name(self, key, value):
+        self.search_name = fold(value)
+        return value
 
 
 class Tag(db.Model):
@@ -53,12 +70,15 @@ class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
 
+    __table_args__ = (db.Index("uq_tags_name_lower", db.func.lower(name), unique=True),)
+
 
 # Association table for Recipe <-> Tag many-to-many
 recipe_tags = db.Table(
     "recipe_tags",
     db.Column("recipe_id", db.Integer, db.ForeignKey("recipes.id"), primary_key=True),
     db.Column("tag_id", db.Integer, db.ForeignKey("tags.id"), primary_key=True),
+    db.Index("ix_recipe_tags_tag_id", "tag_id"),
 )
 
 
@@ -71,23 +91,55 @@ class Recipe(db.Model):
     instructions = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    client_key = db.Column(db.String(100))  # idempotency/sync key from /api/recipes/batch, unique per user
+    source_url = db.Column(db.Text)  # page the recipe was imported from (app/bulk_import.py)
+
+    __table_args__ = (
+        db.Index("uq_recipes_user_client_key", user_id, client_key, unique=True),
+        # A user's recipes in listing order, updated_at DESC NULLS LAST, id DESC (app/pagination.py).
+        # SQLite has no NULLS LAST in indexes, but its DESC order already puts NULLs last.
+        db.Index("ix_recipes_user_updated", user_id, updated_at.desc().nulls_last(), id.desc()).ddl_if(
+            dialect="postgresql"
+        ),
+        db.Index("ix_recipes_user_updated", user_id, updated_at.desc(), id.desc()).ddl_if(dialect="sqlite"),
+    )
 
     ingredients = db.relationship(
-        "RecipeIngredient", backref="recipe", lazy="dynamic", cascade="all, delete-orphan"
+        "RecipeIngredient",
+        backref="recipe",
+        lazy="dynamic",
+        cascade="all, delete-orphan",
+        order_by="[RecipeIngredient.position, RecipeIngredient.id]",
     )
     images = db.relationship("RecipeImage", backref="recipe", lazy="dynamic", cascade="all, delete-orphan")
     tags = db.relationship("Tag", secondary=recipe_tags, backref=db.backref("recipes", lazy="dynamic"))
+    search_document = db.relationship(
+        "RecipeSearchDocument", uselist=False, cascade="all, delete-orphan"
+    )
+
+
+class RecipeSearchDocument(db.Model):
+    """Accent-folded text of a recipe, indexed for full-text search (see app/search.py)."""
+    __tablename__ = "recipe_search_documents"
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    title = db.Column(db.Text, nullable=False, default="")
+    keywords = db.Column(db.Text, nullable=False, default="")  # ingredient and tag names
+    body = db.Column(db.Text, nullable=False, default="")  # description and instructions
 
 
 class RecipeIngredient(db.Model):
     """Links a recipe to a global ingredient with quantity and unit."""
     __tablename__ = "recipe_ingredients"
     id = db.Column(db.Integer, primary_key=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False)
-    ingredient_master_id = db.Column(db.Integer, db.ForeignKey("ingredient_masters.id"), nullable=False)
-    unit_id = db.Column(db.Integer, db.ForeignKey("units.id"))
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False, index=True)
+    ingredient_master_id = db.Column(
+        db.Integer, db.ForeignKey("ingredient_masters.id"), nullable=False, index=True
+    )
+    unit_id = db.Column(db.Integer, db.ForeignKey("units.id"), index=True)
     quantity = db.Column(db.String(50))
     optional = db.Column(db.Boolean, default=False)
+    position = db.Column(db.Integer)  # order within the recipe, with gaps (app/recipes.py); NULL: by id
 
     ingredient = db.relationship("IngredientMaster", backref="recipe_ingredients")
     unit = db.relationship("Unit", backref="recipe_ingredients")
@@ -96,8 +148,9 @@ class RecipeIngredient(db.Model):
 class RecipeImage(db.Model):
     __tablename__ = "recipe_images"
     id = db.Column(db.Integer, primary_key=True)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
+    variants = db.Column(db.String(100))  # widths of the resized copies, e.g. "320,640" (see app/images.py)
 
 
 class ShoppingList(db.Model):
@@ -107,6 +160,8 @@ class ShoppingList(db.Model):
     name = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index("ix_shopping_lists_user_created", user_id, created_at),)
+
     items = db.relationship(
         "ShoppingListItem", backref="shopping_list", lazy="dynamic", cascade="all, delete-orphan"
     )
@@ -115,9 +170,9 @@ class ShoppingList(db.Model):
 class ShoppingListItem(db.Model):
     __tablename__ = "shopping_list_items"
     id = db.Column(db.Integer, primary_key=True)
-    shopping_list_id = db.Column(db.Integer, db.ForeignKey("shopping_lists.id"), nullable=False)
-    ingredient_master_id = db.Column(db.Integer, db.ForeignKey("ingredient_masters.id"))
-    unit_id = db.Column(db.Integer, db.ForeignKey("units.id"))
+    shopping_list_id = db.Column(db.Integer, db.ForeignKey("shopping_lists.id"), nullable=False, index=True)
+    ingredient_master_id = db.Column(db.Integer, db.ForeignKey("ingredient_masters.id"), index=True)
+    unit_id = db.Column(db.Integer, db.ForeignKey("units.id"), index=True)
     ingredient_name = db.Column(db.String(200))  # Fallback for legacy/display
     quantity = db.Column(db.String(50))
     unit = db.Column(db.String(50))  # Fallback for legacy
@@ -135,6 +190,8 @@ class MealPlan(db.Model):
     duration_days = db.Column(db.Integer, default=7, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index("ix_meal_plans_user_created", user_id, created_at),)
+
     recipes = db.relationship(
         "MealPlanRecipe", backref="meal_plan", lazy="dynamic", cascade="all, delete-orphan"
     )
@@ -144,7 +201,26 @@ class MealPlanRecipe(db.Model):
     __tablename__ = "meal_plan_recipes"
     id = db.Column(db.Integer, primary_key=True)
     meal_plan_id = db.Column(db.Integer, db.ForeignKey("meal_plans.id"), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipes.id"), nullable=False, index=True)
     count = db.Column(db.Integer, default=1, nullable=False)
 
+    __table_args__ = (db.Index("ix_meal_plan_recipes_plan_recipe", meal_plan_id, recipe_id),)
+
     recipe = db.relationship("Recipe")
+
+
+class ImportJob(db.Model):
+    """A recipe import from URL (see app/importer.py); finished jobs double as the per-URL result cache."""
+    __tablename__ = "import_jobs"
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    url = db.Column(db.Text, nullable=False)
+    url_key = db.Column(db.String(40), nullable=False)  # sha1 of the normalized URL
+    status = db.Column(db.String(10), nullable=False, default="pending")  # pending, done, error
+    result = db.Column(db.Text)  # JSON: the parsed recipe, or {"error", "detail"}
+    batch_id = db.Column(db.String(32), index=True)  # bulk imports (app/bulk_import.py)
+    recipe_id = db.Column(db.Integer)  # recipe created by a bulk import
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index("ix_import_jobs_url_key_finished", url_key, finished_at),)
@@ -0,0 +1,16 @@
+"""Text normalization shared by recipe search and ingredient autocomplete."""
+import re
+import unicodedata
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(value):
+    """Lowercase and strip accents: 'Limón' -> 'limon'."""
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(value):
+    """Folded words of value: 'Pollo al limón' -> ['pollo', 'al', 'limon']."""
+    return _WORD_RE.findall(fold(value))
@@ -0,0 +1,70 @@
+"""Cursor pagination: keyset on (updated_at, id) for listings, offset for ranked search results."""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(updated_at, id):
+    """Opaque cursor for the row after which the next page starts."""
+    raw = f"{updated_at.isoformat() if updated_at else ''}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (updated_at, id) or None if the cursor is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(ts) if ts else None), int(id)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, ts_col, id_col, cursor=None, limit=20):
+    """
+    Fetch one page of query ordered by ts_col DESC, id_col DESC.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    Only limit + 1 rows are read, no matter how large the collection is.
+    """
+    pos = decode_cursor(cursor)
+    if pos:
+        ts, last_id = pos
+        if ts is None:
+            query = query.filter(ts_col.is_(None), id_col < last_id)
+        else:
+            query = query.filter(
+                or_(
+                    ts_col < ts,
+                    and_(ts_col == ts, id_col < last_id),
+                    ts_col.is_(None),
+                )
+            )
+    rows = query.order_by(ts_col.desc().nulls_last(), id_col.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+    return items, next_cursor
+
+
+def offset_page(query, cursor=None, limit=20):
+    """
+    Fetch one page of an already-ordered query (e.g. ranked search) using an opaque offset cursor.
+    Returns (items, next_cursor) like keyset_page.
+    """
+    offset = 0
+    if cursor:
+        try:
+            offset = max(0, int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()))
+        except (ValueError, TypeError):
+            offset = 0
+    rows = query.offset(offset).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = base64.urlsafe_b64encode(str(offset + limit).encode()).decode().rstrip("=")
+    return items, next_cursor
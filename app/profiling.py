@@ -0,0 +1,285 @@
+"""
+Per-request profiling (when PROFILING_ENABLED): where each request's time went.
+
+Cursor events of every engine time each SQL statement, template signals time rendering and
+botocore events time S3 calls (summed over calls, including those of the upload pool). Each
+response gets a Server-Timing header (db, tpl, s3, total), and each endpoint's totals are
+served with the pool metrics at /metrics. A request that runs the same SELECT
+PROFILING_N_PLUS_ONE times or more is flagged as a likely N+1 (logged once per endpoint and
+statement in each worker). A slow request (PROFILING_SLOW_SECONDS) is logged with its
+statements, for a PROFILING_SLOW_SAMPLE_RATE share of them. Parameters are never logged.
+
+Time spent streaming a response body is not counted. When disabled nothing is registered,
+so requests pay nothing.
+"""
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import before_render_template, current_app, request, request_started, template_rendered
+from sqlalchemy import event
+
+from app import db
+from app.metrics import Histogram
+
+LOG_STATEMENTS = 10  # statements (slowest first) in a slow-request log entry
+LOG_STATEMENT_CHARS = 500
+
+_active = threading.local()  # .profile: the RequestProfile of the request this thread works for
+_init_lock = threading.Lock()
+
+
+class RequestProfile:
+    """What one request spent on SQL, templates and S3."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []  # (sql, seconds, executemany)
+        self.templates = 0.0
+        self.rendering = []  # start times of the render_template calls in progress
+        self.s3 = 0.0
+        self.s3_calls = 0
+        self.lock = threading.Lock()  # S3 calls may come from upload threads
+
+    def add_s3(self, seconds):
+        with self.lock:
+            self.s3 += seconds
+            self.s3_calls += 1
+
+    @property
+    def db(self):
+        return sum(seconds for _, seconds, _ in self.statements)
+
+    def grouped(self):
+        """{sql: [times run, seconds]} of the request's statements."""
+        groups = {}
+        for sql, seconds, _ in self.statements:
+            group = groups.setdefault(sql, [0, 0.0])
+            group[0] += 1
+            group[1] += seconds
+        return groups
+
+    def repeated(self, threshold):
+        """[(sql, times run)] of the SELECTs run at least threshold times (executemany excluded)."""
+        counts = {}
+        for sql, _, executemany in self.statements:
+            if not executemany and sql.lstrip()[:6].upper() == "SELECT":
+                counts[sql] = counts.get(sql, 0) + 1
+        return [(sql, n) for sql, n in counts.items() if n >= threshold]
+
+    def server_timing(self, total, n_plus_one):
+        queries = f"{len(self.statements)} queries" + (", N+1" if n_plus_one else "")
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{queries}", tpl;dur={self.templates * 1000:.1f}, '
+            f's3;dur={self.s3 * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+
+
+class EndpointStats:
+    def __init__(self):
+        self.duration = Histogram()
+        self.queries = 0
+        self.db = 0.0
+        self.templates = 0.0
+        self.s3 = 0.0
+        self.n_plus_one = 0
+        self.slow = 0
+
+
+class RequestMetrics:
+    """Per-endpoint request totals of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.reported = set()  # (endpoint, sql) N+1s already logged
+
+    def record(self, endpoint, total, profile, n_plus_one, slow):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.duration.observe(total)
+            stats.queries += len(profile.statements)
+            stats.db += profile.db
+            stats.templates += profile.templates
+            stats.s3 += profile.s3
+            stats.n_plus_one += n_plus_one
+            stats.slow += slow
+
+    def first_report(self, endpoint, sql):
+        """True the first time this process sees the N+1 (endpoint, sql)."""
+        with self.lock:
+            if (endpoint, sql) in self.reported:
+                return False
+            self.reported.add((endpoint, sql))
+            return True
+
+
+def _metrics():
+    """This process's RequestMetrics (keyed by pid, so forked workers start their own)."""
+    cached = current_app.extensions.get("request_metrics")
+    if cached is None or cached[0] != os.getpid():
+        with _init_lock:
+            cached = current_app.extensions.get("request_metrics")
+            if cached is None or cached[0] != os.getpid():
+                cached = (os.getpid(), RequestMetrics())
+                current_app.extensions["request_metrics"] = cached
+    return cached[1]
+
+
+def carry_profile(fn):
+    """fn, counting into the current request's profile when it runs on another thread."""
+    profile = getattr(_active, "profile", None)
+    if profile is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        _active.profile = profile
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active.profile = None
+
+    return run
+
+
+def instrument_s3(client):
+    """Time the calls of a boto3 S3 client into the active request's profile."""
+
+    def before(context, **kwargs):
+        context["profile_started"] = time.perf_counter()
+
+    def after(context, **kwargs):
+        started = context.pop("profile_started", None)
+        profile = getattr(_active, "profile", None)
+        if started is not None and profile is not None:
+            profile.add_s3(time.perf_counter() - started)
+
+    client.meta.events.register("before-call.s3", before)
+    client.meta.events.register("after-call.s3", after)
+    client.meta.events.register("after-call-error.s3", after)
+    return client
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_active, "profile", None) is not None:
+        context.profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = getattr(_active, "profile", None)
+    started = getattr(context, "profile_started", None)
+    if profile is not None and started is not None:
+        profile.statements.append((statement, time.perf_counter() - started, executemany))
+
+
+def _request_started(sender, **extra):
+    _active.profile = RequestProfile()
+
+
+def _before_render(sender, template, context, **extra):
+    profile = getattr(_active, "profile", None)
+    if profile is not None:
+        profile.rendering.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    profile = getattr(_active, "profile", None)
+    if profile is not None and profile.rendering:
+        started = profile.rendering.pop()
+        if not profile.rendering:  # a template rendered while rendering another is already counted
+            profile.templates += time.perf_counter() - started
+
+
+def _short(sql):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= LOG_STATEMENT_CHARS else sql[:LOG_STATEMENT_CHARS] + "..."
+
+
+def _log_slow(endpoint, status, total, profile):
+    lines = [
+        f"Slow request: {request.method} {request.path} ({endpoint}) {status} in {total * 1000:.0f} ms: "
+        f"db {profile.db * 1000:.0f} ms in {len(profile.statements)} queries, "
+        f"templates {profile.templates * 1000:.0f} ms, s3 {profile.s3 * 1000:.0f} ms in {profile.s3_calls} calls"
+    ]
+    slowest = sorted(profile.grouped().items(), key=lambda item: item[1][1], reverse=True)[:LOG_STATEMENTS]
+    for sql, (count, seconds) in slowest:
+        lines.append(f"  {count:>4}x {seconds * 1000:8.1f} ms  {_short(sql)}")
+    current_app.logger.warning("\n".join(lines))
+
+
+def _after_request(response):
+    profile = getattr(_active, "profile", None)
+    if profile is None:
+        return response
+    total = time.perf_counter() - profile.started
+    config = current_app.config
+    endpoint = request.endpoint or "unmatched"
+    repeated = profile.repeated(config.get("PROFILING_N_PLUS_ONE", 5))
+    slow = total >= config.get("PROFILING_SLOW_SECONDS", 1.0)
+    metrics = _metrics()
+    metrics.record(endpoint, total, profile, bool(repeated), slow)
+    if config.get("PROFILING_SERVER_TIMING", True):
+        response.headers["Server-Timing"] = profile.server_timing(total, bool(repeated))
+    for sql, count in repeated:
+        if metrics.first_report(endpoint, sql):
+            current_app.logger.warning("Possible N+1 in %s: the same query ran %d times: %s", endpoint, count, _short(sql))
+    if slow and random.random() < config.get("PROFILING_SLOW_SAMPLE_RATE", 0.1):
+        _log_slow(endpoint, response.status_code, total, profile)
+    return response
+
+
+def _teardown_request(error=None):
+    _active.profile = None
+
+
+def init_profiling(app):
+    """Register the profiling hooks on app and its engines (call once, after db.init_app)."""
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    request_started.connect(_request_started, app)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def request_lines():
+    """Prometheus text lines of the per-endpoint request totals of this process."""
+    pid = os.getpid()
+    families = {
+        "http_request_duration_seconds": ("histogram", "Request time until the response was ready", []),
+        "http_request_db_queries_total": ("counter", "SQL statements run by requests", []),
+        "http_request_db_seconds_total": ("counter", "Time requests spent running SQL", []),
+        "http_request_template_seconds_total": ("counter", "Time requests spent rendering templates", []),
+        "http_request_s3_seconds_total": ("counter", "Time of requests' S3 calls, summed over calls", []),
+        "http_request_n_plus_one_total": ("counter", "Requests that repeated a SELECT (likely N+1)", []),
+        "http_request_slow_total": ("counter", "Requests slower than PROFILING_SLOW_SECONDS", []),
+    }
+    metrics = _metrics()
+    with metrics.lock:
+        for endpoint, stats in sorted(metrics.endpoints.items()):
+            labels = f'endpoint="{endpoint}",pid="{pid}"'
+            families["http_request_duration_seconds"][2].extend(
+                stats.duration.lines("http_request_duration_seconds", labels)
+            )
+            for name, value in (
+                ("http_request_db_queries_total", stats.queries),
+                ("http_request_db_seconds_total", f"{stats.db:.6f}"),
+                ("http_request_template_seconds_total", f"{stats.templates:.6f}"),
+                ("http_request_s3_seconds_total", f"{stats.s3:.6f}"),
+                ("http_request_n_plus_one_total", stats.n_plus_one),
+                ("http_request_slow_total", stats.slow),
+            ):
+                families[name][2].append(f"{name}{{{labels}}} {value}")
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        if samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + samples
+    return lines
@@ -0,0 +1,110 @@
+"""
+Quantity algebra for shopping lists.
+
+Quantities are free text ("2", "1 1/2", "½", "0,5", "2 + 1/2"). parse_quantity
+turns them into exact Fractions. Units are normalized to their base unit
+(Unit.base_unit_id / conversion_factor) through a conversion table built once
+per process from the unit cache, so "500 g" and "1 kg" add up to "1 1/2 kg".
+Text that is not a number ("al gusto") is kept as is.
+"""
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+from flask import current_app
+
+from app.cache import unit_cache
+
+VULGAR_FRACTIONS = {
+    "½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅕": "1/5", "⅖": "2/5",
+    "⅗": "3/5", "⅘": "4/5", "⅙": "1/6", "⅚": "5/6", "⅛": "1/8", "⅜": "3/8", "⅝": "5/8", "⅞": "7/8",
+}
+_VULGAR = re.compile("[" + "".join(VULGAR_FRACTIONS) + "]")
+_NUMBER = re.compile(
+    r"\s*(?:(?P<whole>\d+)\s+(?P<num>\d+)\s*/\s*(?P<den>\d+)"
+    r"|(?P<fnum>\d+)\s*/\s*(?P<fden>\d+)"
+    r"|(?P<dec>\d+(?:[.,]\d+)?|[.,]\d+))\s*$"
+)
+# Denominators shown as fractions ("1 1/2"); anything else is shown as a decimal.
+KITCHEN_DENOMINATORS = (2, 3, 4, 8)
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text):
+    """Fraction for a quantity string, or None if it is empty or not a number."""
+    if not text:
+        return None
+    text = _VULGAR.sub(lambda m: " " + VULGAR_FRACTIONS[m.group()], str(text))
+    total = Fraction(0)
+    for term in text.split("+"):
+        m = _NUMBER.match(term)
+        if m is None:
+            return None
+        if m["dec"] is not None:
+            total += Fraction(m["dec"].replace(",", "."))
+        elif m["fnum"] is not None:
+            if int(m["fden"]) == 0:
+                return None
+            total += Fraction(int(m["fnum"]), int(m["fden"]))
+        else:
+            if int(m["den"]) == 0:
+                return None
+            total += int(m["whole"]) + Fraction(int(m["num"]), int(m["den"]))
+    return total
+
+
+@lru_cache(maxsize=4096)
+def split_quantity(text):
+    """(numeric sum or None, tuple of non-numeric terms) of 'a + b + ...': '1 + al gusto' -> (1, ('al gusto',))."""
+    value = parse_quantity(text)
+    if value is not None or not text:
+        return value, ()
+    total, texts = None, []
+    for term in str(text).split("+"):
+        term = term.strip()
+        number = parse_quantity(term)
+        if number is not None:
+            total = number if total is None else total + number
+        elif term and term not in texts:
+            texts.append(term)
+    return total, tuple(texts)
+
+
+def join_quantity(value, texts=()):
+    """Inverse of split_quantity: (5/2, ('al gusto',)) -> '2 1/2 + al gusto'."""
+    return " + ".join(([format_quantity(value)] if value is not None else []) + list(texts))
+
+
+def format_quantity(value):
+    """Compact text for a Fraction: 3 -> '3', 3/2 -> '1 1/2', 1/3 -> '1/3', 553.592 -> '553.59'."""
+    if value.denominator == 1:
+        return str(value.numerator)
+    if value.denominator in KITCHEN_DENOMINATORS:
+        whole, rest = divmod(value.numerator, value.denominator)
+        return f"{whole} {rest}/{value.denominator}" if whole else f"{rest}/{value.denominator}"
+    return f"{float(value):.2f}".rstrip("0").rstrip(".")
+
+
+def _build_table(units):
+    parents = {u.id: (u.base_unit_id, u.conversion_factor) for u in units}
+    table = {}
+    for unit_id in parents:
+        base, factor, seen = unit_id, Fraction(1), {unit_id}
+        parent, parent_factor = parents[unit_id]
+        while parent is not None and parent in parents and parent not in seen:
+            factor *= Fraction(str(parent_factor)) if parent_factor else 1
+            base = parent
+            seen.add(parent)
+            parent, parent_factor = parents[parent]
+        table[unit_id] = (base, factor)
+    return table
+
+
+def conversion_table():
+    """{unit_id: (base_unit_id, factor to base)} for every unit; rebuilt when the unit cache changes."""
+    units, etag = unit_cache.get()
+    cached = current_app.extensions.get("unit_conversions")
+    if cached is None or cached[0] != etag:
+        cached = (etag, _build_table(units))
+        current_app.extensions["unit_conversions"] = cached
+    return cached[1]
@@ -1,29 +1,67 @@
+import mimetypes
 import os
+import time
 import uuid
-
-import requests
-from recipe_scrapers import scrape_html
+from difflib import SequenceMatcher
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, send_from_directory, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 
-from sqlalchemy import or_
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import selectinload
 
 from app import db
+from app.cache import get_units
+from app.entities import resolve_ingredients, resolve_tags, resolve_units
 from app.forms import RecipeForm
-from app.models import Recipe, RecipeIngredient, RecipeImage, IngredientMaster, Unit, Tag, recipe_tags
-from app.uploads import use_s3, upload_image, get_image_url, delete_image, delete_recipe_images
+from app.models import Recipe, RecipeIngredient, RecipeImage, Unit
+from app.pagination import keyset_page, offset_page
+from app.routing import read_only
+from app.search import index_recipe, search_query
+from app.images import srcset, variant_name
+from app.importer import job_status, submit_import
+from app.ingredient_parser import parse_ingredient_lines
+from app.uploads import delete_recipe_images, get_image_url, remove_image, store_images, url_max_age
 
 bp = Blueprint("recipes", __name__)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+PAGE_SIZE = 24
+OWNER_CACHE_MAX = 10000  # recipe -> owner entries kept per process for image requests
+POSITION_STEP = 1024  # gap between consecutive ingredient positions, so an insert rarely renumbers
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def save_uploaded_images(recipe_id):
+    """
+    Store the request's image files (concurrently, streamed) and then record them in one
+    INSERT + commit. Runs after the recipe is committed, so no transaction stays open while
+    uploading. Returns False if the upload failed (nothing is recorded).
+    """
+    files = [
+        (file.stream, f"{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}")
+        for file in request.files.getlist("images")
+        if file and file.filename and allowed_file(file.filename)
+    ]
+    if not files:
+        return True
+    try:
+        stored = store_images(recipe_id, files)
+    except Exception:
+        current_app.logger.exception("Image upload failed for recipe %s", recipe_id)
+        return False
+    db.session.execute(
+        insert(RecipeImage),
+        [{"recipe_id": recipe_id, "filename": name, "variants": variants} for name, variants in stored],
+    )
+    db.session.commit()
+    return True
+
+
 def get_recipe_or_404(id):
     recipe = db.session.get(Recipe, id)
     if recipe is None:
@@ -36,145 +74,260 @@ def get_recipe_or_404(id):
 def get_or_create_ingredient(name):
     if not name or not name.strip():
         return None
-    ing = IngredientMaster.query.filter(IngredientMaster.name.ilike(name.strip())).first()
-    if not ing:
-        ing = IngredientMaster(name=name.strip())
-        db.session.add(ing)
-        db.session.flush()
-    return ing
+    return resolve_ingredients([name]).get(name.strip().lower())
 
 
 def get_or_create_tag(name):
     if not name or not name.strip():
         return None
-    tag = Tag.query.filter(Tag.name.ilike(name.strip())).first()
-    if not tag:
-        tag = Tag(name=name.strip())
-        db.session.add(tag)
-        db.session.flush()
-    return tag
+    return resolve_tags([name]).get(name.strip().lower())
 
 
 def get_or_create_unit(unit_id=None, unit_name=None):
-    if unit_id:
-        u = db.session.get(Unit, int(unit_id))
-        if u:
-            return u
-    if unit_name and unit_name.strip():
-        u = Unit.query.filter(Unit.name.ilike(unit_name.strip())).first()
-        if not u:
-            u = Unit(name=unit_name.strip(), symbol=unit_name.strip()[:10])
-            db.session.add(u)
-            db.session.flush()
-        return u
-    return Unit.query.filter_by(name="unidad").first()
+    (uid,) = resolve_units([(unit_id, unit_name)])
+    return db.session.get(Unit, uid) if uid else None
+
+
+def ingredient_rows_from_form():
+    """Parse the parallel ingredient_* form arrays into dicts, skipping blank names."""
+    names = request.form.getlist("ingredient_name")
+    unit_ids = request.form.getlist("ingredient_unit_id")
+    unit_names = request.form.getlist("ingredient_unit")
+    quantities = request.form.getlist("ingredient_quantity")
+    optional_indices = {int(x) for x in request.form.getlist("ingredient_optional") if x.isdigit()}
+    rows = []
+    for i, name in enumerate(names):
+        if name.strip():
+            rows.append({
+                "name": name,
+                "unit_id": unit_ids[i] if i < len(unit_ids) else None,
+                "unit_name": unit_names[i] if i < len(unit_names) else None,
+                "quantity": quantities[i] if i < len(quantities) else "",
+                "optional": i in optional_indices,
+            })
+    return rows
+
+
+def recipe_ingredient_values(recipe_id, rows):
+    """Column values for a RecipeIngredient per row, resolving all ingredients and units in bulk."""
+    ingredients = resolve_ingredients([r["name"] for r in rows])
+    unit_ids = resolve_units([(r["unit_id"], r["unit_name"]) for r in rows])
+    return [
+        {
+            "recipe_id": recipe_id,
+            "ingredient_master_id": ingredients[r["name"].strip().lower()].id,
+            "unit_id": unit_id,
+            "quantity": r["quantity"],
+            "optional": r["optional"],
+        }
+        for r, unit_id in zip(rows, unit_ids)
+    ]
+
+
+def insert_recipe_ingredients(values):
+    """Insert RecipeIngredient rows with one executemany statement, positioned in order within each recipe."""
+    if values:
+        counts = {}
+        rows = []
+        for v in values:
+            n = counts[v["recipe_id"]] = counts.get(v["recipe_id"], -1) + 1
+            rows.append({**v, "position": v.get("position", n * POSITION_STEP)})
+        db.session.execute(insert(RecipeIngredient), rows)
+
+
+def sync_recipe_ingredients(recipe_id, values):
+    """
+    Make the recipe's ingredient rows match values, in order, writing only what changed.
+    Stored rows are matched to values by (ingredient, unit), in order, and the rows left over
+    in a changed stretch by position; matches are updated if they differ, the other stored
+    rows deleted and the other values inserted, each in one bulk statement. Kept rows keep
+    their position, so removing or adding one ingredient near the top touches only that row.
+    """
+    sync_ingredients({recipe_id: values})
+
+
+def _ingredient_positions(pairs, stored):
+    """Position for each value: its matched row's, or one in the gap between its neighbours."""
+    positions = [row.position if row is not None else None for row in pairs]
+    if any(row.position is None for row in stored):  # rows from before positions: number them all
+        return [j * POSITION_STEP for j in range(len(pairs))]
+    j = 0
+    while j < len(positions):
+        if positions[j] is not None:
+            j += 1
+            continue
+        end = j
+        while end < len(positions) and positions[end] is None:
+            end += 1
+        n = end - j
+        after = positions[end] if end < len(positions) else None
+        before = positions[j - 1] if j > 0 else None
+        if before is None:
+            before = after - (n + 1) * POSITION_STEP if after is not None else -POSITION_STEP
+        step = ((after - before) // (n + 1)) if after is not None else POSITION_STEP
+        if step < 1:  # no room left between the neighbours
+            return [k * POSITION_STEP for k in range(len(pairs))]
+        for k in range(n):
+            positions[j + k] = before + step * (k + 1)
+        j = end
+    return positions
+
+
+def sync_ingredients(values_by_recipe):
+    """sync_recipe_ingredients() for many recipes at once: one SELECT, then at most one DELETE, UPDATE and INSERT."""
+    if not values_by_recipe:
+        return
+    stored = {}
+    for row in db.session.execute(
+        select(
+            RecipeIngredient.id,
+            RecipeIngredient.recipe_id,
+            RecipeIngredient.ingredient_master_id,
+            RecipeIngredient.unit_id,
+            RecipeIngredient.quantity,
+            RecipeIngredient.optional,
+            RecipeIngredient.position,
+        )
+        .where(RecipeIngredient.recipe_id.in_(values_by_recipe))
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position, RecipeIngredient.id)
+    ):
+        stored.setdefault(row.recipe_id, []).append(row)
+    updates, delete_ids, inserts = [], [], []
+    for recipe_id, values in values_by_recipe.items():
+        rows = stored.get(recipe_id, [])
+        matcher = SequenceMatcher(
+            None,
+            [(row.ingredient_master_id, row.unit_id) for row in rows],
+            [(v["ingredient_master_id"], v["unit_id"]) for v in values],
+            autojunk=False,
+        )
+        pairs = [None] * len(values)
+        for _, i1, i2, j1, j2 in matcher.get_opcodes():
+            n = min(i2 - i1, j2 - j1)
+            pairs[j1:j1 + n] = rows[i1:i1 + n]
+            delete_ids.extend(row.id for row in rows[i1 + n:i2])
+        for row, new, position in zip(pairs, values, _ingredient_positions(pairs, rows)):
+            new = {**new, "position": position}
+            if row is None:
+                inserts.append(new)
+            elif (
+                row.ingredient_master_id != new["ingredient_master_id"]
+                or row.unit_id != new["unit_id"]
+                or (row.quantity or "") != (new["quantity"] or "")
+                or bool(row.optional) != bool(new["optional"])
+                or row.position != position
+            ):
+                updates.append({"id": row.id, **new})
+    if delete_ids:
+        RecipeIngredient.query.filter(RecipeIngredient.id.in_(delete_ids)).delete(synchronize_session=False)
+    if updates:
+        db.session.execute(update(RecipeIngredient), updates)
+    insert_recipe_ingredients(inserts)
+
+
+def tag_names_from_string(tags_str):
+    """Names in a comma-separated string, in order, without case-insensitive duplicates."""
+    names = {}
+    for name in (t.strip() for t in (tags_str or "").split(",")):
+        if name:
+            names.setdefault(name.lower(), name)
+    return [name for name in names.values()]
+
+
+def tags_from_string(tags_str):
+    """Tag objects for a comma-separated string, in order, without duplicates."""
+    names = tag_names_from_string(tags_str)
+    tags = resolve_tags(names)
+    return [tags[name.lower()] for name in names]
+
+
+def attach_cover_images(recipes):
+    """Set recipe.cover_image (first RecipeImage or None) for all recipes in a single query."""
+    by_id = {r.id: r for r in recipes}
+    for r in recipes:
+        r.cover_image = None
+    if not by_id:
+        return recipes
+    images = (
+        RecipeImage.query.filter(RecipeImage.recipe_id.in_(by_id.keys()))
+        .order_by(RecipeImage.recipe_id, RecipeImage.id)
+        .all()
+    )
+    for img in images:
+        recipe = by_id[img.recipe_id]
+        if recipe.cover_image is None:
+            recipe.cover_image = img
+    return recipes
 
 
 @bp.route("/")
+@read_only
 def list():
     if not current_user.is_authenticated:
         return redirect(url_for("auth.login"))
     q = request.args.get("q", "").strip()
-    base = Recipe.query.filter_by(user_id=current_user.id)
-    if q:
-        term = f"%{q}%"
-        recipes = (
-            base.outerjoin(RecipeIngredient)
-            .outerjoin(IngredientMaster)
-            .outerjoin(recipe_tags)
-            .outerjoin(Tag)
-            .filter(
-                or_(
-                    Recipe.title.ilike(term),
-                    IngredientMaster.name.ilike(term),
-                    Tag.name.ilike(term),
-                )
-            )
-            .distinct()
-            .order_by(Recipe.updated_at.desc())
-            .all()
-        )
+    cursor = request.args.get("cursor") or None
+    found = search_query(current_user.id, q) if q else None
+    if found is not None:
+        recipes, next_cursor = offset_page(found.options(selectinload(Recipe.tags)), cursor, PAGE_SIZE)
+    elif q:
+        recipes, next_cursor = [], None
     else:
-        recipes = base.order_by(Recipe.updated_at.desc()).all()
-    return render_template("recipes/list.html", recipes=recipes, search_query=q)
+        base = Recipe.query.filter_by(user_id=current_user.id).options(selectinload(Recipe.tags))
+        recipes, next_cursor = keyset_page(base, Recipe.updated_at, Recipe.id, cursor, PAGE_SIZE)
+    attach_cover_images(recipes)
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "application/json":
+        return jsonify({
+            "recipes": [{"id": r.id, "title": r.title} for r in recipes],
+            "html": render_template("recipes/_cards.html", recipes=recipes),
+            "next_cursor": next_cursor,
+        })
+    return render_template(
+        "recipes/list.html", recipes=recipes, search_query=q, next_cursor=next_cursor, cursor=cursor
+    )
 
 
-# Browser-like headers to reduce blocking (e.g. Bon Appétit, paywalled sites)
-_IMPORT_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    ),
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9,es;q=0.8",
-}
+def with_ingredient_rows(body):
+    """Add ingredient_rows (quantity, unit, name per line; see app/ingredient_parser.py) to a finished import."""
+    if body.get("status") == "done":
+        body["ingredient_rows"] = parse_ingredient_lines(body.get("ingredients") or [])
+    return body
 
 
 @bp.route("/import-from-url", methods=["POST"])
 @login_required
 def import_from_url():
-    """Fetch a recipe from a URL and return title, instructions, ingredients (raw strings), image_url for form prefill."""
+    """
+    Start importing a recipe from a URL (title, instructions, ingredients and parsed
+    ingredient_rows, image_url for form prefill). Returns the job; poll its poll_url until
+    status is no longer "pending".
+    """
     data = request.get_json() or {}
     url = (data.get("url") or request.form.get("url") or "").strip()
     if not url:
         return jsonify({"error": "url required"}), 400
     if not url.startswith(("http://", "https://")):
         return jsonify({"error": "invalid url"}), 400
-    try:
-        resp = requests.get(
-            url,
-            timeout=15,
-            headers=_IMPORT_HEADERS,
-            allow_redirects=True,
-        )
-        resp.raise_for_status()
-    except requests.RequestException as e:
-        return jsonify({"error": "No se pudo cargar la página: " + str(e)}), 400
+    job = submit_import(current_user.id, url)
+    if job is None:
+        return jsonify({"error": "Hay demasiadas importaciones en curso. Inténtalo en unos segundos."}), 503
+    body = with_ingredient_rows(job_status(job.id, current_user.id))
+    body["poll_url"] = url_for("recipes.import_job", job_id=job.id)
+    return jsonify(body), 202 if body["status"] == "pending" else 200
 
-    scraper = None
-    last_error = None
-    try:
-        scraper = scrape_html(resp.text, org_url=resp.url)
-    except Exception as e:
-        last_error = e
-        try:
-            scraper = scrape_html(resp.text, org_url=resp.url, wild_mode=True)
-        except TypeError:
-            pass  # library doesn't support wild_mode
-        except Exception as e2:
-            last_error = e2
-
-    if scraper is None:
-        err_msg = str(last_error) if last_error else "No se pudo extraer la receta."
-        return jsonify({
-            "error": "No se pudo extraer la receta de esta página. Prueba con otra URL o con un sitio de la lista soportada.",
-            "detail": err_msg[:200] if err_msg else None,
-        }), 400
-
-    def _safe(method, default=None):
-        try:
-            out = method()
-            return default if out is None else out
-        except Exception:
-            return default
-
-    title = _safe(scraper.title, "") or ""
-    instructions = _safe(scraper.instructions, "") or ""
-    ingredients = _safe(scraper.ingredients, [])
-    ingredients = [x for x in (ingredients or [])]
-    image_url = _safe(scraper.image, "") or ""
-
-    if not title and not ingredients and not instructions:
-        return jsonify({"error": "No se encontró ninguna receta en esta URL."}), 400
-    return jsonify({
-        "title": title,
-        "instructions": instructions,
-        "ingredients": ingredients,
-        "image_url": image_url,
-    })
+
+@bp.route("/import-jobs/<job_id>")
+@login_required
+def import_job(job_id):
+    """Status of an import job, right away; ?wait=N blocks while pending, for at most IMPORT_LONG_POLL_SECONDS."""
+    body = job_status(job_id, current_user.id, wait=request.args.get("wait", 0, type=float))
+    if body is None:
+        abort(404)
+    return jsonify(with_ingredient_rows(body))
 
 
 @bp.route("/<int:id>")
+@read_only
 @login_required
 def detail(id):
     recipe = get_recipe_or_404(id)
@@ -195,57 +348,18 @@ def add():
         db.session.add(recipe)
         db.session.flush()
 
-        unit_ids = request.form.getlist("ingredient_unit_id")
-        unit_names = request.form.getlist("ingredient_unit")
-        quantities = request.form.getlist("ingredient_quantity")
-        optional_indices = {int(x) for x in request.form.getlist("ingredient_optional") if x.isdigit()}
-        for i, name in enumerate(request.form.getlist("ingredient_name")):
-            if name.strip():
-                ing = get_or_create_ingredient(name)
-                if ing:
-                    unit_id = unit_ids[i] if i < len(unit_ids) else None
-                    unit_name = unit_names[i] if i < len(unit_names) else None
-                    u = get_or_create_unit(unit_id=unit_id, unit_name=unit_name)
-                    opt = i in optional_indices
-                    ri = RecipeIngredient(
-                        recipe_id=recipe.id,
-                        ingredient_master_id=ing.id,
-                        unit_id=u.id if u else None,
-                        quantity=quantities[i] if i < len(quantities) else "",
-                        optional=opt,
-                    )
-                    db.session.add(ri)
-
-        # Tags
-        tags_str = (form.tags.data or "").strip()
-        recipe.tags = []
-        for tname in [t.strip() for t in tags_str.split(",") if t.strip()]:
-            tag = get_or_create_tag(tname)
-            if tag:
-                recipe.tags.append(tag)
-
-        for file in request.files.getlist("images"):
-            if file and file.filename and allowed_file(file.filename):
-                ext = file.filename.rsplit(".", 1)[1].lower()
-                unique_name = f"{uuid.uuid4().hex}.{ext}"
-                if use_s3():
-                    data = file.read()
-                    stored = upload_image(recipe.id, data, unique_name)
-                    if stored:
-                        img = RecipeImage(recipe_id=recipe.id, filename=stored)
-                        db.session.add(img)
-                else:
-                    recipe_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], str(recipe.id))
-                    os.makedirs(recipe_dir, exist_ok=True)
-                    filepath = os.path.join(recipe_dir, unique_name)
-                    file.save(filepath)
-                    img = RecipeImage(recipe_id=recipe.id, filename=unique_name)
-                    db.session.add(img)
+        insert_recipe_ingredients(recipe_ingredient_values(recipe.id, ingredient_rows_from_form()))
+        recipe.tags = tags_from_string(form.tags.data)
+        index_recipe(recipe)
 
+        recipe_id = recipe.id
         db.session.commit()
-        flash("Receta creada correctamente.", "success")
-        return redirect(url_for("recipes.detail", id=recipe.id))
-    units = Unit.query.order_by(Unit.name).all()
+        if not save_uploaded_images(recipe_id):
+            flash("La receta se guardó, pero no se pudieron subir las imágenes.", "error")
+        else:
+            flash("Receta creada correctamente.", "success")
+        return redirect(url_for("recipes.detail", id=recipe_id))
+    units = get_units()
     return render_template("recipes/form.html", form=form, recipe=None, units=units)
 
 
@@ -259,75 +373,27 @@ def edit(id):
         recipe.description = form.description.data or ""
         recipe.instructions = form.instructions.data or ""
 
-        RecipeIngredient.query.filter_by(recipe_id=recipe.id).delete()
-        unit_ids = request.form.getlist("ingredient_unit_id")
-        unit_names = request.form.getlist("ingredient_unit")
-        quantities = request.form.getlist("ingredient_quantity")
-        optional_indices = {int(x) for x in request.form.getlist("ingredient_optional") if x.isdigit()}
-        for i, name in enumerate(request.form.getlist("ingredient_name")):
-            if name.strip():
-                ing = get_or_create_ingredient(name)
-                if ing:
-                    unit_id = unit_ids[i] if i < len(unit_ids) else None
-                    unit_name = unit_names[i] if i < len(unit_names) else None
-                    u = get_or_create_unit(unit_id=unit_id, unit_name=unit_name)
-                    opt = i in optional_indices
-                    ri = RecipeIngredient(
-                        recipe_id=recipe.id,
-                        ingredient_master_id=ing.id,
-                        unit_id=u.id if u else None,
-                        quantity=quantities[i] if i < len(quantities) else "",
-                        optional=opt,
-                    )
-                    db.session.add(ri)
-
-        # Tags
-        tags_str = (form.tags.data or "").strip()
-        recipe.tags = []
-        for tname in [t.strip() for t in tags_str.split(",") if t.strip()]:
-            tag = get_or_create_tag(tname)
-            if tag:
-                recipe.tags.append(tag)
+        sync_recipe_ingredients(recipe.id, recipe_ingredient_values(recipe.id, ingredient_rows_from_form()))
+        tag_names = tag_names_from_string(form.tags.data)
+        if {t.lower() for t in tag_names} != {t.name.lower() for t in recipe.tags}:
+            recipe.tags = tags_from_string(form.tags.data)
+        index_recipe(recipe)
 
         remove_ids = request.form.getlist("remove_image")
         for img_id in remove_ids:
             try:
                 img = db.session.get(RecipeImage, int(img_id))
                 if img and img.recipe_id == recipe.id:
-                    if img.filename.startswith("s3/"):
-                        delete_image(img.filename)
-                    else:
-                        filepath = os.path.join(
-                            current_app.config["UPLOAD_FOLDER"],
-                            str(recipe.id),
-                            img.filename,
-                        )
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
+                    remove_image(recipe.id, img.filename, img.variants)
                     db.session.delete(img)
             except (ValueError, TypeError, AttributeError):
                 pass
 
-        for file in request.files.getlist("images"):
-            if file and file.filename and allowed_file(file.filename):
-                ext = file.filename.rsplit(".", 1)[1].lower()
-                unique_name = f"{uuid.uuid4().hex}.{ext}"
-                if use_s3():
-                    data = file.read()
-                    stored = upload_image(recipe.id, data, unique_name)
-                    if stored:
-                        img = RecipeImage(recipe_id=recipe.id, filename=stored)
-                        db.session.add(img)
-                else:
-                    recipe_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], str(recipe.id))
-                    os.makedirs(recipe_dir, exist_ok=True)
-                    filepath = os.path.join(recipe_dir, unique_name)
-                    file.save(filepath)
-                    img = RecipeImage(recipe_id=recipe.id, filename=unique_name)
-                    db.session.add(img)
-
         db.session.commit()
-        flash("Receta actualizada correctamente.", "success")
+        if not save_uploaded_images(id):
+            flash("La receta se guardó, pero no se pudieron subir las imágenes.", "error")
+        else:
+            flash("Receta actualizada correctamente.", "success")
         return redirect(url_for("recipes.detail", id=recipe.id))
 
     if request.method == "GET":
@@ -335,7 +401,7 @@ def edit(id):
         form.description.data = recipe.description
         form.instructions.data = recipe.instructions
         form.tags.data = ", ".join(t.name for t in recipe.tags)
-    units = Unit.query.order_by(Unit.name).all()
+    units = get_units()
     return render_template("recipes/form.html", form=form, recipe=recipe, units=units)
 
 
@@ -351,21 +417,99 @@ def delete(id):
         os.rmdir(recipe_dir)
     db.session.delete(recipe)
     db.session.commit()
+    current_app.extensions.get("recipe_owner_cache", {}).pop(recipe.id, None)
     flash("Receta eliminada.", "info")
     return redirect(url_for("recipes.list"))
 
 
+@bp.app_template_global()
+def image_url(recipe_id, filename):
+    """Image src: the presigned S3 URL itself (no redirect through serve_image), else serve_image."""
+    if filename.startswith("s3/"):
+        url = get_image_url(recipe_id, filename)
+        if url:
+            return url
+    return url_for("recipes.serve_image", recipe_id=recipe_id, filename=filename)
+
+
+@bp.app_template_global()
+def image_srcset(recipe_id, image, ext):
+    """srcset of one format ('webp' or 'jpg') of a RecipeImage's resized variants."""
+    return srcset(lambda name: image_url(recipe_id, name), image.filename, image.variants, ext)
+
+
+@bp.app_template_global()
+def image_src(recipe_id, image):
+    """Fallback src: the largest JPEG variant, or the original when there are none."""
+    widths = [w for w in (image.variants or "").split(",") if w]
+    if widths:
+        return image_url(recipe_id, variant_name(image.filename, widths[-1], "jpg"))
+    return image_url(recipe_id, image.filename)
+
+
+def _recipe_owner(recipe_id):
+    """
+    User id owning a recipe (None if it doesn't exist). Owners never change, so the answer
+    is cached per process for IMAGE_OWNER_CACHE_SECONDS: a page full of images costs one
+    lookup, not one per image. The TTL bounds how long another worker trusts a deleted recipe.
+    """
+    cache = current_app.extensions.setdefault("recipe_owner_cache", {})
+    now = time.monotonic()
+    hit = cache.get(recipe_id)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    owner = db.session.scalar(select(Recipe.user_id).where(Recipe.id == recipe_id))
+    if owner is not None:
+        if len(cache) >= OWNER_CACHE_MAX:
+            cache.clear()
+        cache[recipe_id] = (now + current_app.config.get("IMAGE_OWNER_CACHE_SECONDS", 300), owner)
+    return owner
+
+
+def _send_local_image(recipe_id, filename):
+    """
+    A local image. Stored names are unique per upload and never rewritten, so the name is a
+    strong ETag (revalidation answers 304 without touching the disk) and the response may be
+    cached as immutable. With IMAGE_SENDFILE the front proxy streams the bytes instead of
+    this worker: nginx via X-Accel-Redirect to IMAGE_ACCEL_PREFIX (an internal location
+    aliased to UPLOAD_FOLDER), Apache/lighttpd via X-Sendfile.
+    """
+    config = current_app.config
+    path = safe_join(config["UPLOAD_FOLDER"], str(recipe_id), filename)
+    if path is None:
+        abort(404)
+    if request.if_none_match.contains_weak(filename):
+        resp = current_app.response_class(status=304)
+    else:
+        mode = config.get("IMAGE_SENDFILE")
+        if mode in ("x-accel-redirect", "x-sendfile"):
+            mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            resp = current_app.response_class(mimetype=mimetype)
+            if mode == "x-accel-redirect":
+                resp.headers["X-Accel-Redirect"] = f"{config['IMAGE_ACCEL_PREFIX'].rstrip('/')}/{recipe_id}/{filename}"
+            else:
+                resp.headers["X-Sendfile"] = path
+        else:
+            resp = send_from_directory(
+                os.path.join(config["UPLOAD_FOLDER"], str(recipe_id)), filename, etag=False, max_age=None
+            )
+    resp.set_etag(filename)
+    resp.headers["Cache-Control"] = config.get("IMAGE_CACHE_CONTROL", "private, max-age=31536000, immutable")
+    return resp
+
+
 @bp.route("/<int:recipe_id>/images/<path:filename>")
 def serve_image(recipe_id, filename):
     if not current_user.is_authenticated:
         abort(404)
-    recipe = db.session.get(Recipe, recipe_id)
-    if recipe is None or recipe.user_id != current_user.id:
+    if _recipe_owner(recipe_id) != current_user.id:
         abort(404)
     if filename.startswith("s3/"):
         url = get_image_url(recipe_id, filename)
         if url:
-            return redirect(url)
+            resp = redirect(url)
+            resp.cache_control.private = True
+            resp.cache_control.max_age = url_max_age()
+            return resp
         abort(404)
-    upload_folder = current_app.config["UPLOAD_FOLDER"]
-    return send_from_directory(os.path.join(upload_folder, str(recipe_id)), filename)
+    return _send_local_image(recipe_id, filename)
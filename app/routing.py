@@ -0,0 +1,66 @@
+"""
+Read replica routing (DATABASE_REPLICA_URL).
+
+Views decorated with @read_only run the SELECTs of their GET/HEAD requests on the
+"replica" bind; everything else, and any statement that writes or locks, goes to the
+primary. Once a request writes, its later reads go to the primary too, and the user
+stays on the primary for DB_REPLICA_STICKY_SECONDS (a timestamp in the session cookie)
+so the page after a POST shows what was just saved even if the replica lags.
+"""
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.selectable import CompoundSelect, Select
+
+REPLICA = "replica"
+STICKY_KEY = "_db_primary_until"
+
+
+def _is_read(clause):
+    return isinstance(clause, (Select, CompoundSelect)) and getattr(clause, "_for_update_arg", None) is None
+
+
+class RoutingSession(Session):
+    """db.session class: reads of @read_only requests go to the replica engine (see module docstring)."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+                g.db_replica = False
+            elif g.get("db_replica") and _is_read(clause):
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_enabled():
+    return REPLICA in (current_app.config.get("SQLALCHEMY_BINDS") or {})
+
+
+def read_only(view):
+    """
+    Serve the view's GET/HEAD requests from the read replica, unless this user wrote in
+    the last DB_REPLICA_STICKY_SECONDS. Put it below @bp.route and above @login_required,
+    so loading the user is routed too.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD") and replica_enabled() and session.get(STICKY_KEY, 0) <= time.time():
+            g.db_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_routing(app):
+    """Make requests that wrote stick to the primary for a while (only with a replica configured)."""
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get("db_wrote") and replica_enabled():
+            session[STICKY_KEY] = time.time() + current_app.config.get("DB_REPLICA_STICKY_SECONDS", 10)
+        return response
@@ -0,0 +1,164 @@
+"""
+Full-text recipe search.
+
+Each recipe has one RecipeSearchDocument row (title, ingredient/tag names,
+description/instructions), refreshed by index_recipe() on add/edit.
+- PostgreSQL: stored, generated weighted tsvector column with a GIN index, ranked by ts_rank.
+- SQLite: FTS5 external-content table kept in sync by triggers, ranked by bm25.
+- Anything else: LIKE over the folded document columns (no joins, no DISTINCT).
+Text is lowercased and accent-folded so "limon" matches "limón".
+"""
+from sqlalchemy import DDL, and_, column, event, func, literal_column, or_, select, table, text
+
+from app import db
+from app.models import IngredientMaster, Recipe, RecipeIngredient, RecipeSearchDocument
+from app.normalize import fold, tokenize
+
+TS_CONFIG = "'simple'::regconfig"
+FTS_TABLE = "recipe_search_fts"
+
+_doc = RecipeSearchDocument.__table__
+
+
+_TSVECTOR_SQL = (
+    f"setweight(to_tsvector({TS_CONFIG}, coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector({TS_CONFIG}, coalesce(keywords, '')), 'B') || "
+    f"setweight(to_tsvector({TS_CONFIG}, coalesce(body, '')), 'C')"
+)
+
+_DDL = [
+    (
+        "postgresql",
+        "ALTER TABLE recipe_search_documents ADD COLUMN IF NOT EXISTS tsv tsvector "
+        f"GENERATED ALWAYS AS ({_TSVECTOR_SQL}) STORED",
+    ),
+    (
+        "postgresql",
+        "CREATE INDEX IF NOT EXISTS ix_recipe_search_documents_tsv "
+        "ON recipe_search_documents USING GIN (tsv)",
+    ),
+    (
+        "sqlite",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "title, keywords, body, content='recipe_search_documents', content_rowid='recipe_id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+    ),
+    (
+        "sqlite",
+        "CREATE TRIGGER IF NOT EXISTS recipe_search_ai AFTER INSERT ON recipe_search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, keywords, body) "
+        "VALUES (new.recipe_id, new.title, new.keywords, new.body); END",
+    ),
+    (
+        "sqlite",
+        "CREATE TRIGGER IF NOT EXISTS recipe_search_ad AFTER DELETE ON recipe_search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, keywords, body) "
+        "VALUES ('delete', old.recipe_id, old.title, old.keywords, old.body); END",
+    ),
+    (
+        "sqlite",
+        "CREATE TRIGGER IF NOT EXISTS recipe_search_au AFTER UPDATE ON recipe_search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, keywords, body) "
+        "VALUES ('delete', old.recipe_id, old.title, old.keywords, old.body); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, keywords, body) "
+        "VALUES (new.recipe_id, new.title, new.keywords, new.body); END",
+    ),
+]
+
+for _dialect, _sql in _DDL:
+    event.listen(_doc, "after_create", DDL(_sql).execute_if(dialect=_dialect))
+
+
+def ensure_search_index(engine):
+    """Create the search table and its dialect-specific index objects (idempotent)."""
+    _doc.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        for dialect, sql in _DDL:
+            if engine.dialect.name == dialect:
+                conn.execute(text(sql))
+        if engine.dialect.name == "sqlite":
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def index_recipe(recipe):
+    """Create or refresh the search document for recipe. Call after its ingredients/tags are set."""
+    names = [
+        name
+        for (name,) in db.session.query(IngredientMaster.name)
+        .join(RecipeIngredient, RecipeIngredient.ingredient_master_id == IngredientMaster.id)
+        .filter(RecipeIngredient.recipe_id == recipe.id)
+    ]
+    names += [t.name for t in recipe.tags]
+    doc = recipe.search_document
+    if doc is None:
+        doc = RecipeSearchDocument(recipe_id=recipe.id)
+        recipe.search_document = doc
+    doc.user_id = recipe.user_id
+    doc.title = fold(recipe.title)
+    doc.keywords = fold(" ".join(names))
+    doc.body = fold(" ".join(x for x in (recipe.description, recipe.instructions) if x))
+    return doc
+
+
+def replace_search_documents(docs):
+    """
+    Write many search documents at once: docs are {"recipe_id", "user_id", "title", "keywords",
+    "body"} with raw text (folded here); existing documents of those recipes are replaced.
+    """
+    if not docs:
+        return
+    db.session.execute(_doc.delete().where(_doc.c.recipe_id.in_([d["recipe_id"] for d in docs])))
+    db.session.execute(
+        _doc.insert(),
+        [
+            {
+                "recipe_id": d["recipe_id"],
+                "user_id": d["user_id"],
+                "title": fold(d["title"]),
+                "keywords": fold(d["keywords"]),
+                "body": fold(d["body"]),
+            }
+            for d in docs
+        ],
+    )
+
+
+def search_query(user_id, q):
+    """
+    Recipe query for user_id matching every word of q (as a prefix), best match first.
+    Returns None when q has no searchable words.
+    """
+    words = tokenize(q)
+    if not words:
+        return None
+    base = Recipe.query.filter(Recipe.user_id == user_id)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        tsv = literal_column("recipe_search_documents.tsv")
+        tsq = func.to_tsquery(literal_column(TS_CONFIG), " & ".join(f"{w}:*" for w in words))
+        return (
+            base.join(RecipeSearchDocument, RecipeSearchDocument.recipe_id == Recipe.id)
+            .filter(tsv.op("@@")(tsq))
+            .order_by(func.ts_rank(tsv, tsq).desc(), Recipe.updated_at.desc(), Recipe.id.desc())
+        )
+
+    if dialect == "sqlite":
+        fts = table(FTS_TABLE, column("rowid"))
+        fts_name = literal_column(FTS_TABLE)
+        match = " ".join(f'"{w}"*' for w in words)
+        ranked = (
+            select(fts.c.rowid.label("recipe_id"), func.bm25(fts_name, 10.0, 4.0, 1.0).label("rank"))
+            .where(fts_name.op("MATCH")(match))
+            .subquery()
+        )
+        return base.join(ranked, ranked.c.recipe_id == Recipe.id).order_by(
+            ranked.c.rank, Recipe.updated_at.desc(), Recipe.id.desc()
+        )
+
+    cols = (RecipeSearchDocument.title, RecipeSearchDocument.keywords, RecipeSearchDocument.body)
+    return (
+        base.join(RecipeSearchDocument, RecipeSearchDocument.recipe_id == Recipe.id)
+        .filter(and_(*[or_(*[c.like(f"%{w}%") for c in cols]) for w in words]))
+        .order_by(Recipe.updated_at.desc(), Recipe.id.desc())
+    )
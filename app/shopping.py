@@ -2,68 +2,18 @@ from flask import Blueprint, jsonify, render_template, redirect, url_for, flash,
 from flask_login import login_required, current_user
 
 from app import db
-from app.models import Recipe, RecipeIngredient, ShoppingList, ShoppingListItem, IngredientMaster, Unit
+from app.cache import get_units
+from app.entities import resolve_ingredients, resolve_units
+from app.merge import add_recipes_to_list
+from app.models import Recipe, ShoppingList, ShoppingListItem
 from app.recipes import get_or_create_ingredient, get_or_create_unit
+from app.routing import read_only
 
 bp = Blueprint("shopping", __name__)
 
 
-def _format_quantity(val):
-    """Format numeric quantity: 9.0 -> '9', 4.5 -> '4.5'."""
-    try:
-        f = float(val)
-        if f == int(f):
-            return str(int(f))
-        return str(f)
-    except (ValueError, TypeError):
-        return str(val) if val is not None else ""
-
-
-def merge_ingredient(existing_items, ingredient_master_id, unit_id, quantity):
-    """Merge by ingredient_master_id + unit_id. Numeric quantities add together."""
-    for item in existing_items:
-        if item.ingredient_master_id == ingredient_master_id and item.unit_id == unit_id:
-            try:
-                q1 = float(item.quantity or 0)
-                q2 = float(quantity or 0)
-                item.quantity = _format_quantity(q1 + q2)
-                return
-            except (ValueError, TypeError):
-                item.quantity = f"{item.quantity} + {quantity}" if item.quantity and quantity else (item.quantity or quantity)
-                return
-    return ShoppingListItem(
-        ingredient_master_id=ingredient_master_id,
-        unit_id=unit_id,
-        ingredient_name=None,
-        quantity=quantity or "",
-        unit=None,
-    )
-
-
-def merge_ingredient_legacy(existing_items, name, quantity, unit_str):
-    """Fallback for string-based merge (legacy)."""
-    name_lower = name.strip().lower()
-    unit_norm = (unit_str or "").strip().lower()
-    for item in existing_items:
-        iname = (item.ingredient_name or "").strip().lower()
-        ustr = (item.unit or "").strip().lower()
-        if iname == name_lower and ustr == unit_norm:
-            try:
-                q1 = float(item.quantity or 0)
-                q2 = float(quantity or 0)
-                item.quantity = _format_quantity(q1 + q2)
-                return
-            except (ValueError, TypeError):
-                item.quantity = f"{item.quantity} + {quantity}" if item.quantity and quantity else (item.quantity or quantity)
-                return
-    return ShoppingListItem(
-        ingredient_name=name.strip(),
-        quantity=quantity or "",
-        unit=unit_str or "",
-    )
-
-
 @bp.route("/")
+@read_only
 @login_required
 def list():
     lists = ShoppingList.query.filter_by(user_id=current_user.id).order_by(ShoppingList.created_at.desc()).all()
@@ -84,10 +34,11 @@ def add():
 
 
 @bp.route("/<int:id>")
+@read_only
 @login_required
 def detail(id):
     sl = ShoppingList.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-    units = Unit.query.order_by(Unit.name).all()
+    units = get_units()
     return render_template("shopping/detail.html", shopping_list=sl, units=units)
 
 
@@ -131,26 +82,33 @@ def edit(id):
         unit_ids = request.form.getlist("new_item_unit_id")
         unit_names = request.form.getlist("new_item_unit")
         quantities = request.form.getlist("new_item_quantity")
-        for i, name in enumerate(request.form.getlist("new_item_name")):
-            if name and name.strip():
-                ing = get_or_create_ingredient(name.strip())
-                if ing:
-                    unit_id = unit_ids[i] if i < len(unit_ids) else None
-                    unit_name = unit_names[i] if i < len(unit_names) else None
-                    u = get_or_create_unit(unit_id=unit_id, unit_name=unit_name)
-                    new_item = ShoppingListItem(
-                        shopping_list_id=sl.id,
-                        ingredient_master_id=ing.id,
-                        unit_id=u.id if u else None,
-                        ingredient_name=None,
-                        quantity=quantities[i] if i < len(quantities) else "",
-                        unit=None,
-                    )
-                    db.session.add(new_item)
+        rows = [
+            (
+                name.strip(),
+                unit_ids[i] if i < len(unit_ids) else None,
+                unit_names[i] if i < len(unit_names) else None,
+                quantities[i] if i < len(quantities) else "",
+            )
+            for i, name in enumerate(request.form.getlist("new_item_name"))
+            if name and name.strip()
+        ]
+        ingredients = resolve_ingredients([r[0] for r in rows])
+        resolved_units = resolve_units([(r[1], r[2]) for r in rows])
+        for (name, _, _, quantity), unit_id in zip(rows, resolved_units):
+            db.session.add(
+                ShoppingListItem(
+                    shopping_list_id=sl.id,
+                    ingredient_master_id=ingredients[name.lower()].id,
+                    unit_id=unit_id,
+                    ingredient_name=None,
+                    quantity=quantity,
+                    unit=None,
+                )
+            )
         db.session.commit()
         flash("Lista actualizada.", "success")
         return redirect(url_for("shopping.detail", id=sl.id))
-    units = Unit.query.order_by(Unit.name).all()
+    units = get_units()
     return render_template("shopping/form.html", shopping_list=sl, units=units)
 
 
@@ -170,23 +128,7 @@ def add_recipe_to_list(id, recipe_id):
     """Add a recipe's ingredients to a specific shopping list (used by modal)."""
     sl = ShoppingList.query.filter_by(id=id, user_id=current_user.id).first_or_404()
     recipe = Recipe.query.filter_by(id=recipe_id, user_id=current_user.id).first_or_404()
-    existing = [x for x in sl.items]
-    for ri in recipe.ingredients:
-        if ri.ingredient_master_id and ri.ingredient:
-            new_item = merge_ingredient(
-                existing,
-                ri.ingredient_master_id,
-                ri.unit_id,
-                ri.quantity,
-            )
-        else:
-            name = ri.ingredient.name if ri.ingredient else ""
-            unit_str = (ri.unit.symbol or ri.unit.name) if ri.unit else ""
-            new_item = merge_ingredient_legacy(existing, name, ri.quantity, unit_str)
-        if new_item:
-            new_item.shopping_list_id = sl.id
-            db.session.add(new_item)
-            existing.append(new_item)
+    add_recipes_to_list(sl.id, {recipe.id: 1})
     db.session.commit()
     flash("Ingredientes añadidos.", "success")
     return redirect(url_for("shopping.detail", id=id))
@@ -215,23 +157,7 @@ def add_from_recipe(recipe_id):
             flash("Selecciona una lista o crea una nueva.", "error")
             return render_template("shopping/add_from_recipe.html", recipe=recipe, lists=lists)
 
-        existing = [x for x in sl.items]
-        for ri in recipe.ingredients:
-            if ri.ingredient_master_id and ri.ingredient:
-                new_item = merge_ingredient(
-                    existing,
-                    ri.ingredient_master_id,
-                    ri.unit_id,
-                    ri.quantity,
-                )
-            else:
-                name = ri.ingredient.name if ri.ingredient else ""
-                unit_str = (ri.unit.symbol or ri.unit.name) if ri.unit else ""
-                new_item = merge_ingredient_legacy(existing, name, ri.quantity, unit_str)
-            if new_item:
-                new_item.shopping_list_id = sl.id
-                db.session.add(new_item)
-                existing.append(new_item)
+        add_recipes_to_list(sl.id, {recipe.id: 1})
 
         db.session.commit()
         flash("Ingredientes añadidos a la lista.", "success")
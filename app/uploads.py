@@ -1,27 +1,94 @@
 """Image upload: local filesystem or S3."""
+import io
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from flask import current_app
 
+from app.images import store_image, variant_names
+from app.profiling import carry_profile, instrument_s3
+
 
 S3_PREFIX = "s3/"
 
+_init_lock = threading.Lock()
+_signing_time = threading.local()  # .value: the time presigned URLs of this thread are signed at
+URL_CACHE_MAX = 10000  # presigned URLs kept per process
+
 
 def use_s3():
     return bool(current_app.config.get("S3_BUCKET"))
 
 
-def _s3_client():
-    import os
+def _install_signing_clock():
+    """
+    Let get_image_url() sign at a chosen time: botocore's SigV4 signers read the clock through
+    botocore.auth.get_current_datetime, which is wrapped (once per process) to return
+    _signing_time.value when this thread set one, and the real time otherwise.
+    """
+    import botocore.auth
+
+    real = botocore.auth.get_current_datetime
+    if getattr(real, "signing_clock", False):
+        return
+
+    def now(*args, **kwargs):
+        fixed = getattr(_signing_time, "value", None)
+        return fixed if fixed is not None else real(*args, **kwargs)
 
+    now.signing_clock = True
+    botocore.auth.get_current_datetime = now
+
+
+def _new_s3_client(config):
     import boto3
+    from botocore.config import Config as BotoConfig
 
-    return boto3.client(
+    # A private session: boto3's default session is not safe to create clients from concurrently.
+    client = boto3.session.Session().client(
         "s3",
-        endpoint_url=os.environ.get("S3_ENDPOINT"),
-        region_name=current_app.config.get("S3_REGION", "auto"),
+        endpoint_url=config.get("S3_ENDPOINT"),
+        region_name=config.get("S3_REGION", "auto"),
         aws_access_key_id=os.environ.get("ACCESS_KEY_ID"),
         aws_secret_access_key=os.environ.get("SECRET_ACCESS_KEY"),
+        config=BotoConfig(
+            max_pool_connections=config.get("S3_MAX_POOL_CONNECTIONS", 10),
+            tcp_keepalive=config.get("S3_TCP_KEEPALIVE", True),
+            connect_timeout=config.get("S3_CONNECT_TIMEOUT", 5),
+            read_timeout=config.get("S3_READ_TIMEOUT", 30),
+            retries={"mode": "standard"},
+            signature_version="s3v4",  # presigned URLs with SigV4, which get_image_url() signs at a fixed time
+        ),
     )
+    if config.get("PROFILING_ENABLED"):
+        instrument_s3(client)
+    _install_signing_clock()
+    return client
+
+
+def _s3_client():
+    """
+    The process's S3 client, created on first use. botocore clients are thread-safe, so
+    every request and thread shares it and its keep-alive connection pool. Keyed by pid so
+    a worker forked after the client was created builds its own.
+    """
+    cached = current_app.extensions.get("s3_client")
+    if cached is None or cached[0] != os.getpid():
+        with _init_lock:
+            cached = current_app.extensions.get("s3_client")
+            if cached is None or cached[0] != os.getpid():
+                cached = (os.getpid(), _new_s3_client(current_app.config))
+                current_app.extensions["s3_client"] = cached
+    return cached[1]
+
+
+def _content_type(filename):
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else "jpg"
+    return f"image/{ext}" if ext != "jpg" else "image/jpeg"
 
 
 def upload_image(recipe_id: int, file_content: bytes, unique_filename: str) -> str:
@@ -33,7 +100,6 @@ def upload_image(recipe_id: int, file_content: bytes, unique_filename: str) -> s
     if not use_s3():
         return None
 
-    ext = unique_filename.rsplit(".", 1)[-1].lower() if "." in unique_filename else "jpg"
     key = f"{current_app.config['S3_PREFIX']}/{recipe_id}/{unique_filename}"
     client = _s3_client()
     bucket = current_app.config["S3_BUCKET"]
@@ -41,46 +107,237 @@ def upload_image(recipe_id: int, file_content: bytes, unique_filename: str) -> s
         Bucket=bucket,
         Key=key,
         Body=file_content,
-        ContentType=f"image/{ext}" if ext != "jpg" else "image/jpeg",
+        ContentType=_content_type(unique_filename),
+        # Keys are unique per upload, so the object never changes under its URL
+        CacheControl=current_app.config.get("S3_CACHE_CONTROL", "public, max-age=31536000, immutable"),
     )
     return S3_PREFIX + key
 
 
+class LocalStorage:
+    """Images under UPLOAD_FOLDER/<recipe_id>/; the stored name is the bare filename."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def save(self, recipe_id, fileobj, filename):
+        recipe_dir = os.path.join(self.folder, str(recipe_id))
+        os.makedirs(recipe_dir, exist_ok=True)
+        with open(os.path.join(recipe_dir, filename), "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+        return filename
+
+    def open(self, recipe_id, stored):
+        return open(os.path.join(self.folder, str(recipe_id), stored), "rb")
+
+    def stream(self, recipe_id, stored):
+        return self.open(recipe_id, stored)
+
+    def delete(self, recipe_id, stored):
+        path = os.path.join(self.folder, str(recipe_id), stored)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3Storage:
+    """Images in S3, streamed from the file object (multipart above S3_MULTIPART_THRESHOLD)."""
+
+    def __init__(self, client, bucket, prefix, cache_control, multipart_threshold):
+        from boto3.s3.transfer import TransferConfig
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_control = cache_control
+        # Parallelism is across files (the upload pool), so parts of one file go one at a time.
+        self.transfer = TransferConfig(
+            multipart_threshold=multipart_threshold, multipart_chunksize=multipart_threshold, use_threads=False
+        )
+
+    def save(self, recipe_id, fileobj, filename):
+        key = f"{self.prefix}/{recipe_id}/{filename}"
+        self.client.upload_fileobj(
+            fileobj,
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": _content_type(filename), "CacheControl": self.cache_control},
+            Config=self.transfer,
+        )
+        return S3_PREFIX + key
+
+    def open(self, recipe_id, stored):
+        body = self.client.get_object(Bucket=self.bucket, Key=stored[len(S3_PREFIX) :])["Body"]
+        return io.BytesIO(body.read())
+
+    def stream(self, recipe_id, stored):
+        """The object's body as a file-like read in chunks (not seekable), without loading it all."""
+        return self.client.get_object(Bucket=self.bucket, Key=stored[len(S3_PREFIX) :])["Body"]
+
+    def delete(self, recipe_id, stored):
+        self.client.delete_object(Bucket=self.bucket, Key=stored[len(S3_PREFIX) :])
+
+
+def get_storage():
+    """
+    Image storage backend for this app: IMAGE_STORAGE (a factory called with the app) if set,
+    else S3 when S3_BUCKET is configured, else the local upload folder.
+    """
+    config = current_app.config
+    factory = config.get("IMAGE_STORAGE")
+    if factory is not None:
+        return factory(current_app)
+    if use_s3():
+        return S3Storage(
+            _s3_client(),
+            config["S3_BUCKET"],
+            config["S3_PREFIX"],
+            config.get("S3_CACHE_CONTROL", "public, max-age=31536000, immutable"),
+            config.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024),
+        )
+    return LocalStorage(config["UPLOAD_FOLDER"])
+
+
+def storage_for(stored):
+    """The backend holding an already stored image: local names have no 's3/' prefix."""
+    if stored.startswith(S3_PREFIX) or current_app.config.get("IMAGE_STORAGE") is not None:
+        return get_storage()
+    return LocalStorage(current_app.config["UPLOAD_FOLDER"])
+
+
+def _upload_executor():
+    """Bounded per-process thread pool for image uploads (IMAGE_UPLOAD_WORKERS threads)."""
+    cached = current_app.extensions.get("image_upload_executor")
+    if cached is None or cached[0] != os.getpid():
+        with _init_lock:
+            cached = current_app.extensions.get("image_upload_executor")
+            if cached is None or cached[0] != os.getpid():
+                executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get("IMAGE_UPLOAD_WORKERS", 4),
+                    thread_name_prefix="image-upload",
+                )
+                cached = (os.getpid(), executor)
+                current_app.extensions["image_upload_executor"] = cached
+    return cached[1]
+
+
+def store_images(recipe_id, files):
+    """
+    Store (file object, filename) pairs concurrently on the upload pool: each image re-encoded
+    without its metadata, plus its resized variants (app/images.py), in the same worker.
+    Returns (stored name, variants) pairs in order. If any upload fails, the ones that
+    succeeded are removed again and the first error is raised, so callers only record
+    complete sets.
+    """
+    storage = get_storage()
+    executor = _upload_executor()
+    widths = current_app.config.get("IMAGE_VARIANT_WIDTHS", (320, 640, 1280))
+    store_one = carry_profile(store_image)  # S3 time of the uploads counts toward this request
+    futures = [
+        executor.submit(store_one, storage, recipe_id, fileobj, filename, widths) for fileobj, filename in files
+    ]
+    stored, error = [], None
+    for future in futures:
+        try:
+            stored.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for name, variants in stored:
+            for each in [name] + variant_names(name, variants):
+                try:
+                    storage.delete(recipe_id, each)
+                except Exception:
+                    pass
+        raise error
+    return stored
+
+
+def _url_cache_seconds():
+    expires = current_app.config.get("S3_URL_EXPIRES", 3600)
+    return max(1, min(current_app.config.get("S3_URL_CACHE_SECONDS", expires - 600), expires - 60))
+
+
+def url_max_age():
+    """Seconds until the current presigned-URL time bucket ends (for Cache-Control on redirects)."""
+    ttl = _url_cache_seconds()
+    return int(ttl - time.time() % ttl)
+
+
 def get_image_url(recipe_id: int, stored: str) -> str | None:
     """
     Return public URL or presigned URL for an S3-stored image.
     stored: "s3/recipes/123/abc.jpg"
+
+    URLs are signed as of the start of the current time bucket of S3_URL_CACHE_SECONDS (kept
+    under S3_URL_EXPIRES), so every worker hands out the same URL for an image until the bucket
+    ends and browsers and CDNs can cache it. Each process also keeps the URLs it signed, so
+    signing happens once per image per bucket instead of per request.
     """
     if not use_s3() or not stored.startswith(S3_PREFIX):
         return None
 
     key = stored[len(S3_PREFIX) :]
+    ttl = _url_cache_seconds()
+    bucket_no = int(time.time() // ttl)
+    cache = current_app.extensions.setdefault("s3_url_cache", {})
+    hit = cache.get(key)
+    if hit is not None and hit[0] == bucket_no:
+        return hit[1]
+
     client = _s3_client()
     bucket = current_app.config["S3_BUCKET"]
-    url = client.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": bucket, "Key": key},
-        ExpiresIn=3600,
-    )
+    _signing_time.value = datetime.fromtimestamp(bucket_no * ttl, timezone.utc).replace(tzinfo=None)
+    try:
+        url = client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=current_app.config.get("S3_URL_EXPIRES", 3600),
+        )
+    finally:
+        _signing_time.value = None
+    if len(cache) >= URL_CACHE_MAX:
+        cache.clear()
+    cache[key] = (bucket_no, url)
     return url
 
 
-def delete_image(stored: str) -> None:
-    """Delete image from S3. stored: 's3/recipes/123/abc.jpg'"""
+def _delete_s3_keys(keys):
+    """Delete S3 keys with DeleteObjects (1000 per call); errors are ignored like single deletes."""
+    client = _s3_client()
+    bucket = current_app.config["S3_BUCKET"]
+    cache = current_app.extensions.get("s3_url_cache", {})
+    for start in range(0, len(keys), 1000):
+        chunk = keys[start : start + 1000]
+        try:
+            client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True})
+        except Exception:
+            pass
+        for key in chunk:
+            cache.pop(key, None)
+
+
+def delete_image(stored: str, variants: str | None = None) -> None:
+    """Delete image (and its resized variants) from S3. stored: 's3/recipes/123/abc.jpg'"""
     if not use_s3() or not stored.startswith(S3_PREFIX):
         return
+    _delete_s3_keys([name[len(S3_PREFIX) :] for name in [stored] + variant_names(stored, variants)])
 
-    key = stored[len(S3_PREFIX) :]
-    client = _s3_client()
-    bucket = current_app.config["S3_BUCKET"]
-    try:
-        client.delete_object(Bucket=bucket, Key=key)
-    except Exception:
-        pass
+
+def remove_image(recipe_id: int, stored: str, variants: str | None = None) -> None:
+    """Delete an image and its variants, from S3 or the local upload folder."""
+    if stored.startswith(S3_PREFIX):
+        delete_image(stored, variants)
+        return
+    local = LocalStorage(current_app.config["UPLOAD_FOLDER"])
+    for name in [stored] + variant_names(stored, variants):
+        local.delete(recipe_id, name)
 
 
 def delete_recipe_images(recipe_id: int, images) -> None:
-    """Delete all S3 images for a recipe."""
+    """Delete all S3 images (and variants) for a recipe, in as few requests as possible."""
+    keys = []
     for img in images:
         if img.filename and img.filename.startswith(S3_PREFIX):
-            delete_image(img.filename)
+            keys.extend(name[len(S3_PREFIX) :] for name in [img.filename] + variant_names(img.filename, img.variants))
+    if keys and use_s3():
+        _delete_s3_keys(keys)
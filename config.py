@@ -1,5 +1,7 @@
 import os
 
+from sqlalchemy.engine import make_url
+
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -19,10 +21,123 @@ def _database_uri():
     )
 
 
+# SQLAlchemy engine presets, chosen by ENVIRONMENT (or DB_ENGINE_PROFILE); see engine_options().
+# Pool sizes are per worker process. connect_args are libpq settings (psycopg2 / psycopg only).
+ENGINE_PROFILES = {
+    # Fly (iad) -> Neon's PgBouncer pooler (eu-west-2): every new connection is a cross-Atlantic
+    # TLS handshake, so keep a few warm (LIFO lets the spare ones expire), check them before use
+    # (suspended machines and restarted poolers leave dead sockets) and let TCP keepalives notice
+    # dropped ones.
+    "production": {
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "pool_use_lifo": True,
+        "query_cache_size": 1000,
+        "connect_args": {
+            "connect_timeout": 10,
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 3,
+            "application_name": "recetas-chiquitas",
+        },
+    },
+    "develop": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_pre_ping": False,
+    },
+    "default": {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    },
+}
+
+_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")
+
+
+def _env_number(name, kind=int):
+    value = os.environ.get(name)
+    return kind(value) if value not in (None, "") else None
+
+
+def _env_flag(name):
+    value = os.environ.get(name)
+    return value.lower() not in ("0", "false", "no") if value not in (None, "") else None
+
+
+def _engine_profile():
+    env = (os.environ.get("ENVIRONMENT") or "").lower()
+    if env in ("develop", "development"):
+        return "develop"
+    return env if env in ENGINE_PROFILES else "default"
+
+
+def transaction_pooling(uri):
+    """Whether uri goes through a transaction-mode pooler: DB_TRANSACTION_POOLING, else Neon's "-pooler" hosts."""
+    flag = _env_flag("DB_TRANSACTION_POOLING")
+    if flag is not None:
+        return flag
+    return "-pooler" in (make_url(uri).host or "")
+
+
+def engine_options(config, uri=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for uri (default SQLALCHEMY_DATABASE_URI): the DB_ENGINE_PROFILE
+    preset, then the DB_* overrides, then the explicit SQLALCHEMY_ENGINE_OPTIONS. SQLite gets
+    only the explicit options (its pool defaults suit it). Behind a transaction-mode pooler,
+    server-side prepared statements are turned off for drivers that use them (psycopg 3;
+    psycopg2 never prepares).
+    """
+    uri = uri or config["SQLALCHEMY_DATABASE_URI"]
+    url = make_url(uri)
+    explicit = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    if url.get_backend_name() == "sqlite":
+        return explicit
+    options = dict(ENGINE_PROFILES.get(config.get("DB_ENGINE_PROFILE") or "default", ENGINE_PROFILES["default"]))
+    connect_args = options.pop("connect_args", {})
+    connect_args = dict(connect_args) if url.get_driver_name() in ("psycopg2", "psycopg") else {}
+    for key in _POOL_OPTIONS:
+        if config.get("DB_" + key.upper()) is not None:
+            options[key] = config["DB_" + key.upper()]
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg" and transaction_pooling(uri):
+        connect_args["prepare_threshold"] = None
+    connect_args.update(explicit.pop("connect_args", {}))
+    options.update(explicit)
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "dev-secret-key-change-in-production"
     SQLALCHEMY_DATABASE_URI = _database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine preset from ENGINE_PROFILES, and per-setting overrides (unset: the preset's value)
+    DB_ENGINE_PROFILE = os.environ.get("DB_ENGINE_PROFILE") or _engine_profile()
+    DB_POOL_SIZE = _env_number("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW = _env_number("DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT = _env_number("DB_POOL_TIMEOUT", float)
+    DB_POOL_RECYCLE = _env_number("DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING")
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # applied over the preset (engine_options())
+    # Read replica (e.g. the one in our region) for the GETs of @read_only views (app/routing.py);
+    # after a write, the user reads from the primary for DB_REPLICA_STICKY_SECONDS
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+    DB_REPLICA_STICKY_SECONDS = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", 10))
+    # Prometheus-format /metrics per worker (app/metrics.py); with a token, scrapers send it as a Bearer token
+    METRICS_ENABLED = (os.environ.get("METRICS_ENABLED") or "").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # Per-request profiling (app/profiling.py): Server-Timing headers, per-endpoint totals at /metrics,
+    # N+1 warnings, and a sampled log of requests slower than PROFILING_SLOW_SECONDS with their SQL
+    PROFILING_ENABLED = (os.environ.get("PROFILING_ENABLED") or "").lower() in ("1", "true", "yes")
+    PROFILING_SERVER_TIMING = (os.environ.get("PROFILING_SERVER_TIMING") or "1").lower() not in ("0", "false", "no")
+    PROFILING_SLOW_SECONDS = float(os.environ.get("PROFILING_SLOW_SECONDS", 1.0))
+    PROFILING_SLOW_SAMPLE_RATE = float(os.environ.get("PROFILING_SLOW_SAMPLE_RATE", 0.1))
+    PROFILING_N_PLUS_ONE = int(os.environ.get("PROFILING_N_PLUS_ONE", 5))  # identical SELECTs in one request
     UPLOAD_FOLDER = os.path.join(basedir, "uploads")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
 
@@ -30,3 +145,49 @@ class Config:
     S3_BUCKET = os.environ.get("S3_BUCKET")
     S3_REGION = os.environ.get("S3_REGION", "auto")
     S3_PREFIX = (os.environ.get("S3_PREFIX") or "recipes").strip().rstrip("/")
+    S3_ENDPOINT = os.environ.get("S3_ENDPOINT")
+    # Shared client connection pool: size it to the number of threads uploading at once
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 10))
+    S3_TCP_KEEPALIVE = (os.environ.get("S3_TCP_KEEPALIVE") or "1").lower() not in ("0", "false", "no")
+    S3_CONNECT_TIMEOUT = float(os.environ.get("S3_CONNECT_TIMEOUT", 5))
+    S3_READ_TIMEOUT = float(os.environ.get("S3_READ_TIMEOUT", 30))
+    # Presigned image URLs: valid for S3_URL_EXPIRES, signed as of the start of each S3_URL_CACHE_SECONDS
+    # window so every worker gives out the same URL during it
+    S3_URL_EXPIRES = int(os.environ.get("S3_URL_EXPIRES", 3600))
+    S3_URL_CACHE_SECONDS = int(os.environ.get("S3_URL_CACHE_SECONDS", 3000))
+    S3_CACHE_CONTROL = os.environ.get("S3_CACHE_CONTROL", "public, max-age=31536000, immutable")
+    S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+    # Images of one save are uploaded concurrently on a per-process pool of this many threads
+    IMAGE_UPLOAD_WORKERS = int(os.environ.get("IMAGE_UPLOAD_WORKERS", 4))
+    # Widths of the resized WebP/JPEG copies made on upload (empty to disable)
+    IMAGE_VARIANT_WIDTHS = tuple(
+        int(w) for w in (os.environ.get("IMAGE_VARIANT_WIDTHS") or "320,640,1280").split(",") if w.strip()
+    )
+    # Local images: stored names are unique per upload, so browsers may keep them forever
+    IMAGE_CACHE_CONTROL = os.environ.get("IMAGE_CACHE_CONTROL", "private, max-age=31536000, immutable")
+    # How long a worker trusts its cached recipe -> owner lookup when serving images
+    IMAGE_OWNER_CACHE_SECONDS = int(os.environ.get("IMAGE_OWNER_CACHE_SECONDS", 300))
+    # Let the front proxy send local image bytes: "x-accel-redirect" (nginx) or "x-sendfile"
+    IMAGE_SENDFILE = (os.environ.get("IMAGE_SENDFILE") or "").lower()
+    # nginx internal location aliased to UPLOAD_FOLDER, for IMAGE_SENDFILE=x-accel-redirect
+    IMAGE_ACCEL_PREFIX = os.environ.get("IMAGE_ACCEL_PREFIX", "/_uploads/")
+
+    # Recipe import from URL runs as background jobs (app/importer.py)
+    IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 4))
+    IMPORT_QUEUE_MAX = int(os.environ.get("IMPORT_QUEUE_MAX", 32))  # jobs queued or running per process
+    IMPORT_FETCH_TIMEOUT = float(os.environ.get("IMPORT_FETCH_TIMEOUT", 15))
+    IMPORT_CACHE_SECONDS = int(os.environ.get("IMPORT_CACHE_SECONDS", 6 * 3600))  # reuse a URL's scrape
+    # Longest ?wait= an import job poll may block for. Each blocked poll holds a sync gunicorn worker,
+    # so keep it about a second; clients poll without waiting and back off instead
+    IMPORT_LONG_POLL_SECONDS = float(os.environ.get("IMPORT_LONG_POLL_SECONDS", 1))
+    # Bulk import (app/bulk_import.py): fetch threads per batch, per-site politeness, batches at once
+    BULK_IMPORT_WORKERS = int(os.environ.get("BULK_IMPORT_WORKERS", 8))
+    BULK_IMPORT_PER_HOST = int(os.environ.get("BULK_IMPORT_PER_HOST", 2))
+    BULK_IMPORT_HOST_INTERVAL = float(os.environ.get("BULK_IMPORT_HOST_INTERVAL", 0.5))
+    BULK_IMPORT_BATCHES = int(os.environ.get("BULK_IMPORT_BATCHES", 2))
+    BULK_IMPORT_MAX_URLS = int(os.environ.get("BULK_IMPORT_MAX_URLS", 500))
+    # Names this instance in the keys of exported recipes without a client_key (app/backup.py), so an
+    # import into it updates those recipes; unset, it is derived from SECRET_KEY
+    EXPORT_INSTANCE_ID = os.environ.get("EXPORT_INSTANCE_ID")
+    # POST /api/recipes/batch (app/batch.py): recipes written per request, in one transaction
+    API_BATCH_MAX_RECIPES = int(os.environ.get("API_BATCH_MAX_RECIPES", 1000))
@@ -0,0 +1,20 @@
+"""
+Add ingredient_masters.search_name and the ingredient autocomplete indexes.
+
+scripts/backfill_ingredient_search.py fills search_name in for existing ingredients.
+"""
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY on Postgres
+
+
+def upgrade(m):
+    m.add_column("ingredient_masters", "search_name", "VARCHAR(200)")
+    # Usage counts for ranking suggestions (app/autocomplete.py)
+    m.create_index("ix_recipe_ingredients_ingredient_master_id", "recipe_ingredients", "ingredient_master_id")
+    if m.dialect != "postgresql":
+        return
+    m.create_index("ix_ingredient_masters_search_name_prefix", "ingredient_masters", "search_name text_pattern_ops")
+    if m.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'").first() is not None:
+        m.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        m.create_index(
+            "ix_ingredient_masters_search_name_trgm", "ingredient_masters", "search_name gin_trgm_ops", using="GIN"
+        )
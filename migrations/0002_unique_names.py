@@ -0,0 +1,43 @@
+"""
+Merge case-insensitive duplicate ingredients, units and tags, and add the unique lower(name) indexes.
+"""
+
+# table -> [(referencing table, column)]
+REFERENCES = {
+    "ingredient_masters": [
+        ("recipe_ingredients", "ingredient_master_id"),
+        ("shopping_list_items", "ingredient_master_id"),
+    ],
+    "units": [
+        ("recipe_ingredients", "unit_id"),
+        ("shopping_list_items", "unit_id"),
+        ("units", "base_unit_id"),
+    ],
+    "tags": [],
+}
+
+
+def merge_duplicates(m, table):
+    """Point references at the lowest id of each lower(name) group and delete the rest."""
+    groups = m.execute(f"SELECT lower(name), min(id) FROM {table} GROUP BY lower(name) HAVING count(*) > 1").all()
+    for lname, keep in groups:
+        dups = m.execute(f"SELECT id FROM {table} WHERE lower(name) = :n AND id != :keep", n=lname, keep=keep)
+        for (dup,) in dups.all():
+            if table == "tags":
+                # recipe_tags has (recipe_id, tag_id) as primary key: drop links that would collide
+                m.execute(
+                    "DELETE FROM recipe_tags WHERE tag_id = :dup AND recipe_id IN "
+                    "(SELECT recipe_id FROM recipe_tags WHERE tag_id = :keep)",
+                    dup=dup,
+                    keep=keep,
+                )
+                m.execute("UPDATE recipe_tags SET tag_id = :keep WHERE tag_id = :dup", dup=dup, keep=keep)
+            for ref_table, column in REFERENCES[table]:
+                m.execute(f"UPDATE {ref_table} SET {column} = :keep WHERE {column} = :dup", dup=dup, keep=keep)
+            m.execute(f"DELETE FROM {table} WHERE id = :dup", dup=dup)
+
+
+def upgrade(m):
+    for table in REFERENCES:
+        merge_duplicates(m, table)
+        m.create_index(f"uq_{table}_name_lower", table, "lower(name)", unique=True)
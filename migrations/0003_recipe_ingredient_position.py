@@ -0,0 +1,7 @@
+"""
+Add recipe_ingredients.position, the order of a recipe's ingredients (NULL: by id, as before).
+"""
+
+
+def upgrade(m):
+    m.add_column("recipe_ingredients", "position", "INTEGER")
@@ -0,0 +1,9 @@
+"""
+Add recipe_images.variants, the widths of an image's resized copies.
+
+scripts/build_image_variants.py makes the copies of images uploaded before they existed.
+"""
+
+
+def upgrade(m):
+    m.add_column("recipe_images", "variants", "VARCHAR(100)")
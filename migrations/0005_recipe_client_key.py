@@ -0,0 +1,9 @@
+"""
+Add recipes.client_key and its unique index, for POST /api/recipes/batch.
+"""
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY on Postgres
+
+
+def upgrade(m):
+    m.add_column("recipes", "client_key", "VARCHAR(100)")
+    m.create_index("uq_recipes_user_client_key", "recipes", "user_id, client_key", unique=True)
@@ -0,0 +1,7 @@
+"""
+Add recipes.source_url, the page a recipe was imported from.
+"""
+
+
+def upgrade(m):
+    m.add_column("recipes", "source_url", "TEXT")
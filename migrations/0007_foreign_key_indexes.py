@@ -0,0 +1,27 @@
+"""
+Index the foreign keys, and a user's recipes, shopping lists and meal plans in listing order.
+"""
+TRANSACTIONAL = False  # CREATE INDEX CONCURRENTLY on Postgres
+
+INDEXES = (
+    ("ix_recipe_ingredients_recipe_id", "recipe_ingredients", "recipe_id"),
+    ("ix_recipe_ingredients_unit_id", "recipe_ingredients", "unit_id"),
+    ("ix_recipe_images_recipe_id", "recipe_images", "recipe_id"),
+    ("ix_recipe_tags_tag_id", "recipe_tags", "tag_id"),
+    ("ix_shopping_lists_user_created", "shopping_lists", "user_id, created_at"),
+    ("ix_shopping_list_items_shopping_list_id", "shopping_list_items", "shopping_list_id"),
+    ("ix_shopping_list_items_ingredient_master_id", "shopping_list_items", "ingredient_master_id"),
+    ("ix_shopping_list_items_unit_id", "shopping_list_items", "unit_id"),
+    ("ix_meal_plans_user_created", "meal_plans", "user_id, created_at"),
+    ("ix_meal_plan_recipes_plan_recipe", "meal_plan_recipes", "meal_plan_id, recipe_id"),
+    ("ix_meal_plan_recipes_recipe_id", "meal_plan_recipes", "recipe_id"),
+    ("ix_import_jobs_user_id", "import_jobs", "user_id"),
+)
+
+
+def upgrade(m):
+    # Listing order of app/pagination.py; SQLite can't say NULLS LAST here but sorts NULLs last in DESC
+    nulls_last = " NULLS LAST" if m.dialect == "postgresql" else ""
+    m.create_index("ix_recipes_user_updated", "recipes", f"user_id, updated_at DESC{nulls_last}, id DESC")
+    for name, table, columns in INDEXES:
+        m.create_index(name, table, columns)
@@ -0,0 +1,103 @@
+"""
+Versioned schema migrations, applied in order by scripts/migrate.py.
+
+Each migration is a module migrations/NNNN_name.py with a docstring (shown when it runs) and
+upgrade(m), where m is a Migration. Applied versions are recorded in schema_migrations, so each
+runs once per database. A module with TRANSACTIONAL = False runs in autocommit mode instead of
+one transaction, which Postgres needs to build indexes CONCURRENTLY (without blocking writes);
+its steps must be idempotent, since a failure leaves the earlier ones applied.
+
+Tables that don't exist yet are created from the models by db.create_all() (with their current
+indexes), so migrations only change tables that already hold data.
+"""
+import importlib
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, insert, inspect, select, text
+
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", String(4), primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration:
+    """What upgrade() gets: the connection and helpers for steps that differ by database."""
+
+    def __init__(self, conn, transactional=True):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self.transactional = transactional
+
+    def execute(self, sql, **params):
+        return self.conn.execute(text(sql), params)
+
+    def has_column(self, table, column):
+        return column in {c["name"] for c in inspect(self.conn).get_columns(table)}
+
+    def add_column(self, table, column, ddl):
+        """ALTER TABLE table ADD COLUMN column ddl, unless db.create_all() already made the table with it."""
+        if not self.has_column(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def create_index(self, name, table, columns, unique=False, using=None):
+        """
+        CREATE INDEX IF NOT EXISTS name ON table [USING using] (columns), columns being SQL. On
+        Postgres outside a transaction it is built CONCURRENTLY, after dropping an invalid index
+        of the same name left by an interrupted concurrent build.
+        """
+        concurrently = ""
+        if self.dialect == "postgresql" and not self.transactional:
+            concurrently = " CONCURRENTLY"
+            valid = self.execute(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)", name=name
+            ).scalar()
+            if valid is False:
+                self.execute(f"DROP INDEX CONCURRENTLY {name}")
+        unique = " UNIQUE" if unique else ""
+        using = f" USING {using}" if using else ""
+        self.execute(f"CREATE{unique} INDEX{concurrently} IF NOT EXISTS {name} ON {table}{using} ({columns})")
+
+
+def available():
+    """[(version, name, module)] of every migration, in version order."""
+    found = []
+    for filename in sorted(os.listdir(os.path.dirname(os.path.abspath(__file__)))):
+        m = _FILENAME.match(filename)
+        if m:
+            found.append((m[1], m[2], importlib.import_module(f"{__name__}.{filename[:-3]}")))
+    return found
+
+
+def applied(engine):
+    """{version: applied_at} of the migrations already run on engine's database."""
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        return {row.version: row.applied_at for row in conn.execute(select(schema_migrations))}
+
+
+def upgrade(engine, log=print):
+    """Run the pending migrations in order; returns the versions applied."""
+    done = applied(engine)
+    ran = []
+    for version, name, module in available():
+        if version in done:
+            continue
+        log(f"{version} {name}: {(module.__doc__ or '').strip().splitlines()[0]}")
+        transactional = getattr(module, "TRANSACTIONAL", True)
+        with engine.connect() as conn:
+            if not transactional:
+                conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            module.upgrade(Migration(conn, transactional))
+            conn.execute(insert(schema_migrations).values(version=version, name=name, applied_at=datetime.utcnow()))
+            conn.commit()
+        ran.append(version)
+    return ran
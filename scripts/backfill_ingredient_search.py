@@ -0,0 +1,42 @@
+"""
+Fill in ingredient_masters.search_name for ingredients created before it existed (after
+migration 0001 added the column and its autocomplete indexes). Run once for existing databases.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import IngredientMaster
+from app.normalize import fold
+
+BATCH_SIZE = 1000
+
+
+def backfill():
+    app = create_app()
+    with app.app_context():
+        total = 0
+        while True:
+            rows = (
+                db.session.query(IngredientMaster.id, IngredientMaster.name)
+                .filter(IngredientMaster.search_name.is_(None))
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            db.session.execute(
+                IngredientMaster.__table__.update()
+                .where(IngredientMaster.id == db.bindparam("b_id"))
+                .values(search_name=db.bindparam("b_search_name")),
+                [{"b_id": id, "b_search_name": fold(name)} for id, name in rows],
+            )
+            db.session.commit()
+            total += len(rows)
+        print(f"Backfilled search_name for {total} ingredients.")
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,136 @@
+"""
+Benchmark recipe import from URL against a local fixture site: blocking vs jobs.
+
+Starts a small HTTP server that serves schema.org recipe pages after --delay
+seconds (a slow recipe site), then imports --imports URLs drawn from --distinct
+pages, first the old way (fetch and scrape inside the request) and then through
+the import-job endpoints, reporting how long a request is held and how many
+times the site was actually fetched.
+
+    python scripts/bench_import.py --imports 40 --distinct 10 --delay 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+PAGE = """<html><head><title>{title}</title><script type="application/ld+json">{ld}</script></head>
+<body><h1>{title}</h1></body></html>"""
+
+
+def fixture_server(delay):
+    """A threaded local 'recipe site' on a free port; returns (base URL, hit counter)."""
+    hits = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                hits["n"] += 1
+            time.sleep(delay)
+            n = self.path.rstrip("/").rsplit("/", 1)[-1]
+            ld = json.dumps({
+                "@context": "https://schema.org",
+                "@type": "Recipe",
+                "name": f"Receta {n}",
+                "recipeIngredient": ["500 g harina", "2 huevos", "1 taza leche"],
+                "recipeInstructions": "Mezclar y hornear.",
+                "image": f"http://example.com/{n}.jpg",
+            })
+            body = PAGE.format(title=f"Receta {n}", ld=ld).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", hits
+
+
+def run(imports, distinct, delay, clients):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+        WTF_CSRF_ENABLED = False
+
+    from app import create_app, db
+    from app.importer import fetch_recipe
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    base, hits = fixture_server(delay)
+    urls = [f"{base}/recetas/{i % distinct}?utm_source=bench{i}" for i in range(imports)]
+    print(f"{imports} imports of {distinct} pages, site latency {delay}s, {clients} clients")
+
+    timings = []
+    t0 = time.perf_counter()
+
+    def blocking(url):
+        start = time.perf_counter()
+        fetch_recipe(url)
+        timings.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(blocking, urls))
+    print(
+        f"  before (in request)  held p50={statistics.median(timings) * 1000:8.1f} ms"
+        f"  total={time.perf_counter() - t0:6.2f} s  site fetches={hits['n']}"
+    )
+
+    hits["n"] = 0
+    timings.clear()
+    t0 = time.perf_counter()
+    local = threading.local()
+
+    def as_job(url):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+            name = f"bench{threading.get_ident()}"
+            client.post("/auth/register", data={"username": name, "password": "benchpass", "password2": "benchpass"})
+            client.post("/auth/login", data={"username": name, "password": "benchpass"})
+        start = time.perf_counter()
+        body = client.post("/recipes/import-from-url", json={"url": url}).get_json()
+        timings.append(time.perf_counter() - start)
+        delay = 0.5
+        while body["status"] == "pending":
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+            body = client.get(body["poll_url"]).get_json() | {"poll_url": body["poll_url"]}
+        assert body["status"] == "done", body
+
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(as_job, urls))
+    print(
+        f"  after (import jobs)  POST p50={statistics.median(timings) * 1000:8.1f} ms"
+        f"  total={time.perf_counter() - t0:6.2f} s  site fetches={hits['n']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--imports", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=10, help="Different pages among the imports")
+    parser.add_argument("--delay", type=float, default=0.5, help="Fixture site response time, seconds")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent users importing")
+    args = parser.parse_args()
+    run(args.imports, args.distinct, args.delay, args.clients)
+
+
+if __name__ == "__main__":
+    main()
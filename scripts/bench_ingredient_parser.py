@@ -0,0 +1,60 @@
+"""
+Benchmark the ingredient-line parser (app/ingredient_parser.py).
+
+Parses a mix of Spanish and English lines against the default unit catalogue and
+prints lines per second, plus how each sample line was split.
+
+    python scripts/bench_ingredient_parser.py --lines 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache import UnitRow
+from app.ingredient_parser import IngredientLineParser
+from scripts.seed_units import DEFAULT_UNITS
+
+SAMPLES = [
+    "2 1/2 tazas de harina",
+    "½ taza de leche",
+    "2 dientes de ajo, picados",
+    "100g mantequilla",
+    "1,5 L de agua",
+    "Medio kilo de carne molida",
+    "2-3 cucharadas de aceite de oliva",
+    "una pizca de sal",
+    "Sal y pimienta, al gusto",
+    "3 huevos",
+    "1 cup sugar, sifted",
+    "2 tbsp olive oil",
+    "1 lb. ground beef",
+    "a pinch of salt",
+    "2 hojas de laurel (opcional)",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+
+    units = [UnitRow(i, name, symbol, None, 1.0) for i, (name, symbol) in enumerate(DEFAULT_UNITS, 1)]
+    t0 = time.perf_counter()
+    line_parser = IngredientLineParser(units)
+    built = time.perf_counter() - t0
+    for line in SAMPLES:
+        row = line_parser.parse_line(line)
+        print(f"  {line!r:36} -> {row['quantity']!r:8} {row['unit_name']!r:14} {row['name']!r}")
+
+    lines = (SAMPLES * (args.lines // len(SAMPLES) + 1))[: args.lines]
+    t0 = time.perf_counter()
+    line_parser.parse_lines(lines)
+    elapsed = time.perf_counter() - t0
+    print(f"\nbuilt in {built * 1000:.2f} ms; {len(lines)} lines in {elapsed * 1000:.0f} ms ({len(lines) / elapsed:,.0f} lines/s)")
+
+
+if __name__ == "__main__":
+    main()
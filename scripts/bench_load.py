@@ -0,0 +1,357 @@
+"""
+Load benchmark of the main pages: latency percentiles, queries per request and RSS per worker.
+
+Drives the app through Flask's test client in this process (default), or through a local
+gunicorn with --gunicorn WORKERS and --concurrency client threads. Fill the database first with
+scripts/generate_data.py; the edit and meal plan scenarios write to it, so use a scratch copy.
+Each scenario runs --requests times as randomly chosen users, after --warmup unrecorded
+requests. Results are saved as JSON (default bench-results/<commit>-<mode>.json), and --compare
+prints the change against the results of an earlier commit.
+
+    python scripts/bench_load.py --database-url postgresql://localhost/load
+    python scripts/bench_load.py --database-url postgresql://localhost/load --gunicorn 4 --concurrency 8
+    python scripts/bench_load.py --database-url ... --compare bench-results/4f0294e-client.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event, func, select
+
+from config import Config
+
+SAMPLE_USERS = 50
+EDIT_RECIPES = 5  # per sampled user
+PREFIXES = ("pol", "tom", "har", "ceb", "choc", "lim", "que", "arr")
+SEARCHES = ("pollo", "arroz tomate", "crema", "sopa de", "chocolate", "zanahoria rallado")
+
+
+def bench_app(database_url=None):
+    """
+    The app with CSRF off, a /_bench/login/<user id> shortcut, and X-Bench-Queries (statements
+    run by the request) and X-Bench-Pid headers. Also the gunicorn entry point of --gunicorn.
+    """
+    from flask import g, has_request_context
+    from flask_login import login_user
+
+    from app import create_app, db
+    from app.models import User
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url or Config.SQLALCHEMY_DATABASE_URI
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(BenchConfig)
+
+    def count(*args):
+        if has_request_context():
+            g.bench_queries = g.get("bench_queries", 0) + 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", count)
+
+    @app.route("/_bench/login/<int:user_id>")
+    def bench_login(user_id):
+        login_user(db.session.get(User, user_id))
+        return "", 204
+
+    @app.after_request
+    def bench_headers(response):
+        response.headers["X-Bench-Queries"] = str(g.get("bench_queries", 0))
+        response.headers["X-Bench-Pid"] = str(os.getpid())
+        return response
+
+    return app
+
+
+def load_fixtures(app, n_users, rnd):
+    """Sampled users with the ids each scenario needs, and the form of a few recipes to edit."""
+    from app import db
+    from app.models import MealPlan, Recipe, RecipeIngredient, ShoppingList, User
+    from app.pagination import encode_cursor
+    from app.recipes import PAGE_SIZE
+
+    with app.app_context():
+        candidates = db.session.scalars(select(MealPlan.user_id).distinct()).all()
+        if not candidates:
+            sys.exit("No users with meal plans: fill the database with scripts/generate_data.py first.")
+        users = []
+        for user_id in rnd.sample(candidates, min(n_users, len(candidates))):
+            recipes = db.session.scalars(select(Recipe).where(Recipe.user_id == user_id).limit(200)).all()
+            cursor_row = db.session.execute(
+                select(Recipe.updated_at, Recipe.id)
+                .where(Recipe.user_id == user_id)
+                .order_by(Recipe.updated_at.desc().nulls_last(), Recipe.id.desc())
+                .offset(PAGE_SIZE - 1)
+                .limit(1)
+            ).first()
+            edits = []
+            for recipe in rnd.sample(recipes, min(EDIT_RECIPES, len(recipes))):
+                rows = recipe.ingredients.all()
+                edits.append((recipe.id, {
+                    "title": recipe.title,
+                    "description": recipe.description or "",
+                    "instructions": recipe.instructions or "",
+                    "tags": ", ".join(t.name for t in recipe.tags),
+                    "ingredient_name": [r.ingredient.name for r in rows],
+                    "ingredient_quantity": [r.quantity or "" for r in rows],
+                    "ingredient_unit_id": [str(r.unit_id or "") for r in rows],
+                    "ingredient_unit": ["" for _ in rows],
+                    "ingredient_optional": [str(i) for i, r in enumerate(rows) if r.optional],
+                }))
+            users.append({
+                "id": user_id,
+                "recipes": [r.id for r in recipes],
+                "cursor": encode_cursor(*cursor_row) if cursor_row else None,
+                "plans": db.session.scalars(select(MealPlan.id).where(MealPlan.user_id == user_id)).all(),
+                "lists": db.session.scalars(
+                    select(ShoppingList.id).where(ShoppingList.user_id == user_id).limit(20)
+                ).all(),
+                "edits": edits,
+            })
+        dataset = {
+            t.__tablename__: db.session.scalar(select(func.count()).select_from(t))
+            for t in (User, Recipe, RecipeIngredient, MealPlan)  # not lists: a run adds some
+        }
+        dialect = db.engine.dialect.name
+        db.session.remove()
+    return users, dataset, dialect
+
+
+def _edited(form, rnd):
+    """The recipe form with the first ingredient's quantity changed, as a user editing it would."""
+    form = dict(form)
+    if form["ingredient_quantity"]:
+        form["ingredient_quantity"] = [str(rnd.randint(1, 500))] + form["ingredient_quantity"][1:]
+    return form
+
+
+# name -> (user fixture, random) -> (method, url, form data or None)
+SCENARIOS = {
+    "recipes.list": lambda u, r: ("GET", "/recipes/", None),
+    "recipes.list (page 2)": lambda u, r: ("GET", f"/recipes/?cursor={u['cursor'] or ''}", None),
+    "recipes.list (search)": lambda u, r: ("GET", f"/recipes/?q={r.choice(SEARCHES)}", None),
+    "recipes.detail": lambda u, r: ("GET", f"/recipes/{r.choice(u['recipes'])}", None),
+    "recipes.edit (form)": lambda u, r: ("GET", f"/recipes/{r.choice(u['edits'])[0]}/edit", None),
+    "recipes.edit (save)": lambda u, r: (lambda e: ("POST", f"/recipes/{e[0]}/edit", _edited(e[1], r)))(
+        r.choice(u["edits"])
+    ),
+    "shopping.detail": lambda u, r: ("GET", f"/shopping/{r.choice(u['lists'])}", None),
+    "mealplans.detail": lambda u, r: ("GET", f"/mealplans/{r.choice(u['plans'])}", None),
+    "mealplans.create_shopping_list": lambda u, r: (
+        "POST", f"/mealplans/{r.choice(u['plans'])}/create-shopping-list", None
+    ),
+    "api.search_ingredients": lambda u, r: ("GET", f"/api/ingredients?q={r.choice(PREFIXES)}", None),
+    "api.search_recipes": lambda u, r: ("GET", f"/api/recipes?q={r.choice(PREFIXES)}", None),
+}
+
+
+class ClientDriver:
+    """Requests through Flask's test client, one logged-in client per user, in this process."""
+
+    def __init__(self, database_url, users):
+        self.app = bench_app(database_url)
+        self.clients = {}
+        for u in users:
+            client = self.app.test_client()
+            client.get(f"/_bench/login/{u['id']}")
+            self.clients[u["id"]] = client
+
+    def request(self, user_id, method, url, data):
+        resp = self.clients[user_id].open(url, method=method, data=data)
+        return resp.status_code, resp.headers
+
+    def run(self, requests, concurrency):
+        return [self.timed(*r) for r in requests]
+
+    def timed(self, *args):
+        start = time.perf_counter()
+        status, headers = self.request(*args)
+        return time.perf_counter() - start, status, headers
+
+    def close(self):
+        pass
+
+
+class GunicornDriver(ClientDriver):
+    """Requests over HTTP to a local gunicorn serving bench_app(), from a pool of client threads."""
+
+    def __init__(self, database_url, users, workers):
+        import requests
+
+        self.http = requests
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.base = f"http://127.0.0.1:{s.getsockname()[1]}"
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", self.base[len("http://"):],
+             "--chdir", ROOT, "--log-level", "warning", "scripts.bench_load:bench_app()"],
+            env={**os.environ, "DATABASE_URL": database_url},
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(self.base + "/health", timeout=1).ok:
+                    break
+            except requests.RequestException:  # not listening, or workers still booting
+                pass
+            if time.monotonic() > deadline or self.proc.poll() is not None:
+                self.close()
+                sys.exit("gunicorn did not start")
+            time.sleep(0.2)
+        self.local = threading.local()
+
+    def request(self, user_id, method, url, data):
+        sessions = self.local.__dict__.setdefault("sessions", {})
+        session = sessions.get(user_id)
+        if session is None:
+            session = sessions[user_id] = self.http.Session()
+            session.get(f"{self.base}/_bench/login/{user_id}")
+        resp = session.request(method, self.base + url, data=data, allow_redirects=False)
+        return resp.status_code, resp.headers
+
+    def run(self, requests, concurrency):
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(lambda r: self.timed(*r), requests))
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait(30)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _memory(pid):
+    """(RSS, peak RSS) of pid in MB, from /proc; (None, None) where there is no /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    return tuple(round(int(fields[k].split()[0]) / 1024, 1) for k in ("VmRSS", "VmHWM"))
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    rnd = random.Random(args.seed)
+    url = args.database_url or Config.SQLALCHEMY_DATABASE_URI
+    users, dataset, dialect = load_fixtures(bench_app(url), SAMPLE_USERS, rnd)
+    print(f"{dialect}: " + ", ".join(f"{n} {t}" for t, n in dataset.items()))
+    if args.gunicorn:
+        driver = GunicornDriver(url, users, args.gunicorn)
+        mode = "gunicorn"
+    else:
+        driver = ClientDriver(url, users)
+        mode = "client"
+    scenarios, pids = {}, set()
+    try:
+        print(f"{'scenario':<32} {'p50':>8} {'p95':>8} {'p99':>8}  {'queries':>7}  errors")
+        for name, make in SCENARIOS.items():
+            if args.only and name not in args.only:
+                continue
+            batch = []
+            for _ in range(args.warmup + args.requests):
+                u = rnd.choice(users)
+                batch.append((u["id"], *make(u, rnd)))
+            driver.run(batch[:args.warmup], args.concurrency)
+            results = driver.run(batch[args.warmup:], args.concurrency)
+            times = [t * 1000 for t, _, _ in results]
+            queries = [int(h.get("X-Bench-Queries", 0)) for _, _, h in results]
+            pids.update(h.get("X-Bench-Pid") for _, _, h in results)
+            scenarios[name] = {
+                "requests": len(results),
+                "errors": sum(status >= 400 for _, status, _ in results),
+                "p50_ms": round(_percentile(times, 50), 2),
+                "p95_ms": round(_percentile(times, 95), 2),
+                "p99_ms": round(_percentile(times, 99), 2),
+                "mean_ms": round(sum(times) / len(times), 2),
+                "queries_mean": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+            }
+            s = scenarios[name]
+            print(
+                f"{name:<32} {s['p50_ms']:>6.1f}ms {s['p95_ms']:>6.1f}ms {s['p99_ms']:>6.1f}ms"
+                f"  {s['queries_mean']:>7.1f}  {s['errors']}"
+            )
+        processes = [{"pid": int(pid), **dict(zip(("rss_mb", "peak_rss_mb"), _memory(pid)))} for pid in pids if pid]
+    finally:
+        driver.close()
+    for p in sorted(processes, key=lambda p: p["pid"]):
+        print(f"worker {p['pid']}: RSS {p['rss_mb']} MB (peak {p['peak_rss_mb']} MB)")
+    return {
+        "commit": _commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "workers": args.gunicorn or 1,
+        "concurrency": args.concurrency if args.gunicorn else 1,
+        "database": dialect,
+        "dataset": dataset,
+        "scenarios": scenarios,
+        "processes": processes,
+    }
+
+
+def compare(old, new):
+    """Print p95 latency and queries per request of new against old, per scenario."""
+    print(f"\nAgainst {old.get('commit')} ({old.get('date')}, {old.get('mode')}):")
+    if old.get("dataset") != new["dataset"]:
+        print("  (the dataset differs, so timings are not directly comparable)")
+    for name, s in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        change = (s["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+        queries = f"queries {before['queries_mean']} -> {s['queries_mean']}"
+        flag = "  MORE QUERIES" if s["queries_mean"] > before["queries_mean"] else ""
+        print(f"  {name:<32} p95 {before['p95_ms']:>7.1f} -> {s['p95_ms']:>7.1f} ms ({change:+.0f}%)  {queries}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="database filled by generate_data.py (default: the configured one)")
+    parser.add_argument("--requests", type=int, default=200, help="recorded requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests per scenario first")
+    parser.add_argument("--gunicorn", type=int, metavar="WORKERS", help="serve with a local gunicorn")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads (with --gunicorn)")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO", help=f"some of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--output", help="results file (default: bench-results/<commit>-<mode>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare with")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    results = run(args)
+    output = args.output or os.path.join(ROOT, "bench-results", f"{results['commit'] or 'results'}-{results['mode']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Time writing N recipes through POST /api/recipes/batch's save_recipes(): one batch vs one recipe per call.
+
+    python scripts/bench_recipe_batch.py --recipes 1000 --ingredients 10
+    python scripts/bench_recipe_batch.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, select
+
+from config import Config
+
+UNITS = ("g", "kg", "ml", "tazas", "cucharadas", "cdta", "")
+TAGS = ("cena", "postre", "vegano", "rápido", "horno", "sopa", "fácil", "fiesta")
+
+
+def _items(prefix, n, ingredients, rng):
+    """n batch items keyed prefix-0..n-1, each with ingredient lines drawn from a 500-name pool."""
+    return [
+        {
+            "key": f"{prefix}-{i}",
+            "title": f"Receta de prueba {i}",
+            "description": "Generada por bench_recipe_batch",
+            "instructions": "Mezclar todo. Hornear 30 minutos.",
+            "ingredients": [
+                f"{rng.randint(1, 500)} {rng.choice(UNITS)} ingrediente {rng.randint(1, 500)}".replace("  ", " ")
+                for _ in range(ingredients)
+            ],
+            "tags": rng.sample(TAGS, 2),
+        }
+        for i in range(n)
+    ]
+
+
+def run(database_url, n, ingredients):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    from app import create_app, db
+    from app.batch import save_recipes
+    from app.models import Recipe, User
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username=f"bench-batch-{os.getpid()}", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        statements = [0]
+        event.listen(db.engine, "after_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1))
+        rng = random.Random(1)
+
+        def timed(label, fn):
+            statements[0] = 0
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"{label:28} {elapsed:8.2f} s {n / elapsed:9.0f} recipes/s {statements[0]:8} statements")
+
+        one_by_one = _items("single", n, ingredients, rng)
+        timed("one recipe per call", lambda: [save_recipes(user.id, [item]) for item in one_by_one])
+        batch = _items("batch", n, ingredients, rng)
+        timed(f"one batch of {n}", lambda: save_recipes(user.id, batch))
+        timed("same batch again (retry)", lambda: save_recipes(user.id, batch))
+        count = db.session.scalar(select(func.count()).select_from(Recipe).where(Recipe.user_id == user.id))
+        print(f"recipes stored: {count} (expected {2 * n})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--ingredients", type=int, default=10)
+    args = parser.parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    run(url, args.recipes, args.ingredients)
+
+
+if __name__ == "__main__":
+    main()
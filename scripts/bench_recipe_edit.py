@@ -0,0 +1,112 @@
+"""
+Compare recipe_ingredients write volume of the diff-based edit path against the
+old delete-all-and-reinsert path, for a few typical edits.
+
+    python scripts/bench_recipe_edit.py --ingredients 30
+    python scripts/bench_recipe_edit.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+from config import Config
+
+
+class WriteCounter:
+    """Counts write statements and rows touched in recipe_ingredients."""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.rows = 0
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if "recipe_ingredients" in statement and statement.lstrip().split()[0] in ("INSERT", "UPDATE", "DELETE"):
+            self.statements += 1
+            self.rows += max(cursor.rowcount, 0)
+
+    def reset(self):
+        self.statements = self.rows = 0
+
+
+def _edits(values):
+    """(label, new values) for typical edits of a recipe whose rows are values."""
+    changed = [dict(v) for v in values]
+    changed[len(changed) // 2]["quantity"] = "3"
+    return [
+        ("title only", [dict(v) for v in values]),
+        ("one quantity", changed),
+        ("add one", [dict(v) for v in values] + [dict(values[0], quantity="9")]),
+        ("remove last", [dict(v) for v in values[:-1]]),
+        ("remove first", [dict(v) for v in values[1:]]),
+        ("insert first", [dict(values[-1], quantity="9")] + [dict(v) for v in values]),
+    ]
+
+
+def run(database_url, n):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    from app import create_app, db
+    from app.models import IngredientMaster, Recipe, RecipeIngredient, User
+    from app.recipes import insert_recipe_ingredients, sync_recipe_ingredients
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench-edit", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        masters = [IngredientMaster(name=f"bench ingredient {i}") for i in range(n + 1)]
+        db.session.add_all(masters)
+        db.session.flush()
+        counter = WriteCounter(db.engine)
+
+        print(f"{'edit':14} {'old stmts':>10} {'old rows':>9} {'new stmts':>10} {'new rows':>9}")
+        for label, _ in _edits([{}] * n):
+            results = []
+            for mode in ("old", "new"):
+                recipe = Recipe(user_id=user.id, title="bench")
+                db.session.add(recipe)
+                db.session.flush()
+                values = [
+                    {
+                        "recipe_id": recipe.id,
+                        "ingredient_master_id": masters[i].id,
+                        "unit_id": None,
+                        "quantity": "1",
+                        "optional": False,
+                    }
+                    for i in range(n)
+                ]
+                insert_recipe_ingredients(values)
+                new_values = dict(_edits(values))[label]
+                counter.reset()
+                if mode == "old":
+                    RecipeIngredient.query.filter_by(recipe_id=recipe.id).delete()
+                    db.session.execute(insert(RecipeIngredient), new_values)
+                else:
+                    sync_recipe_ingredients(recipe.id, new_values)
+                db.session.flush()
+                results.append((counter.statements, counter.rows))
+            (old_s, old_r), (new_s, new_r) = results
+            print(f"{label:14} {old_s:>10} {old_r:>9} {new_s:>10} {new_r:>9}")
+        db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--ingredients", type=int, default=30)
+    args = parser.parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    run(url, args.ingredients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark per-image S3 latency with a new client per call vs the shared client.
+
+Needs an S3-compatible endpoint with a scratch bucket, e.g. a local stand-in:
+
+    moto_server -p 5000        (or: minio server /tmp/minio)
+    python scripts/bench_s3_client.py --endpoint http://127.0.0.1:5000 --bucket bench
+
+"before" builds a boto3 client for every upload_image/get_image_url/delete_image
+call, as the app used to; "after" goes through app.uploads and its per-process client.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(endpoint, bucket, images, size_kb):
+    os.environ.setdefault("ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("SECRET_ACCESS_KEY", "bench")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite://"
+        S3_BUCKET = bucket
+        S3_ENDPOINT = endpoint
+
+    import boto3
+
+    from app import create_app, uploads
+
+    app = create_app(BenchConfig)
+    body = os.urandom(size_kb * 1024)
+    with app.test_request_context():
+        client = uploads._s3_client()
+        try:
+            client.create_bucket(Bucket=bucket)
+        except client.exceptions.ClientError:
+            pass
+
+        def per_call_client():
+            return boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                region_name=app.config["S3_REGION"],
+                aws_access_key_id=os.environ["ACCESS_KEY_ID"],
+                aws_secret_access_key=os.environ["SECRET_ACCESS_KEY"],
+            )
+
+        print(f"{images} images of {size_kb} KB against {endpoint}")
+        for label, factory in [("before (client per call)", per_call_client), ("after (shared client)", None)]:
+            original = uploads._s3_client
+            if factory is not None:
+                uploads._s3_client = factory
+            try:
+                timings = []
+                for _ in range(images):
+                    t0 = time.perf_counter()
+                    stored = uploads.upload_image(0, body, f"{uuid.uuid4().hex}.jpg")
+                    uploads.get_image_url(0, stored)
+                    uploads.delete_image(stored)
+                    timings.append((time.perf_counter() - t0) * 1000)
+            finally:
+                uploads._s3_client = original
+            print(
+                f"  {label:26} p50={statistics.median(timings):7.2f} ms"
+                f"  p95={_percentile(timings, 95):7.2f} ms  (upload + sign + delete per image)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--endpoint", required=True, help="S3-compatible endpoint URL")
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--size-kb", type=int, default=200)
+    args = parser.parse_args()
+    run(args.endpoint, args.bucket, args.images, args.size_kb)
+
+
+if __name__ == "__main__":
+    main()
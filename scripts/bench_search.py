@@ -0,0 +1,104 @@
+"""
+Benchmark recipe search latency at 10k / 100k recipes.
+
+Seeds a throwaway database (temporary SQLite file by default, or the empty
+database given with --database-url) and times search_query() for a set of
+typical autocomplete terms.
+
+    python scripts/bench_search.py --sizes 10000 100000
+    python scripts/bench_search.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+WORDS = (
+    "pollo arroz limón tomate cebolla ajo harina leche huevo azúcar mantequilla "
+    "queso papa zanahoria pimiento chile frijol maíz tortilla pasta salsa crema "
+    "chocolate vainilla canela manzana plátano fresa naranja cilantro perejil"
+).split()
+TERMS = ["pol", "limon", "arroz pollo", "choc", "tomate ajo", "zzz", "tortilla"]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def seed(db, user_id, n, start=0, batch=5000):
+    from app.models import Recipe, RecipeSearchDocument
+    from app.normalize import fold
+
+    rnd = random.Random(start)
+    for lo in range(start, start + n, batch):
+        hi = min(lo + batch, start + n)
+        recipes, docs = [], []
+        for i in range(lo, hi):
+            title = " ".join(rnd.sample(WORDS, 2)) + f" {i}"
+            recipes.append({"id": i + 1, "user_id": user_id, "title": title, "instructions": "mezclar"})
+            docs.append({
+                "recipe_id": i + 1,
+                "user_id": user_id,
+                "title": fold(title),
+                "keywords": fold(" ".join(rnd.sample(WORDS, 8))),
+                "body": "mezclar y hornear",
+            })
+        db.session.execute(Recipe.__table__.insert(), recipes)
+        db.session.execute(RecipeSearchDocument.__table__.insert(), docs)
+        db.session.commit()
+
+
+def run(database_url, sizes, repeat):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    from app import create_app, db
+    from app.models import User
+    from app.search import search_query
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        seeded = 0
+        for size in sizes:
+            seed(db, user.id, size - seeded, start=seeded)
+            seeded = size
+            if db.engine.dialect.name == "postgresql":
+                db.session.execute(db.text("ANALYZE"))
+                db.session.commit()
+            print(f"\n{size} recipes ({db.engine.dialect.name})")
+            for term in TERMS:
+                timings = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    rows = search_query(user.id, term).limit(15).all()
+                    timings.append((time.perf_counter() - t0) * 1000)
+                print(
+                    f"  {term!r:14} hits={len(rows):2}  p50={statistics.median(timings):7.2f} ms"
+                    f"  p95={_percentile(timings, 95):7.2f} ms"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Empty scratch database (default: temporary SQLite file)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    run(url, sorted(args.sizes), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Micro-benchmark the shopping-list merge for meal plans of 50 recipes.
+
+Recipes use grams, kilograms (converted to grams) and an unconvertible unit,
+with quantities such as "250", "1 1/2", "½" and "al gusto". Times the
+in-memory merge of the plan's ingredients with the old linear scan (one pass
+over the list per ingredient, no unit conversion) and with ItemMerger, then
+times add_recipes_to_list() and meal_plan_to_list() against a scratch database
+and counts statements. Use --recipes 500 for large plans.
+
+    python scripts/bench_shopping_merge.py --recipes 50 --ingredients 15
+    python scripts/bench_shopping_merge.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+from config import Config
+
+QUANTITIES = ["250", "100", "1 1/2", "½", "0,5", "2", "3/4", "al gusto"]
+
+
+def _linear_merge(rows):
+    """The previous algorithm: scan every item for each incoming ingredient."""
+    from app.merge import add_quantities
+
+    items = []
+    for master_id, unit_id, quantity in rows:
+        for item in items:
+            if item[0] == master_id and item[1] == unit_id:
+                item[2] = add_quantities(item[2], quantity)
+                break
+        else:
+            items.append([master_id, unit_id, quantity])
+    return items
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings)
+
+
+def run(database_url, n_recipes, n_ingredients, pool, repeat):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    from app import create_app, db
+    from app.cache import unit_cache
+    from app.merge import ItemMerger, add_recipes_to_list, meal_plan_to_list
+    from app.quantity import conversion_table
+    from app.models import IngredientMaster, MealPlan, MealPlanRecipe, Recipe, RecipeIngredient, ShoppingList, Unit, User
+
+    rnd = random.Random(0)
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench-merge", password_hash="x")
+        db.session.add(user)
+        grams = Unit(name="bench gramos", symbol="bg")
+        units = [grams, Unit(name="bench tazas", symbol="bt")]
+        db.session.add_all(units)
+        db.session.flush()
+        units.append(Unit(name="bench kilogramos", symbol="bkg", base_unit_id=grams.id, conversion_factor=1000))
+        masters = [IngredientMaster(name=f"bench merge ingredient {i}") for i in range(pool)]
+        db.session.add_all(units[2:] + masters)
+        unit_cache.invalidate()
+        db.session.flush()
+        recipes = [Recipe(user_id=user.id, title=f"bench {i}") for i in range(n_recipes)]
+        db.session.add_all(recipes)
+        db.session.flush()
+        values = [
+            {
+                "recipe_id": r.id,
+                "ingredient_master_id": m.id,
+                "unit_id": rnd.choice(units).id,
+                "quantity": rnd.choice(QUANTITIES),
+                "optional": False,
+            }
+            for r in recipes
+            for m in rnd.sample(masters, n_ingredients)
+        ]
+        db.session.execute(insert(RecipeIngredient), values)
+        db.session.commit()
+
+        rows = [(v["ingredient_master_id"], v["unit_id"], v["quantity"]) for v in values]
+
+        conversions = conversion_table()
+
+        def hashed():
+            merger = ItemMerger(None, conversions=conversions)
+            for master_id, unit_id, quantity in rows:
+                merger.add(master_id, unit_id, quantity)
+            return merger.new
+
+        print(f"{n_recipes} recipes x {n_ingredients} ingredients ({len(rows)} rows, pool {pool})")
+        print(
+            f"  in-memory linear scan   {_time(lambda: _linear_merge(rows), repeat):8.2f} ms"
+            f"  ({len(_linear_merge(rows))} lines)"
+        )
+        print(f"  in-memory ItemMerger    {_time(hashed, repeat):8.2f} ms  ({len(hashed())} lines)")
+
+        plan = MealPlan(user_id=user.id, name="bench")
+        db.session.add(plan)
+        db.session.flush()
+        db.session.add_all(MealPlanRecipe(meal_plan_id=plan.id, recipe_id=r.id, count=1) for r in recipes)
+        db.session.flush()
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(1))
+        multipliers = {r.id: 1 for r in recipes}
+        for label, fill in [
+            ("add_recipes_to_list", lambda sl: add_recipes_to_list(sl.id, multipliers)),
+            ("meal_plan_to_list", lambda sl: meal_plan_to_list(plan.id, sl.id)),
+        ]:
+            timings = []
+            for _ in range(repeat):
+                sl = ShoppingList(user_id=user.id, name="bench")
+                db.session.add(sl)
+                db.session.flush()
+                del statements[:]
+                t0 = time.perf_counter()
+                fill(sl)
+                db.session.flush()
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(
+                f"  {label:23} {statistics.median(timings):8.2f} ms"
+                f"  ({len(statements)} statements, {db.engine.dialect.name})"
+            )
+        db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--ingredients", type=int, default=15, help="Ingredients per recipe")
+    parser.add_argument("--pool", type=int, default=300, help="Distinct ingredients across recipes")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    run(url, args.recipes, args.ingredients, args.pool, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
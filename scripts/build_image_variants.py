@@ -0,0 +1,86 @@
+"""
+Generate the resized WebP/JPEG copies of images uploaded before variants existed
+(after migration 0004 added RecipeImage.variants). Images are processed in parallel,
+one worker process per core by default.
+
+    python scripts/build_image_variants.py [--workers 4]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.images import store_variants
+from app.models import RecipeImage
+from app.uploads import storage_for
+
+BATCH_SIZE = 200
+
+_app = None
+
+
+def _init_worker():
+    global _app
+    _app = create_app()
+    _app.app_context().push()
+
+
+def _process(job):
+    """(image id, variants or None, error) for one (id, recipe_id, filename) job."""
+    image_id, recipe_id, filename = job
+    storage = storage_for(filename)
+    try:
+        with storage.open(recipe_id, filename) as fileobj:
+            name = filename.rsplit("/", 1)[-1]
+            return image_id, store_variants(storage, recipe_id, fileobj, name, _app.config["IMAGE_VARIANT_WIDTHS"]), None
+    except ValueError as e:
+        return image_id, "", str(e)  # not an image: mark done, keep serving the original
+    except Exception as e:
+        return image_id, None, f"{type(e).__name__}: {e}"
+
+
+def build(workers):
+    app = create_app()
+    with app.app_context():
+        done = failed = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            while True:
+                jobs = (
+                    db.session.query(RecipeImage.id, RecipeImage.recipe_id, RecipeImage.filename)
+                    .filter(RecipeImage.variants.is_(None), RecipeImage.id > last_id)
+                    .order_by(RecipeImage.id)
+                    .limit(BATCH_SIZE)
+                    .all()
+                )
+                if not jobs:
+                    break
+                last_id = jobs[-1].id
+                results = []
+                for image_id, variants, error in pool.map(_process, [tuple(j) for j in jobs]):
+                    if error:
+                        print(f"  image {image_id}: {error}")
+                    if variants is None:
+                        failed += 1
+                    else:
+                        results.append({"b_id": image_id, "b_variants": variants})
+                if results:
+                    db.session.execute(
+                        RecipeImage.__table__.update()
+                        .where(RecipeImage.id == db.bindparam("b_id"))
+                        .values(variants=db.bindparam("b_variants")),
+                        results,
+                    )
+                    db.session.commit()
+                done += len(results)
+                print(f"Processed {done} images...")
+        print(f"Image variants built. Total: {done}, failed: {failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: one per core)")
+    build(parser.parse_args().workers)
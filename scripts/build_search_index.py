@@ -0,0 +1,45 @@
+"""
+Create the full-text search index and (re)build search documents for every recipe.
+Run once for existing databases, or any time the index looks out of date.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import selectinload
+
+from app import create_app, db
+from app.models import Recipe
+from app.search import ensure_search_index, index_recipe
+
+BATCH_SIZE = 500
+
+
+def build():
+    app = create_app()
+    with app.app_context():
+        ensure_search_index(db.engine)
+        total = 0
+        last_id = 0
+        while True:
+            batch = (
+                Recipe.query.options(selectinload(Recipe.tags), selectinload(Recipe.search_document))
+                .filter(Recipe.id > last_id)
+                .order_by(Recipe.id)
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                break
+            for recipe in batch:
+                index_recipe(recipe)
+            db.session.commit()
+            total += len(batch)
+            last_id = batch[-1].id
+            print(f"Indexed {total} recipes...")
+        print(f"Search index built. Total: {total}")
+
+
+if __name__ == "__main__":
+    build()
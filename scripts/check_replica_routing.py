@@ -0,0 +1,111 @@
+"""
+Check read replica routing (app/routing.py) against two databases: which one serves each request.
+
+    python scripts/check_replica_routing.py
+    python scripts/check_replica_routing.py --primary-url postgresql://localhost/recetas \\
+        --replica-url postgresql://localhost/recetas_replica
+
+Without URLs it uses two temporary SQLite files. The tables of the replica are emptied and
+refilled from the primary to stand in for replication, so don't point it at real data.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, select
+
+from config import Config
+
+
+def run(primary_url, replica_url):
+    class CheckConfig(Config):
+        SQLALCHEMY_DATABASE_URI = primary_url
+        DATABASE_REPLICA_URL = replica_url
+        WTF_CSRF_ENABLED = False
+
+    from app import create_app, db
+    from app.models import User
+    from app.routing import STICKY_KEY
+
+    app = create_app(CheckConfig)
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines["replica"]
+        db.metadata.create_all(primary)
+        db.metadata.create_all(replica)
+        counts = {"primary": 0, "replica": 0}
+        for name, engine in (("primary", primary), ("replica", replica)):
+            event.listen(engine, "after_cursor_execute", lambda *args, name=name: counts.__setitem__(name, counts[name] + 1))
+
+        def replicate():
+            """Copy every table from the primary to the replica (what streaming replication would do)."""
+            with primary.connect() as src, replica.begin() as dst:
+                for table in reversed(db.metadata.sorted_tables):
+                    dst.execute(table.delete())
+                for table in db.metadata.sorted_tables:
+                    rows = [r._asdict() for r in src.execute(select(table))]
+                    if rows:
+                        dst.execute(insert(table), rows)
+
+        user = User(username=f"check-replica-{os.getpid()}", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        replicate()
+        db.session.remove()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+    failures = []
+
+    def request(label, expect_db, expect_status, method, url, **kw):
+        counts.update(primary=0, replica=0)
+        resp = client.open(url, method=method, **kw)
+        served = [name for name in ("primary", "replica") if counts[name]]
+        ok = served == [expect_db] and resp.status_code == expect_status
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<48} {resp.status_code}  primary={counts['primary']:<3} replica={counts['replica']}")
+        if not ok:
+            failures.append(label)
+        return resp
+
+    def expire_stickiness():
+        with client.session_transaction() as session:
+            session[STICKY_KEY] = 0
+
+    client.get("/api/ingredients?q=a")  # one-off per-process lookups (the pg_trgm check) are raw SQL: primary
+    request("GET recipes list", "replica", 200, "GET", "/recipes/")
+    request("GET ingredient autocomplete", "replica", 200, "GET", "/api/ingredients?q=har")
+    request("GET shopping lists", "replica", 200, "GET", "/shopping/")
+    resp = request("POST new recipe", "primary", 302, "POST", "/recipes/new", data={"title": "Tarta de prueba"})
+    detail_url = resp.headers["Location"]
+    request("GET the new recipe right after (sticky)", "primary", 200, "GET", detail_url)
+    expire_stickiness()
+    request("GET it after the window, replica lagging", "replica", 404, "GET", detail_url)
+    with app.app_context():
+        replicate()
+    request("GET it after the window, replica caught up", "replica", 200, "GET", detail_url)
+    request("GET new-recipe form (not read_only)", "primary", 200, "GET", "/recipes/new")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--primary-url", help="primary database (default: a temporary SQLite file)")
+    parser.add_argument("--replica-url", help="replica database, emptied and refilled (default: a temporary SQLite file)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        primary_url = args.primary_url or "sqlite:///" + os.path.join(tmp, "primary.db")
+        replica_url = args.replica_url or "sqlite:///" + os.path.join(tmp, "replica.db")
+        failures = run(primary_url, replica_url)
+    if failures:
+        sys.exit(f"{len(failures)} checks failed")
+    print("Reads of @read_only views went to the replica, and to the primary after a write.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Export a user's recipes, shopping lists and meal plans to NDJSON, or to a zip with the images.
+
+The file can be loaded into another account or instance with scripts/import_data.py
+(or POST /api/import). Rows are streamed from the database, so any size works.
+
+    python scripts/export_data.py --user ana -o ana.ndjson
+    python scripts/export_data.py --user ana --images -o ana.zip
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.backup import export_lines, export_zip
+from app.models import User
+
+
+def run(username, path, images):
+    app = create_app()
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            sys.exit(f"No user named {username!r}")
+        started = time.perf_counter()
+        if images:
+            with open(path, "wb") as out:
+                for data in export_zip(user.id):
+                    out.write(data)
+        else:
+            with open(path, "w", encoding="utf-8") as out:
+                out.writelines(export_lines(user.id))
+        size = os.path.getsize(path)
+        print(f"Exported {username} to {path} ({size / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user", required=True, help="Username to export")
+    parser.add_argument("-o", "--output", help="Output file (default <user>.ndjson or <user>.zip)")
+    parser.add_argument("--images", action="store_true", help="Write a zip that includes the recipe images")
+    args = parser.parse_args()
+    path = args.output or f"{args.user}.{'zip' if args.images else 'ndjson'}"
+    run(args.user, path, args.images)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Seed a database with synthetic users, recipes, shopping lists and meal plans at production volumes.
+
+The defaults are the sizes we plan for: 10k users with about 100 recipes each (1M recipes)
+of 20 ingredients (20M recipe_ingredients rows), plus 5 shopping lists of 15 items and
+3 meal plans of 7 recipes per user. Rows are appended after the existing ids, so it can
+run on a database that has data; users are named gen-<id> and share --password.
+PostgreSQL is loaded with COPY, other databases with multi-row INSERTs, a few users at a time.
+
+    python scripts/generate_data.py --database-url postgresql://localhost/load
+    python scripts/generate_data.py --users 500 --recipes 40   # into the configured database
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+
+from config import Config
+
+DISHES = (
+    "sopa ensalada tarta guiso crema salsa pastel tortilla arroz pasta pan galletas estofado curry "
+    "tacos empanadas croquetas lasaña quiche risotto"
+).split()
+INGREDIENTS = (
+    "pollo arroz tomate cebolla ajo harina leche huevo azúcar mantequilla queso papa zanahoria "
+    "pimiento chile frijol maíz tortilla pasta crema chocolate vainilla canela manzana plátano "
+    "fresa naranja cilantro perejil limón lenteja garbanzo atún salmón cerdo res calabaza espinaca "
+    "lechuga pepino aguacate nuez almendra avena miel yogur pan vinagre aceite pimienta comino"
+).split()
+QUALIFIERS = (
+    "fresco seco molido rallado picado entero tierno maduro ahumado dulce integral blanco rojo verde"
+).split()
+TAGS = (
+    "cena comida desayuno postre vegano vegetariano rápido fácil horno sopa fiesta navidad "
+    "sin gluten económico picante saludable niños batch cooking verano invierno"
+).split()
+QUANTITIES = ("1", "2", "3", "1/2", "1/4", "1 1/2", "100", "200", "250", "500", "")
+BATCH_USERS = 100  # users generated, written and committed together
+
+
+def ingredient_names():
+    """The ingredient catalogue: every ingredient plain and with each qualifier."""
+    return INGREDIENTS + [f"{i} {q}" for i in INGREDIENTS for q in QUALIFIERS]
+
+
+def _copy_text(value):
+    """value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def write_rows(conn, table, columns, rows):
+    """Append rows (tuples in columns order): COPY on PostgreSQL, else one multi-row INSERT."""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql" and conn.dialect.driver in ("psycopg2", "psycopg"):
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(_copy_text(v) for v in row) + "\n")
+        sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            if conn.dialect.driver == "psycopg2":
+                buf.seek(0)
+                cursor.copy_expert(sql, buf)
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(buf.getvalue())
+        finally:
+            cursor.close()
+        return
+    conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def _next_ids(db, tables):
+    """{table name: first free id} of tables (with integer ids)."""
+    return {t.name: (db.session.scalar(select(func.max(t.c.id))) or 0) + 1 for t in tables}
+
+
+def _catalogue(db):
+    """(unit ids, ingredient ids, tag ids), creating the default units, ingredients and tags if missing."""
+    from app.cache import get_units, unit_cache
+    from app.entities import resolve_ingredients, resolve_tags
+    from app.models import Unit
+    from scripts.seed_units import DEFAULT_UNITS
+
+    have = {u.name.lower() for u in get_units()}
+    missing = [Unit(name=name, symbol=symbol) for name, symbol in DEFAULT_UNITS if name not in have]
+    if missing:
+        db.session.add_all(missing)
+        unit_cache.invalidate()
+        db.session.commit()
+    wanted = {name for name, _ in DEFAULT_UNITS}
+    unit_ids = [u.id for u in get_units() if u.name in wanted]
+    ingredient_ids = [i.id for i in resolve_ingredients(ingredient_names()).values()]
+    tag_ids = [t.id for t in resolve_tags(TAGS).values()]
+    db.session.commit()
+    return unit_ids, ingredient_ids, tag_ids
+
+
+def generate(db, users, recipes, ingredients, lists, plans, password="generated", seed=1, log=print):
+    """Append the synthetic dataset (see module docstring) in the current app's database."""
+    from app.models import (
+        MealPlan, MealPlanRecipe, Recipe, RecipeImage, RecipeIngredient, RecipeSearchDocument,
+        ShoppingList, ShoppingListItem, User, recipe_tags,
+    )
+    from app.normalize import fold
+
+    rnd = random.Random(seed)
+    unit_ids, ingredient_ids, tag_ids = _catalogue(db)
+    names = dict(zip(ingredient_ids, ingredient_names()))
+    tables = [t.__table__ for t in (
+        User, Recipe, RecipeIngredient, RecipeImage, ShoppingList, ShoppingListItem, MealPlan, MealPlanRecipe,
+    )]
+    next_id = _next_ids(db, tables)
+    password_hash = generate_password_hash(password)
+    now = datetime.utcnow()
+    started, written = time.perf_counter(), 0
+
+    def new_id(table):
+        value = next_id[table]
+        next_id[table] += 1
+        return value
+
+    for lo in range(0, users, BATCH_USERS):
+        rows = {t: [] for t in (
+            "users", "recipes", "docs", "ingredients", "images", "tags", "lists", "items", "plans", "plan_recipes",
+        )}
+        for _ in range(lo, min(lo + BATCH_USERS, users)):
+            user_id = new_id("users")
+            rows["users"].append((user_id, f"gen-{user_id}", password_hash))
+            own = []
+            for _ in range(rnd.randint(recipes // 2, recipes * 3 // 2)):
+                recipe_id = new_id("recipes")
+                own.append(recipe_id)
+                main = rnd.choice(INGREDIENTS)
+                title = f"{rnd.choice(DISHES)} de {main} {rnd.choice(QUALIFIERS)}".capitalize()
+                created = now - timedelta(minutes=rnd.randint(0, 2 * 365 * 24 * 60))
+                updated = created + timedelta(minutes=rnd.randint(0, 60 * 24 * 30))
+                description = f"Receta casera de {main}."
+                instructions = f"Preparar el {main}. Mezclar todo y cocinar {rnd.randint(10, 90)} minutos."
+                rows["recipes"].append((recipe_id, user_id, title, description, instructions, created, updated))
+                chosen = rnd.sample(ingredient_ids, min(ingredients, len(ingredient_ids)))
+                for ingredient_id in chosen:
+                    rows["ingredients"].append((
+                        new_id("recipe_ingredients"), recipe_id, ingredient_id, rnd.choice(unit_ids),
+                        rnd.choice(QUANTITIES), rnd.random() < 0.05,
+                    ))
+                recipe_tag_ids = rnd.sample(tag_ids, 2)
+                rows["tags"] += [(recipe_id, tag_id) for tag_id in recipe_tag_ids]
+                if rnd.random() < 0.5:
+                    rows["images"].append((new_id("recipe_images"), recipe_id, f"{recipe_id}.jpg"))
+                rows["docs"].append((
+                    recipe_id, user_id, fold(title), fold(" ".join(names[i] for i in chosen)),
+                    fold(f"{description} {instructions}"),
+                ))
+            for _ in range(lists):
+                list_id = new_id("shopping_lists")
+                created = now - timedelta(minutes=rnd.randint(0, 365 * 24 * 60))
+                rows["lists"].append((list_id, user_id, f"Compra {created:%d/%m}", created))
+                for ingredient_id in rnd.sample(ingredient_ids, 15):
+                    rows["items"].append((
+                        new_id("shopping_list_items"), list_id, ingredient_id, rnd.choice(unit_ids),
+                        rnd.choice(QUANTITIES), rnd.random() < 0.3,
+                    ))
+            for n in range(plans if own else 0):
+                plan_id = new_id("meal_plans")
+                created = now - timedelta(days=7 * n)
+                rows["plans"].append((plan_id, user_id, f"Semana {n + 1}", 7, created))
+                for recipe_id in rnd.sample(own, min(7, len(own))):
+                    rows["plan_recipes"].append((new_id("meal_plan_recipes"), plan_id, recipe_id, rnd.randint(1, 3)))
+
+        conn = db.session.connection()
+        for table, columns, key in (
+            (User.__table__, ("id", "username", "password_hash"), "users"),
+            (Recipe.__table__, ("id", "user_id", "title", "description", "instructions", "created_at", "updated_at"),
+             "recipes"),
+            (RecipeIngredient.__table__,
+             ("id", "recipe_id", "ingredient_master_id", "unit_id", "quantity", "optional"), "ingredients"),
+            (recipe_tags, ("recipe_id", "tag_id"), "tags"),
+            (RecipeImage.__table__, ("id", "recipe_id", "filename"), "images"),
+            (RecipeSearchDocument.__table__, ("recipe_id", "user_id", "title", "keywords", "body"), "docs"),
+            (ShoppingList.__table__, ("id", "user_id", "name", "created_at"), "lists"),
+            (ShoppingListItem.__table__,
+             ("id", "shopping_list_id", "ingredient_master_id", "unit_id", "quantity", "checked"), "items"),
+            (MealPlan.__table__, ("id", "user_id", "name", "duration_days", "created_at"), "plans"),
+            (MealPlanRecipe.__table__, ("id", "meal_plan_id", "recipe_id", "count"), "plan_recipes"),
+        ):
+            write_rows(conn, table, columns, rows[key])
+            written += len(rows[key])
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        log(f"  {min(lo + BATCH_USERS, users)}/{users} users, {written} rows, {written / elapsed:,.0f} rows/s")
+
+    if db.engine.dialect.name == "postgresql":
+        for table in tables:  # ids were given explicitly: move the sequences past them
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT coalesce(max(id), 0) + 1 FROM {table.name}), false)"
+            ))
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="database to fill (default: the configured one)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--recipes", type=int, default=100, help="recipes per user, on average")
+    parser.add_argument("--ingredients", type=int, default=20, help="ingredients per recipe")
+    parser.add_argument("--lists", type=int, default=5, help="shopping lists per user")
+    parser.add_argument("--plans", type=int, default=3, help="meal plans per user")
+    parser.add_argument("--password", default="generated", help="password of every generated user")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    class GenerateConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or Config.SQLALCHEMY_DATABASE_URI
+
+    from app import create_app, db
+
+    app = create_app(GenerateConfig)
+    with app.app_context():
+        db.create_all()
+        print(f"Generating {args.users} users into {db.engine.url.render_as_string(hide_password=True)}")
+        started = time.perf_counter()
+        written = generate(
+            db, args.users, args.recipes, args.ingredients, args.lists, args.plans, args.password, args.seed
+        )
+        print(f"{written} rows in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Import an export (NDJSON, or zip with images) from scripts/export_data.py into a user's account.
+
+Recipes already imported from the same export are updated instead of duplicated, so an
+interrupted import can simply be run again.
+
+    python scripts/import_data.py --user ana ana.zip
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.backup import import_records, import_zip, read_ndjson
+from app.models import User
+
+
+def run(username, path):
+    app = create_app()
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            sys.exit(f"No user named {username!r}")
+        started = time.perf_counter()
+        try:
+            if zipfile.is_zipfile(path):
+                with open(path, "rb") as f:
+                    summary = import_zip(user.id, f)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    summary = import_records(user.id, read_ndjson(f))
+        except ValueError as e:
+            sys.exit(f"Import failed: {e}")
+        counts = ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in summary.items())
+        print(f"Imported {path} for {username}: {counts} in {time.perf_counter() - started:.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="NDJSON or zip file written by export_data.py")
+    parser.add_argument("--user", required=True, help="Username to import into")
+    args = parser.parse_args()
+    run(args.user, args.path)
+
+
+if __name__ == "__main__":
+    main()
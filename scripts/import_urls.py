@@ -0,0 +1,100 @@
+"""
+Import recipes for a user from many URLs at once (e.g. a bookmarks export).
+
+URLs come from the command line and/or --file: a JSON list (of URLs, or of objects
+with a "url" key), a CSV with a "url" column (else the first column), or one URL per
+line. Pages are fetched concurrently with per-site limits; each result is printed as
+soon as its recipe is saved, and failures are listed with their reason.
+
+    python scripts/import_urls.py --user ana --file bookmarks.csv
+    python scripts/import_urls.py --user ana https://example.com/tortilla https://...
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.bulk_import import import_options, import_urls
+from app.importer import url_key
+from app.models import User
+
+
+def read_urls(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith(".json"):
+        data = json.loads(text)
+        return [item["url"] if isinstance(item, dict) else item for item in data]
+    if path.lower().endswith(".csv"):
+        rows = [row for row in csv.reader(text.splitlines()) if row]
+        if not rows:
+            return []
+        header = [c.strip().lower() for c in rows[0]]
+        if "url" in header:
+            col = header.index("url")
+            return [row[col] for row in rows[1:] if len(row) > col]
+        return [row[0] for row in rows]
+    return text.splitlines()
+
+
+def run(username, urls, overrides):
+    app = create_app()
+    options = {**import_options(app.config), **overrides}
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            sys.exit(f"No user named {username!r}")
+        seen, unique = set(), []
+        for url in (u.strip() for u in urls):
+            if url.startswith(("http://", "https://")) and url_key(url) not in seen:
+                seen.add(url_key(url))
+                unique.append(url)
+        skipped = len(urls) - len(unique)
+        print(f"Importing {len(unique)} URLs for {username}" + (f" ({skipped} duplicate or invalid skipped)" if skipped else ""))
+
+        done = imported = 0
+        failures = []
+        started = time.perf_counter()
+        for results in import_urls(user.id, unique, **options):
+            for r in results:
+                done += 1
+                if r["ok"]:
+                    imported += 1
+                    note = " (cached)" if r["cached"] else ""
+                    print(f"[{done}/{len(unique)}] ok   #{r['recipe_id']} {r['title']}{note}")
+                else:
+                    failures.append(r)
+                    print(f"[{done}/{len(unique)}] FAIL {r['url']}: {r['error']}", file=sys.stderr)
+        print(f"Imported {imported} recipes, {len(failures)} failed, in {time.perf_counter() - started:.1f} s")
+        for r in failures:
+            print(f"  {r['url']}: {r['error']}" + (f" ({r['detail']})" if r.get("detail") else ""))
+        return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--user", required=True, help="Username to import the recipes for")
+    parser.add_argument("--file", help="JSON, CSV or text file of URLs")
+    parser.add_argument("--workers", type=int, help="Pages fetched at once (default BULK_IMPORT_WORKERS)")
+    parser.add_argument("--per-host", type=int, help="Requests at once per site (default BULK_IMPORT_PER_HOST)")
+    parser.add_argument("--interval", type=float, help="Seconds between requests to one site")
+    args = parser.parse_args()
+    urls = args.urls + (read_urls(args.file) if args.file else [])
+    if not urls:
+        parser.error("no URLs given")
+    overrides = {
+        key: value
+        for key, value in (("workers", args.workers), ("per_host", args.per_host), ("interval", args.interval))
+        if value is not None
+    }
+    sys.exit(0 if run(args.user, urls, overrides) else 1)
+
+
+if __name__ == "__main__":
+    main()
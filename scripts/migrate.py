@@ -0,0 +1,34 @@
+"""
+Create missing tables, then apply the pending versioned migrations in migrations/.
+
+    python scripts/migrate.py           # apply what's pending
+    python scripts/migrate.py --status  # list migrations and when each was applied
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from migrations import applied, available, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--status", action="store_true", help="only list migrations and whether they ran")
+    args = parser.parse_args()
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            done = applied(db.engine)
+            for version, name, _ in available():
+                print(f"{version} {name:<40} {done.get(version) or 'pending'}")
+            return
+        db.create_all()
+        ran = upgrade(db.engine)
+        print(f"Applied {len(ran)} migrations." if ran else "Nothing to migrate.")
+
+
+if __name__ == "__main__":
+    main()
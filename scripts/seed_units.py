@@ -1,10 +1,11 @@
-"""Seed default units of measurement. Run once or when adding new defaults."""
+"""Seed default units of measurement and their conversions. Run once or when adding new defaults."""
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app, db
+from app.cache import unit_cache
 from app.models import Unit
 
 DEFAULT_UNITS = [
@@ -27,15 +28,40 @@ DEFAULT_UNITS = [
     ("tallo", "tallo"),
     ("manojo", "manojo"),
     ("sobre", "sobre"),
+    ("lata", "lata"),
 ]
 
+# name -> (base unit name, how many base units make one of this unit)
+DEFAULT_CONVERSIONS = {
+    "kilogramos": ("gramos", 1000),
+    "libra": ("gramos", 453.592),
+    "onza": ("gramos", 28.3495),
+    "litros": ("mililitros", 1000),
+    "taza": ("mililitros", 240),
+    "tazas": ("mililitros", 240),
+    "cucharada": ("mililitros", 15),
+    "cucharadita": ("mililitros", 5),
+}
+
 
 def seed_units():
     app = create_app()
     with app.app_context():
+        changed = 0
         for name, symbol in DEFAULT_UNITS:
             if Unit.query.filter_by(name=name).first() is None:
                 db.session.add(Unit(name=name, symbol=symbol))
+                changed += 1
+        db.session.flush()
+        by_name = {u.name: u for u in Unit.query.filter(Unit.name.in_([n for n, _ in DEFAULT_UNITS]))}
+        for name, (base_name, factor) in DEFAULT_CONVERSIONS.items():
+            unit, base = by_name.get(name), by_name.get(base_name)
+            if unit and base and unit.base_unit_id is None:
+                unit.base_unit_id = base.id
+                unit.conversion_factor = factor
+                changed += 1
+        if changed:
+            unit_cache.invalidate()
         db.session.commit()
         print(f"Seeded units. Total: {Unit.query.count()}")
 
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+def make_config(tmp_path, database_url=None):
+    """Config for a test app on database_url (default: an SQLite file in tmp_path), without S3 or metrics."""
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url or "sqlite:///" + str(tmp_path / "test.db")
+        SQLALCHEMY_BINDS = {}
+        DATABASE_REPLICA_URL = None
+        METRICS_ENABLED = False
+        PROFILING_ENABLED = False
+        S3_BUCKET = None
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+        UPLOAD_FOLDER = str(tmp_path / "uploads")
+
+    return TestConfig
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app, db
+
+    app = create_app(make_config(tmp_path))
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
@@ -0,0 +1,76 @@
+import pytest
+
+from app import db
+from app.backup import export_records, import_records
+from app.models import Recipe, User
+
+
+def _user():
+    user = User(username="ana", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def test_reimporting_exports_into_the_same_account_updates_the_recipes(app):
+    with app.app_context():
+        user = _user()
+        db.session.add_all([Recipe(user_id=user.id, title="Tortilla"), Recipe(user_id=user.id, title="Gazpacho")])
+        db.session.commit()
+
+        for _ in range(2):
+            summary = import_records(user.id, list(export_records(user.id)))
+            assert (summary["recipes_created"], summary["recipes_updated"]) == (0, 2)
+        assert Recipe.query.filter_by(user_id=user.id).count() == 2
+
+
+def test_old_exports_without_keys_import_twice(app):
+    with app.app_context():
+        user = _user()
+        records = [
+            {"type": "header", "format": "recetas-chiquitas", "version": 1, "exported_at": "2025-01-01T00:00:00"},
+            {"type": "recipe", "id": 3, "key": None, "title": "Tortilla"},
+            {"type": "recipe", "id": 7, "key": "export:3", "title": "Tortilla (copia)"},
+        ]
+        assert import_records(user.id, records)["recipes_created"] == 2
+        assert import_records(user.id, records)["recipes_updated"] == 2
+
+
+@pytest.mark.parametrize("count", [0, -1, "2", 1.5, True])
+def test_meal_plan_counts_must_be_positive_integers(app, count):
+    with app.app_context():
+        user = _user()
+        records = [
+            {"type": "recipe", "id": 1, "key": "tortilla", "title": "Tortilla"},
+            {"type": "meal_plan", "name": "Semana", "recipes": [{"recipe": 1, "count": count}]},
+        ]
+        with pytest.raises(ValueError, match="count must be a positive integer"):
+            import_records(user.id, records)
+
+
+def test_exporting_writes_nothing(app):
+    with app.app_context():
+        user = _user()
+        db.session.add(Recipe(user_id=user.id, title="Tortilla"))
+        db.session.commit()
+        before = db.session.execute(db.select(Recipe.client_key, Recipe.updated_at)).all()
+
+        keys = [r["key"] for r in export_records(user.id) if r["type"] == "recipe"]
+        db.session.rollback()
+        assert keys[0] and db.session.execute(db.select(Recipe.client_key, Recipe.updated_at)).all() == before
+
+
+def test_an_export_imported_into_another_account_and_back_out_keeps_keys_unique(app):
+    with app.app_context():
+        ana, bea = _user(), User(username="bea", password_hash="x")
+        db.session.add(bea)
+        db.session.flush()
+        db.session.add(Recipe(user_id=ana.id, title="Tortilla"))
+        db.session.commit()
+
+        assert import_records(bea.id, list(export_records(ana.id)))["recipes_created"] == 1
+        db.session.add(Recipe(user_id=bea.id, title="Gazpacho"))
+        db.session.commit()
+        records = list(export_records(bea.id))
+        assert len({r["key"] for r in records if r["type"] == "recipe"}) == 2
+        assert import_records(bea.id, records)["recipes_updated"] == 2
@@ -0,0 +1,29 @@
+from app import db
+from app.models import User
+from tests.conftest import login
+
+
+def _batch(client, recipes):
+    return client.post("/api/recipes/batch", json={"recipes": recipes})
+
+
+def test_a_recipe_twice_in_one_batch_is_rejected(app):
+    with app.app_context():
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    login(client, user_id)
+
+    created = _batch(client, [{"key": "tortilla", "title": "Tortilla"}])
+    assert created.status_code == 201
+    recipe_id = created.get_json()["recipes"][0]["id"]
+
+    for recipes in (
+        [{"id": recipe_id, "title": "A"}, {"id": recipe_id, "title": "B"}],
+        [{"id": recipe_id, "title": "A"}, {"key": "tortilla", "title": "B"}],
+    ):
+        response = _batch(client, recipes)
+        assert response.status_code == 400
+        assert response.get_json()["errors"] == [{"index": 1, "error": "recipe repeated in this batch"}]
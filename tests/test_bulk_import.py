@@ -0,0 +1,20 @@
+from app import db
+from app.bulk_import import create_recipes
+from app.models import Recipe, User
+
+
+def test_imported_recipes_keep_their_source_and_ingredient_order(app):
+    with app.app_context():
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.flush()
+        payload = {"title": "Tortilla", "ingredients": ["4 huevos", "500 g de patatas", "sal"]}
+
+        [recipe_id] = create_recipes(user.id, [("https://example.com/tortilla", payload)])
+        db.session.commit()
+
+        recipe = db.session.get(Recipe, recipe_id)
+        assert (recipe.source_url, recipe.description) == ("https://example.com/tortilla", "")
+        rows = recipe.ingredients.all()
+        assert [ri.ingredient.name for ri in rows] == ["huevos", "patatas", "sal"]
+        assert all(ri.position is not None for ri in rows)
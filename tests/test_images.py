@@ -0,0 +1,90 @@
+import io
+
+import pytest
+from PIL import Image, ImageCms
+from PIL.PngImagePlugin import PngInfo
+
+from app.images import load_image, store_image
+
+GPS = 0x8825
+ORIENTATION = 0x0112
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.files = {}
+
+    def save(self, recipe_id, fileobj, filename):
+        self.files[filename] = fileobj.read()
+        return filename
+
+
+def _photo():
+    image = Image.new("RGB", (400, 200))
+    image.putdata([(x % 256, y % 256, (x * y) % 256) for y in range(200) for x in range(400)])
+    return image
+
+
+def _exif(orientation=None):
+    exif = Image.Exif()
+    exif[GPS] = {1: "N", 2: (40.0, 1.0, 2.0)}
+    if orientation:
+        exif[ORIENTATION] = orientation
+    return exif.tobytes()
+
+
+def _text(key, value):
+    info = PngInfo()
+    info.add_text(key, value)
+    return info
+
+
+def _upload(fmt, **options):
+    data = io.BytesIO()
+    _photo().save(data, fmt, **options)
+    return data.getvalue()
+
+
+def _stored(upload, filename):
+    storage = MemoryStorage()
+    store_image(storage, 1, io.BytesIO(upload), filename, widths=())
+    return storage.files[filename]
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_jpeg_originals_lose_their_metadata_but_not_their_pixels_or_orientation(progressive):
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    upload = _upload(
+        "JPEG", quality=70, progressive=progressive, exif=_exif(orientation=6), comment=b"casa de ana",
+        xmp=b"<x:xmpmeta/>", icc_profile=icc,
+    )
+    stored = _stored(upload, "a.jpg")
+
+    image = Image.open(io.BytesIO(stored))
+    assert dict(image.getexif()) == {ORIENTATION: 6}
+    assert "comment" not in image.info and "xmp" not in image.info
+    assert image.info["icc_profile"] == icc
+    assert image.tobytes() == Image.open(io.BytesIO(upload)).tobytes()  # not re-encoded
+    assert load_image(io.BytesIO(stored))[0].size == (200, 400)
+
+
+def test_png_originals_lose_their_text_and_exif():
+    upload = _upload("PNG", exif=_exif(), pnginfo=_text("Author", "Ana"))
+    image = Image.open(io.BytesIO(_stored(upload, "b.png")))
+    assert not image.getexif() and "Author" not in image.info
+    assert image.tobytes() == _photo().tobytes()
+
+
+def test_webp_originals_lose_their_exif_and_xmp():
+    upload = _upload("WEBP", quality=60, exif=_exif(), xmp=b"<x:xmpmeta/>")
+    stored = _stored(upload, "c.webp")
+    image = Image.open(io.BytesIO(stored))
+    assert not image.getexif() and "xmp" not in image.info
+    assert image.tobytes() == Image.open(io.BytesIO(upload)).tobytes()  # not re-encoded
+    assert len(stored) < len(upload)
+
+
+def test_decompression_bombs_are_not_readable_images(monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(ValueError, match="not a readable image"):
+        load_image(io.BytesIO(_upload("PNG")))
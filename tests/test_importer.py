@@ -0,0 +1,46 @@
+import threading
+
+from app import db, importer
+from app.models import ImportJob, User
+
+URL = "https://example.com/tortilla"
+
+
+def test_a_fetch_started_while_the_last_one_finishes_keeps_its_job(app, monkeypatch):
+    second_fetch = threading.Event()
+    fetches = []
+
+    def fetch_recipe(url, timeout=15, session=None):
+        fetches.append(url)
+        if len(fetches) == 2:
+            assert second_fetch.wait(5)
+        return {"title": "Tortilla"}
+
+    second = {}
+    real_update = importer.update
+
+    def update(*args, **kwargs):
+        # The first job's waiters were just popped: import the same page again before they are marked done
+        if not second:
+            with app.app_context():
+                second["job"] = importer.submit_import(user_id, URL).id
+        return real_update(*args, **kwargs)
+
+    monkeypatch.setattr(importer, "fetch_recipe", fetch_recipe)
+    monkeypatch.setattr(importer, "update", update)
+    with app.app_context():
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        first = importer.submit_import(user_id, URL).id
+        events = importer._state()[2]
+        assert events[first].wait(5)
+
+        second_done = events[second["job"]]
+        assert not second_done.is_set()
+        second_fetch.set()
+        assert second_done.wait(5)
+        db.session.rollback()
+        assert db.session.get(ImportJob, second["job"]).status == "done"
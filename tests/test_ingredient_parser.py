@@ -0,0 +1,39 @@
+import pytest
+
+from app.ingredient_parser import IngredientLineParser
+
+parser = IngredientLineParser()
+
+
+@pytest.mark.parametrize(
+    "line, quantity, unit, name, note",
+    [
+        ("2 1/2 tazas de harina", "2 1/2", "tazas", "harina", ""),
+        ("1 cup sugar, sifted", "1", "taza", "sugar", "sifted"),
+        ("una taza de leche", "1", "taza", "leche", ""),
+        ("1 taza (240 ml) de leche", "1", "taza", "leche", "240 ml"),
+        ("1 (14 oz) can tomatoes", "1", "lata", "tomatoes", "14 oz"),
+        ("1 lata (400 g) de tomate", "1", "lata", "tomate", "400 g"),
+        ("200 g queso (rallado), fresco", "200", "gramos", "queso", "rallado, fresco"),
+        ("queso (rallado)", "", None, "queso", "rallado"),
+        ("un poco de sal", "", None, "sal", "un poco"),
+        ("una pizca de sal", "", "pizca", "sal", ""),
+        ("a pinch of salt", "", "pizca", "salt", ""),
+        ("2 pizcas de sal", "2", "pizca", "sal", ""),
+        ("un huevo", "", None, "un huevo", ""),
+        ("sal y pimienta, al gusto", "", None, "sal y pimienta, al gusto", ""),
+        ("2 gr", "2", "gramos", "", ""),
+    ],
+)
+def test_parse_line(line, quantity, unit, name, note):
+    row = parser.parse_line(line)
+    assert (row["quantity"], row["unit_name"], row["name"], row["note"]) == (quantity, unit, name, note)
+
+
+def test_optional_in_parentheses():
+    row = parser.parse_line("sal (opcional)")
+    assert (row["name"], row["optional"]) == ("sal", True)
+
+
+def test_lines_without_a_name_are_skipped():
+    assert [row["name"] for row in parser.parse_lines(["2 ml", "", "3 huevos"])] == ["huevos"]
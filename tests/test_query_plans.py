@@ -0,0 +1,116 @@
+"""
+EXPLAIN the queries of each blueprint's main pages over a seeded dataset; fail on sequential scans.
+
+The dataset comes from scripts/generate_data.py, in a temporary SQLite file, or in the empty
+scratch database given by PLANS_DATABASE_URL (e.g. postgresql://localhost/plans). Each page is
+requested once to warm the process caches, then again with every SELECT it runs EXPLAINed. A
+sequential scan of a table with at least MIN_ROWS rows fails (small catalogues like units and
+tags are cheaper to scan than to index).
+"""
+import json
+import os
+import re
+
+import pytest
+from sqlalchemy import event, func, select
+
+from scripts.generate_data import generate
+from tests.conftest import login, make_config
+
+USERS, RECIPES, INGREDIENTS = 100, 50, 8  # 5000 recipes, 40000 recipe ingredients
+MIN_ROWS = 1000
+
+PAGES = [
+    ("recipes.list", "GET", "/recipes/"),
+    ("recipes.list (next page)", "GET", "/recipes/?cursor={cursor}"),
+    ("recipes.list (search)", "GET", "/recipes/?q=pollo"),
+    ("recipes.detail", "GET", "/recipes/{recipe_id}"),
+    ("shopping.list", "GET", "/shopping/"),
+    ("shopping.detail", "GET", "/shopping/{list_id}"),
+    ("shopping.add_recipe", "POST", "/shopping/{list_id}/add-recipe/{recipe_id}"),
+    ("mealplans.list", "GET", "/mealplans/"),
+    ("mealplans.detail", "GET", "/mealplans/{plan_id}"),
+    ("mealplans.create_shopping_list", "POST", "/mealplans/{plan_id}/create-shopping-list"),
+    ("api.list_units", "GET", "/api/units"),
+    ("api.search_ingredients", "GET", "/api/ingredients?q=tom"),
+    ("api.search_recipes", "GET", "/api/recipes"),
+    ("api.search_recipes (search)", "GET", "/api/recipes?q=arroz"),
+]
+
+
+def _pg_seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from _pg_seq_scans(child)
+
+
+def explain(conn, statement, parameters):
+    """(plan text, [tables read by a full scan]) for one captured statement."""
+    if conn.dialect.name == "postgresql":
+        (plan,) = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters or ()).one()
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+        return json.dumps(plan[0]["Plan"], indent=1), list(_pg_seq_scans(plan[0]["Plan"]))
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters or ()).all()
+    scans = []
+    for row in rows:
+        m = re.match(r"SCAN (\w+)$", row[3])  # a plain SCAN: no index, not a virtual (FTS) table
+        if m:
+            scans.append(re.sub(r"_\d+$", "", m[1]))
+    return "\n".join(row[3] for row in rows), scans
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    """(app, logged-in client, URL parameters, table sizes, captured SELECTs) over the seeded dataset."""
+    from app import create_app, db
+    from app.models import MealPlan, Recipe, ShoppingList
+
+    app = create_app(make_config(tmp_path_factory.mktemp("plans"), os.environ.get("PLANS_DATABASE_URL")))
+    captured = []
+    with app.app_context():
+        db.create_all()
+        generate(db, USERS, RECIPES, INGREDIENTS, lists=20, plans=10, log=lambda line: None)
+        sizes = {t.name: db.session.scalar(select(func.count()).select_from(t)) for t in db.metadata.sorted_tables}
+        user_id = db.session.scalar(select(MealPlan.user_id).order_by(MealPlan.id.desc()).limit(1))
+        ids = {
+            "recipe_id": db.session.scalar(select(func.max(Recipe.id)).where(Recipe.user_id == user_id)),
+            "list_id": db.session.scalar(select(func.max(ShoppingList.id)).where(ShoppingList.user_id == user_id)),
+            "plan_id": db.session.scalar(select(func.max(MealPlan.id)).where(MealPlan.user_id == user_id)),
+        }
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip()[:6].upper() in ("SELECT", "WITH"):
+                captured.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        db.session.remove()
+
+    client = app.test_client()
+    login(client, user_id)
+    ids["cursor"] = client.get("/recipes/", headers={"Accept": "application/json"}).json["next_cursor"]
+    yield app, client, ids, sizes, captured
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.mark.parametrize("method, url", [(method, url) for _, method, url in PAGES], ids=[p[0] for p in PAGES])
+def test_page_reads_large_tables_through_indexes(seeded, method, url):
+    from app import db
+
+    app, client, ids, sizes, captured = seeded
+    url = url.format(**ids)
+    client.open(url, method=method)  # warm-up: per-process caches load on first use
+    captured.clear()
+    response = client.open(url, method=method)
+    assert response.status_code < 400
+
+    bad = []
+    with app.app_context(), db.engine.connect() as conn:
+        for statement, parameters in captured:
+            plan, scans = explain(conn, statement, parameters)
+            scans = sorted({t for t in scans if sizes.get(t, 0) >= MIN_ROWS})
+            if scans:
+                bad.append(f"sequential scan of {', '.join(scans)} in:\n{' '.join(statement.split())[:400]}\n{plan}")
+    assert captured and not bad, "\n\n".join(bad)
@@ -0,0 +1,28 @@
+import io
+
+from app import db
+from app.models import User
+from tests.conftest import login
+
+
+def test_a_failed_image_upload_is_not_reported_as_success(app, monkeypatch):
+    def store_images(recipe_id, files):
+        raise OSError("S3 is down")
+
+    monkeypatch.setattr("app.recipes.store_images", store_images)
+    with app.app_context():
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    login(client, user_id)
+
+    response = client.post(
+        "/recipes/new",
+        data={"title": "Tortilla", "images": (io.BytesIO(b"jpeg"), "foto.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert [category for category, _ in session["_flashes"]] == ["error"]
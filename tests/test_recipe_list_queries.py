@@ -0,0 +1,49 @@
+from sqlalchemy import event
+
+from app import db
+from app.models import Recipe, RecipeImage, Tag, User
+from tests.conftest import login
+
+
+def _add_recipes(user_id, start, count):
+    shared = Tag.query.filter_by(name="cena").first() or Tag(name="cena")
+    for i in range(count):
+        recipe = Recipe(user_id=user_id, title=f"Receta {start + i}", tags=[shared, Tag(name=f"tag-{start + i}")])
+        recipe.images = [RecipeImage(filename=f"{start + i}-a.jpg"), RecipeImage(filename=f"{start + i}-b.jpg")]
+        db.session.add(recipe)
+    db.session.commit()
+
+
+def _list_queries(app, client):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            response = client.get("/recipes/")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    return statements
+
+
+def test_recipe_list_query_count_does_not_grow_with_recipes(app):
+    with app.app_context():
+        user = User(username="ana", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        _add_recipes(user_id, 0, 5)
+    client = app.test_client()
+    login(client, user_id)
+    client.get("/recipes/")  # warm-up: per-process caches load on first use
+
+    small = _list_queries(app, client)
+    with app.app_context():
+        _add_recipes(user_id, 5, 5)
+    large = _list_queries(app, client)
+
+    assert len(large) == len(small), "\n".join(large)
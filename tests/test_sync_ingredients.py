@@ -0,0 +1,64 @@
+from sqlalchemy import event
+
+from app import db
+from app.models import IngredientMaster, Recipe, RecipeIngredient, User
+from app.recipes import insert_recipe_ingredients, sync_recipe_ingredients
+
+
+def _setup(count):
+    user = User(username="ana", password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    masters = [IngredientMaster(name=f"ingrediente {i}") for i in range(count + 1)]
+    recipe = Recipe(user_id=user.id, title="Guiso")
+    db.session.add_all(masters + [recipe])
+    db.session.flush()
+    return recipe, masters
+
+
+def _values(recipe, masters, indexes):
+    return [
+        {"recipe_id": recipe.id, "ingredient_master_id": masters[i].id, "unit_id": None, "quantity": "1",
+         "optional": False}
+        for i in indexes
+    ]
+
+
+def _sync_writes(recipe, masters, indexes):
+    """(rows written, ingredient order afterwards) of syncing recipe to masters[indexes]."""
+    rows = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split()[0] in ("INSERT", "UPDATE", "DELETE"):
+            rows.append(max(cursor.rowcount, 0))
+
+    event.listen(db.engine, "after_cursor_execute", count)
+    try:
+        sync_recipe_ingredients(recipe.id, _values(recipe, masters, indexes))
+        db.session.flush()
+    finally:
+        event.remove(db.engine, "after_cursor_execute", count)
+    db.session.expire_all()
+    order = [masters.index(ri.ingredient) for ri in recipe.ingredients]
+    return sum(rows), order
+
+
+def test_removing_or_inserting_near_the_top_writes_one_row(app):
+    with app.app_context():
+        recipe, masters = _setup(30)
+        insert_recipe_ingredients(_values(recipe, masters, range(30)))
+
+        removed = list(range(1, 30))
+        assert _sync_writes(recipe, masters, removed) == (1, removed)
+
+        inserted = [30] + removed
+        assert _sync_writes(recipe, masters, inserted) == (1, inserted)
+
+
+def test_rows_from_before_positions_keep_their_order(app):
+    with app.app_context():
+        recipe, masters = _setup(5)
+        db.session.execute(db.insert(RecipeIngredient), _values(recipe, masters, range(5)))
+
+        _, order = _sync_writes(recipe, masters, [5, 0, 1, 3, 4])
+        assert order == [5, 0, 1, 3, 4]